@@ -104,7 +104,8 @@ class Main():
             'watchlater': entrypoint.watchlater,
             'enterPMS': entrypoint.enterPMS,
             'togglePlexTV': entrypoint.togglePlexTV,
-            'Plex_Node': entrypoint.Plex_Node
+            'Plex_Node': entrypoint.Plex_Node,
+            'metrics': entrypoint.showMetrics
         }
 
         if "/extrafanart" in argv[0]:
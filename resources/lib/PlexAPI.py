@@ -51,6 +51,7 @@ from utils import window, settings, language as lang, tryDecode, tryEncode, \
 from PlexFunctions import PMSHttpsEnabled
 import plexdb_functions as plexdb
 import variables as v
+import state
 
 ###############################################################################
 
@@ -2303,7 +2304,7 @@ class API():
             listItem.setLabel(title)
         listItem.setProperty('IsPlayable', 'true')
         extension = self.item[0][0].attrib['key'][self.item[0][0].attrib['key'].rfind('.'):].lower()
-        if (window('plex_force_transcode_pix') == 'true' or
+        if (state.get('plex_force_transcode_pix') or
                 extension not in v.KODI_SUPPORTED_IMAGES):
             # Let Plex transcode
             # max width/height supported by plex image transcoder is 1920x1080
@@ -2315,7 +2316,7 @@ class API():
                 1080)
         else:
             # Don't transcode
-            if window('useDirectPaths') == 'true':
+            if state.get('useDirectPaths'):
                 # Addon Mode. Just give the path of the file to Kodi
                 path = self.addPlexCredentialsToUrl(
                     '%s%s' % (window('pms_server'),
@@ -2468,16 +2469,16 @@ class API():
         if path is None:
             return None
         typus = v.REMAP_TYPE_FROM_PLEXTYPE[typus]
-        if window('remapSMB') == 'true':
-            path = path.replace(window('remapSMB%sOrg' % typus),
-                                window('remapSMB%sNew' % typus),
+        if state.get('remapSMB'):
+            path = path.replace(state.get('remapSMB%sOrg' % typus),
+                                state.get('remapSMB%sNew' % typus),
                                 1)
             # There might be backslashes left over:
             path = path.replace('\\', '/')
-        elif window('replaceSMB') == 'true':
+        elif state.get('replaceSMB'):
             if path.startswith('\\\\'):
                 path = 'smb:' + path.replace('\\', '/')
-        if window('plex_pathverified') == 'true' and forceCheck is False:
+        if state.get('plex_pathverified') and forceCheck is False:
             return path
 
         # exist() needs a / or \ at the end to work for directories
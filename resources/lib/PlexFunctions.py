@@ -4,10 +4,12 @@ from urllib import urlencode
 from ast import literal_eval
 from urlparse import urlparse, parse_qsl
 import re
-from copy import deepcopy
+import xml.etree.ElementTree as etree
+from threading import Thread, Condition, Semaphore, Event
+import Queue
 
 import downloadutils
-from utils import settings
+from utils import settings, settings_int
 from variables import PLEX_TO_KODI_TIMEFACTOR
 
 ###############################################################################
@@ -101,6 +103,20 @@ def SelectStreams(url, args):
         url + '?' + urlencode(args), action_type='PUT')
 
 
+# Arguments used to download the metadata for library items
+METADATA_ARGUMENTS = {
+    'checkFiles': 0,
+    'includeExtras': 1,         # Trailers and Extras => Extras
+    'includeReviews': 1,
+    'includeRelated': 0,        # Similar movies => Video -> Related
+    # 'includeRelatedCount': 0,
+    # 'includeOnDeck': 1,
+    # 'includeChapters': 1,
+    # 'includePopularLeaves': 1,
+    # 'includeConcerts': 1
+}
+
+
 def GetPlexMetadata(key):
     """
     Returns raw API metadata for key as an etree XML.
@@ -115,18 +131,7 @@ def GetPlexMetadata(key):
         url = "{server}" + key
     else:
         url = "{server}/library/metadata/" + key
-    arguments = {
-        'checkFiles': 0,
-        'includeExtras': 1,         # Trailers and Extras => Extras
-        'includeReviews': 1,
-        'includeRelated': 0,        # Similar movies => Video -> Related
-        # 'includeRelatedCount': 0,
-        # 'includeOnDeck': 1,
-        # 'includeChapters': 1,
-        # 'includePopularLeaves': 1,
-        # 'includeConcerts': 1
-    }
-    url = url + '?' + urlencode(arguments)
+    url = url + '?' + urlencode(METADATA_ARGUMENTS)
     xml = downloadutils.DownloadUtils().downloadUrl(url)
     if xml == 401:
         # Either unauthorized (taken care of by doUtils) or PMS under strain
@@ -141,59 +146,202 @@ def GetPlexMetadata(key):
     return xml
 
 
-def GetAllPlexChildren(key, containerSize=None):
+def GetPlexMetadataBatch(keys):
+    """
+    Downloads the metadata for several Plex items with one single request,
+    e.g. /library/metadata/1,2,3
+
+    Input:
+        keys            List of Plex ratingKeys (digits only), e.g. ['1', '2']
+
+    Returns a dict {ratingKey: xml} where every xml looks like the answer to
+    GetPlexMetadata(ratingKey), i.e. a MediaContainer with exactly one child.
+    Items that the PMS did not return are missing from the dict.
+
+    Returns None or 401 if something went wrong
+    """
+    url = "{server}/library/metadata/%s?%s" % (
+        ','.join(str(key) for key in keys), urlencode(METADATA_ARGUMENTS))
+    xml = downloadutils.DownloadUtils().downloadUrl(url)
+    if xml == 401:
+        # Either unauthorized (taken care of by doUtils) or PMS under strain
+        return 401
+    try:
+        xml.attrib
+    except AttributeError:
+        log.error("Error retrieving metadata for %s" % url)
+        return None
+    # Split the answer up into one MediaContainer per item
+    attrib = dict(xml.attrib)
+    attrib['size'] = '1'
+    answer = {}
+    for child in xml:
+        ratingKey = child.get('ratingKey')
+        if ratingKey is None:
+            continue
+        container = etree.Element(xml.tag, attrib)
+        container.append(child)
+        answer[ratingKey] = container
+    return answer
+
+
+def GetAllPlexChildren(key, containerSize=None, stream=False):
     """
     Returns a list (raw xml API dump) of all Plex children for the key.
     (e.g. /library/metadata/194853/children pointing to a season)
 
     Input:
         key             Key to a Plex item, e.g. 12345
+        stream          If True, returns a generator of attribute dicts
+                        (see DownloadChunks)
     """
     url = "{server}/library/metadata/%s/children?" % key
-    return DownloadChunks(url, containerSize)
+    return DownloadChunks(url, containerSize, stream=stream)
 
 
-def GetPlexSectionResults(viewId, args=None, containerSize=None):
+def GetPlexSectionResults(viewId, args=None, containerSize=None,
+                          stream=False, updatedAt=None):
     """
     Returns a list (XML API dump) of all Plex items in the Plex
     section with key = viewId.
 
     Input:
         args:       optional dict to be urlencoded
+        stream      If True, returns a generator of attribute dicts
+                    (see DownloadChunks)
+        updatedAt   Unix timestamp (PMS time); only retrieves PMS items
+                    updated by the PMS since that point of time until now.
 
     Returns None if something went wrong
     """
     url = "{server}/library/sections/%s/all?" % viewId
     if args:
         url += urlencode(args) + '&'
-    return DownloadChunks(url, containerSize)
+    if updatedAt:
+        url += 'updatedAt>=%s&' % updatedAt
+    return DownloadChunks(url, containerSize, stream=stream)
 
 
-def DownloadChunks(url, containerSize):
+def _iter_records(response):
     """
-    Downloads PMS url in chunks of containerSize (int).
-    If containerSize is None: ONE xml is fetched directly
+    Incrementally parses the streamed PMS answer response (requests response
+    object) and yields a dict with the xml attributes for every direct child
+    of the xml's root, e.g. {'ratingKey': '123', 'updatedAt': '1483...', ...}
 
-    url MUST end with '?' (if no other url encoded args are present) or '&'
+    Parsed elements are thrown away immediately, so only one item is ever
+    held in memory. Closes the response once done.
+    """
+    root = None
+    depth = 0
+    try:
+        for event, elem in etree.iterparse(response.raw,
+                                           events=('start', 'end')):
+            if event == 'start':
+                if depth == 0:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                record = dict(elem.attrib)
+                elem.clear()
+                root.remove(elem)
+                yield record
+    finally:
+        response.close()
 
-    Returns a stitched-together xml or None.
+
+class ChunkStream(object):
     """
-    if containerSize is None:
-        # Get rid of '?' or '&' at the end of url
-        xml = downloadutils.DownloadUtils().downloadUrl(url[:-1])
-        if xml == 401:
-            return 401
+    What DownloadChunks(stream=True) returns: iterate over it to get an
+    attribute dict for every item. Chunks that could not be downloaded or
+    parsed are skipped - once done iterating, self.failed is True if that
+    happened, i.e. if items are missing.
+
+    generator(listing, *args) is called with this instance as listing
+    """
+    def __init__(self, generator, *args):
+        self.failed = False
+        self.records = generator(self, *args)
+
+    def __iter__(self):
+        return self.records
+
+
+def _first_chunk(listing, xml):
+    """
+    Yields an attribute dict for every item of the xml
+    """
+    for child in xml:
+        yield dict(child.attrib)
+
+
+def _stream_chunks(listing, url, containerSize, response=None, pos=0):
+    """
+    Generator yielding an attribute dict for every item in the PMS answer
+    for url, page by page, starting with container position pos. response is
+    the (already opened) response for the very first page, if applicable.
+    Sets listing.failed if chunks are missing (see ChunkStream)
+    """
+    errorCounter = 0
+    while errorCounter < 10:
+        if response is None:
+            args = {
+                'X-Plex-Container-Size': containerSize,
+                'X-Plex-Container-Start': pos
+            }
+            response = downloadutils.DownloadUtils().downloadUrl(
+                url + urlencode(args), stream=True)
+            try:
+                response.raw
+            except AttributeError:
+                log.error('Error while downloading chunks: %s'
+                          % (url + urlencode(args)))
+                listing.failed = True
+                response = None
+                pos += containerSize
+                errorCounter += 1
+                continue
+        count = 0
         try:
-            xml.attrib
-        except AttributeError:
-            # Nope, not an XML, abort
-            log.error("Error getting url %s" % url[:-1])
-            return None
-        else:
-            return xml
+            for record in _iter_records(response):
+                count += 1
+                yield record
+        except Exception as e:
+            log.error('Error while parsing chunk starting at %s for %s: %s'
+                      % (pos, url, e))
+            listing.failed = True
+            errorCounter += 1
+            count = containerSize
+        response = None
+        # Done as soon as we don't receive a full complement of items
+        if containerSize is None or count < containerSize:
+            break
+        pos += containerSize
+    if errorCounter == 10:
+        log.error('Fatal error while downloading chunks for %s' % url)
+
+
+def _sequential_stream_chunks(listing, url, containerSize, xml):
+    """
+    Yields an attribute dict for every item of the first chunk xml, then for
+    the items of the remaining chunks (see _stream_chunks)
+    """
+    for child in xml:
+        yield dict(child.attrib)
+    del xml
+    for record in _stream_chunks(listing, url, containerSize,
+                                 pos=containerSize):
+        yield record
 
-    xml = None
-    pos = 0
+
+def _sequential_chunks(url, containerSize, xml=None, pos=0):
+    """
+    Downloads the PMS url chunk after chunk, starting with container position
+    pos. Items are appended to xml (or the very first chunk is used as xml)
+
+    Returns the stitched-together xml or None.
+    """
     errorCounter = 0
     while errorCounter < 10:
         args = {
@@ -214,7 +362,7 @@ def DownloadChunks(url, containerSize):
 
         # Very first run: starting xml (to retain data in xml's root!)
         if xml is None:
-            xml = deepcopy(xmlpart)
+            xml = xmlpart
             if len(xmlpart) < containerSize:
                 break
             else:
@@ -233,8 +381,261 @@ def DownloadChunks(url, containerSize):
     return xml
 
 
+class ParallelChunks(object):
+    """
+    Downloads all chunks of the PMS url in parallel, using a bounded pool of
+    worker threads. Iterate over an instance to get the tuples
+
+        (pos, xml)
+
+    in the correct order of container positions pos. xml is whatever
+    downloadUtils returned, e.g. None or 401 if something went wrong.
+
+    Downloads start at container position start, e.g. after the first chunk.
+    At most 2 * workers chunks are held in memory at any time. If you stop
+    iterating early, call close() to get rid of the worker threads.
+    """
+    def __init__(self, url, containerSize, totalSize, workers, start=0):
+        self.url = url
+        self.containerSize = containerSize
+        self.positions = range(start, totalSize, containerSize)
+        self.workers = min(workers, len(self.positions))
+        self.queue = Queue.Queue()
+        for pos in self.positions:
+            self.queue.put(pos)
+        self.results = {}
+        self.condition = Condition()
+        self.slots = Semaphore(2 * self.workers)
+        self.stopped = Event()
+        self.threads = []
+
+    def _work(self):
+        while not self.stopped.is_set():
+            self.slots.acquire()
+            if self.stopped.is_set():
+                break
+            try:
+                pos = self.queue.get(block=False)
+            except Queue.Empty:
+                break
+            args = {
+                'X-Plex-Container-Size': self.containerSize,
+                'X-Plex-Container-Start': pos
+            }
+            try:
+                xml = downloadutils.DownloadUtils().downloadUrl(
+                    self.url + urlencode(args))
+            except Exception as e:
+                log.error('Error while downloading chunk: %s' % e)
+                xml = None
+            with self.condition:
+                self.results[pos] = xml
+                self.condition.notify_all()
+
+    def __iter__(self):
+        for _ in range(self.workers):
+            thread = Thread(target=self._work)
+            thread.setDaemon(True)
+            thread.start()
+            self.threads.append(thread)
+        try:
+            for pos in self.positions:
+                with self.condition:
+                    while pos not in self.results:
+                        self.condition.wait()
+                    xml = self.results.pop(pos)
+                self.slots.release()
+                yield pos, xml
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stops all worker threads. Chunks still being downloaded are lost
+        """
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        # Wake up workers waiting for a free slot
+        for _ in self.threads:
+            self.slots.release()
+
+
+def _parallel_chunks(url, containerSize, totalSize, workers, xml):
+    """
+    Downloads the PMS url after its first chunk xml using ParallelChunks and
+    appends the chunks to xml in their original order. If the PMS answers 401
+    or 503, we fall back to downloading the remaining chunks one after
+    another.
+
+    Returns the stitched-together xml or None.
+    """
+    full = False
+    errorCounter = 0
+    chunks = ParallelChunks(url, containerSize, totalSize, workers,
+                            start=containerSize)
+    for pos, xmlpart in chunks:
+        if xmlpart in (401, 503):
+            log.warn('PMS answered %s, downloading remaining chunks of %s '
+                     'sequentially' % (xmlpart, url))
+            chunks.close()
+            return _sequential_chunks(url, containerSize, xml, pos)
+        try:
+            xmlpart.attrib
+        except AttributeError:
+            log.error('Error while downloading chunk %s of %s' % (pos, url))
+            full = False
+            errorCounter += 1
+            if errorCounter == 10:
+                log.error('Fatal error while downloading chunks for %s' % url)
+                chunks.close()
+                return None
+            continue
+        full = len(xmlpart) == containerSize
+        for child in xmlpart:
+            xml.append(child)
+    if full:
+        # PMS items were added in the meantime
+        return _sequential_chunks(url,
+                                  containerSize,
+                                  xml,
+                                  pos + containerSize)
+    return xml
+
+
+def _parallel_stream_chunks(listing, url, containerSize, totalSize, workers,
+                            xml):
+    """
+    Same as _parallel_chunks, but yields an attribute dict for every item (see
+    _stream_chunks), those of the first chunk xml included
+    """
+    for child in xml:
+        yield dict(child.attrib)
+    del xml
+    full = False
+    errorCounter = 0
+    chunks = ParallelChunks(url, containerSize, totalSize, workers,
+                            start=containerSize)
+    try:
+        for pos, xmlpart in chunks:
+            if xmlpart in (401, 503):
+                log.warn('PMS answered %s, downloading remaining chunks of %s '
+                         'sequentially' % (xmlpart, url))
+                chunks.close()
+                for record in _stream_chunks(listing, url, containerSize,
+                                             pos=pos):
+                    yield record
+                return
+            try:
+                xmlpart.attrib
+            except AttributeError:
+                log.error('Error while downloading chunk %s of %s'
+                          % (pos, url))
+                listing.failed = True
+                full = False
+                errorCounter += 1
+                if errorCounter == 10:
+                    log.error('Fatal error while downloading chunks for %s'
+                              % url)
+                    return
+                continue
+            full = len(xmlpart) == containerSize
+            for child in xmlpart:
+                yield dict(child.attrib)
+            del xmlpart
+    finally:
+        chunks.close()
+    if full:
+        # PMS items were added in the meantime
+        for record in _stream_chunks(listing,
+                                     url,
+                                     containerSize,
+                                     pos=pos + containerSize):
+            yield record
+
+
+def DownloadChunks(url, containerSize, stream=False):
+    """
+    Downloads PMS url in chunks of containerSize (int).
+    If containerSize is None: ONE xml is fetched directly
+
+    url MUST end with '?' (if no other url encoded args are present) or '&'
+
+    Returns a stitched-together xml or None.
+
+    If stream=True, the PMS answers are NOT kept in memory but are parsed
+    incrementally. A ChunkStream is returned that yields one dict per item
+    containing the item's xml attributes (but no child elements!). Check its
+    failed attribute once done.
+
+    Either way, the very first chunk is downloaded immediately, so None or
+    401 are returned right away if that failed. If the first chunk's
+    totalSize says there are more chunks and the setting syncThreadNumber is
+    larger than 1, the remaining chunks are downloaded in parallel
+    """
+    if containerSize is not None:
+        args = {
+            'X-Plex-Container-Size': containerSize,
+            'X-Plex-Container-Start': 0
+        }
+        xml = downloadutils.DownloadUtils().downloadUrl(url + urlencode(args))
+        if xml == 401:
+            return 401
+        try:
+            xml.attrib
+        except AttributeError:
+            log.error("Error getting url %s" % (url + urlencode(args)))
+            return None
+        try:
+            totalSize = int(xml.attrib['totalSize'])
+        except (KeyError, ValueError):
+            totalSize = None
+        workers = settings_int('syncThreadNumber', 10)
+        if len(xml) < containerSize:
+            # That's all there is - no need for any further chunk
+            return ChunkStream(_first_chunk, xml) if stream else xml
+        if (workers > 1 and totalSize is not None and
+                totalSize > containerSize):
+            if stream is True:
+                return ChunkStream(_parallel_stream_chunks, url,
+                                   containerSize, totalSize, workers, xml)
+            return _parallel_chunks(url, containerSize, totalSize, workers,
+                                    xml)
+        if stream is True:
+            return ChunkStream(_sequential_stream_chunks, url,
+                               containerSize, xml)
+        return _sequential_chunks(url, containerSize, xml, containerSize)
+
+    if stream is True:
+        response = downloadutils.DownloadUtils().downloadUrl(url[:-1],
+                                                             stream=True)
+        if response == 401:
+            return 401
+        try:
+            response.raw
+        except AttributeError:
+            log.error("Error getting url %s" % url[:-1])
+            return None
+        return ChunkStream(_stream_chunks, url, containerSize, response)
+
+    if containerSize is None:
+        # Get rid of '?' or '&' at the end of url
+        xml = downloadutils.DownloadUtils().downloadUrl(url[:-1])
+        if xml == 401:
+            return 401
+        try:
+            xml.attrib
+        except AttributeError:
+            # Nope, not an XML, abort
+            log.error("Error getting url %s" % url[:-1])
+            return None
+        else:
+            return xml
+    return _sequential_chunks(url, containerSize)
+
+
 def GetAllPlexLeaves(viewId, lastViewedAt=None, updatedAt=None,
-                     containerSize=None):
+                     containerSize=None, stream=False):
     """
     Returns a list (raw XML API dump) of all Plex subitems for the key.
     (e.g. /library/sections/2/allLeaves pointing to all TV shows)
@@ -246,6 +647,8 @@ def GetAllPlexLeaves(viewId, lastViewedAt=None, updatedAt=None,
         updatedAt           Unix timestamp; only retrieves PMS items updated
                             by the PMS since that point of time until now.
         containerSize       Number of items simultaneously fetched from PMS
+        stream              If True, returns a generator of attribute dicts
+                            (see DownloadChunks)
 
     If lastViewedAt and updatedAt=None, ALL PMS items are returned.
 
@@ -265,7 +668,7 @@ def GetAllPlexLeaves(viewId, lastViewedAt=None, updatedAt=None,
         url += '?' + '&'.join(args) + '&'
     else:
         url += '?'
-    return DownloadChunks(url, containerSize)
+    return DownloadChunks(url, containerSize, stream=stream)
 
 
 def GetPlexOnDeck(viewId, containerSize=None):
@@ -7,13 +7,14 @@ import requests
 from os import path as os_path
 from urllib import quote_plus, unquote
 from threading import Thread
-from Queue import Queue, Empty
+from Queue import Queue
 
 from xbmc import executeJSONRPC, sleep, translatePath
 from xbmcvfs import listdir, delete
 
 from utils import window, settings, language as lang, kodiSQL, tryEncode, \
     tryDecode, IfExists, ThreadMethods, ThreadMethodsAdditionalStop, dialog
+import state
 
 # Disable annoying requests warnings
 import requests.packages.urllib3
@@ -25,6 +26,8 @@ log = logging.getLogger("PLEX."+__name__)
 ###############################################################################
 
 ARTWORK_QUEUE = Queue()
+# Max. number of variables in one "IN (?, ?, ...)" - sqlite allows 999
+SQL_CHUNK = 500
 
 
 def setKodiWebServerDetails():
@@ -177,8 +180,8 @@ class Image_Cache_Thread(Thread):
     def threadSuspended(self):
         # Overwrite method to add TWO additional suspends
         return (self._threadSuspended or
-                window('suspend_LibraryThread') or
-                window('plex_dbScan'))
+                state.get('suspend_LibraryThread') or
+                state.get('plex_dbScan'))
 
     def run(self):
         threadStopped = self.threadStopped
@@ -189,15 +192,12 @@ class Image_Cache_Thread(Thread):
             # In the event the server goes offline
             while threadSuspended():
                 # Set in service.py
-                if threadStopped():
+                if self.waitStopped():
                     # Abort was requested while waiting. We should exit
                     log.info("---===### Stopped Image_Cache_Thread ###===---")
                     return
-                sleep(1000)
-            try:
-                url = queue.get(block=False)
-            except Empty:
-                sleep(1000)
+            url = self.waitQueue(queue)
+            if url is None:
                 continue
             sleeptime = 0
             while True:
@@ -318,6 +318,11 @@ class Artwork():
             self.queue.put(double_urlencode(tryEncode(url)))
 
     def addArtwork(self, artwork, kodiId, mediaType, cursor):
+        """
+        Reconciles the Kodi art table for the Kodi item kodiId with artwork:
+        loads all existing art of the item with one query, then only inserts,
+        updates or deletes what changed. Only changed urls are cached.
+        """
         # Kodi conversion table
         kodiart = {
 
@@ -331,71 +336,93 @@ class Artwork():
             'BoxRear': "poster"
         }
 
-        # Artwork is a dictionary
+        # Artwork is a dictionary. Build {kodi art type: url}
+        wanted = {}
         for art in artwork:
             if art == "Backdrop":
                 # Backdrop entry is a list
                 # Process extra fanart for artwork downloader (fanart, fanart1,
                 # fanart2...)
-                backdrops = artwork[art]
-                backdropsNumber = len(backdrops)
-
-                query = ' '.join((
-
-                    "SELECT url",
-                    "FROM art",
-                    "WHERE media_id = ?",
-                    "AND media_type = ?",
-                    "AND type LIKE ?"
-                ))
-                cursor.execute(query, (kodiId, mediaType, "fanart%",))
-                rows = cursor.fetchall()
-
-                if len(rows) > backdropsNumber:
-                    # More backdrops in database. Delete extra fanart.
-                    query = ' '.join((
-
-                        "DELETE FROM art",
-                        "WHERE media_id = ?",
-                        "AND media_type = ?",
-                        "AND type LIKE ?"
-                    ))
-                    cursor.execute(query, (kodiId, mediaType, "fanart_",))
-
-                # Process backdrops and extra fanart
-                index = ""
-                for backdrop in backdrops:
-                    self.addOrUpdateArt(
-                        imageUrl=backdrop,
-                        kodiId=kodiId,
-                        mediaType=mediaType,
-                        imageType="%s%s" % ("fanart", index),
-                        cursor=cursor)
-
-                    if backdropsNumber > 1:
-                        try: # Will only fail on the first try, str to int.
-                            index += 1
-                        except TypeError:
-                            index = 1
-
+                for index, backdrop in enumerate(artwork[art]):
+                    if backdrop:
+                        wanted["fanart%s" % (index or "")] = backdrop
             elif art == "Primary":
                 # Primary art is processed as thumb and poster for Kodi.
-                for artType in kodiart[art]:
-                    self.addOrUpdateArt(
-                        imageUrl=artwork[art],
-                        kodiId=kodiId,
-                        mediaType=mediaType,
-                        imageType=artType,
-                        cursor=cursor)
-
-            elif kodiart.get(art):
+                if artwork[art]:
+                    for artType in kodiart[art]:
+                        wanted[artType] = artwork[art]
+            elif kodiart.get(art) and artwork[art]:
                 # Process the rest artwork type that Kodi can use
-                self.addOrUpdateArt(
-                    imageUrl=artwork[art],
-                    kodiId=kodiId,
-                    mediaType=mediaType,
-                    imageType=kodiart[art],
-                    cursor=cursor)
+                wanted[kodiart[art]] = artwork[art]
+
+        query = ' '.join((
+            "SELECT type, url",
+            "FROM art",
+            "WHERE media_id = ?",
+            "AND media_type = ?"
+        ))
+        cursor.execute(query, (kodiId, mediaType,))
+        existing = dict(cursor.fetchall())
+
+        inserts = []
+        updates = []
+        changed = []
+        for artType, url in wanted.iteritems():
+            if artType not in existing:
+                inserts.append((kodiId, mediaType, artType, url))
+                changed.append(url)
+                continue
+            oldUrl = existing[artType]
+            if oldUrl == url:
+                # Only cache artwork if it changed
+                continue
+            # Only for the main backdrop, poster
+            if (not state.get('plex_initialScan') and
+                    artType in ("fanart", "poster")):
+                # Delete current entry before updating with the new one
+                self.deleteCachedArtwork(oldUrl)
+            updates.append((url, kodiId, mediaType, artType))
+            changed.append(url)
+        # More backdrops in database? Delete extra fanart (fanart1, ...)
+        deletes = []
+        if "Backdrop" in artwork:
+            for artType in existing:
+                if (artType.startswith("fanart") and artType[6:].isdigit() and
+                        artType not in wanted):
+                    deletes.append((kodiId, mediaType, artType))
+
+        if inserts:
+            query = '''
+                INSERT INTO art(media_id, media_type, type, url)
+                VALUES (?, ?, ?, ?)
+            '''
+            cursor.executemany(query, inserts)
+        if updates:
+            query = ' '.join((
+                "UPDATE art",
+                "SET url = ?",
+                "WHERE media_id = ?",
+                "AND media_type = ?",
+                "AND type = ?"
+            ))
+            cursor.executemany(query, updates)
+        if deletes:
+            query = ' '.join((
+                "DELETE FROM art",
+                "WHERE media_id = ?",
+                "AND media_type = ?",
+                "AND type = ?"
+            ))
+            cursor.executemany(query, deletes)
+        if inserts or updates or deletes:
+            log.debug("Art for %s kodiId %s: %s added, %s updated, %s deleted"
+                      % (mediaType, kodiId, len(inserts), len(updates),
+                         len(deletes)))
+
+        # Cache changed artwork in Kodi texture cache
+        if mediaType != 'actor':
+            for url in changed:
+                self.cacheTexture(url)
 
     def addOrUpdateArt(self, imageUrl, kodiId, mediaType, imageType, cursor):
         if not imageUrl:
@@ -429,7 +456,7 @@ class Artwork():
                 # Only cache artwork if it changed
                 return
             # Only for the main backdrop, poster
-            if (window('plex_initialScan') != "true" and
+            if (not state.get('plex_initialScan') and
                     imageType in ("fanart", "poster")):
                 # Delete current entry before updating with the new one
                 self.deleteCachedArtwork(url)
@@ -460,6 +487,56 @@ class Artwork():
         for row in rows:
             self.deleteCachedArtwork(row[0])
 
+    def deleteArtworks(self, kodiItems, cursor):
+        """
+        Bulk version of deleteArtwork. Pass in kodiItems as the dict
+        {mediaType: [kodiId, ...]}
+        """
+        urls = set()
+        for mediaType, kodiIds in kodiItems.iteritems():
+            kodiIds = list(kodiIds)
+            for i in range(0, len(kodiIds), SQL_CHUNK):
+                chunk = kodiIds[i:i + SQL_CHUNK]
+                query = ('''
+                    SELECT url FROM art
+                    WHERE media_type = ? AND media_id IN (%s)
+                ''' % ','.join('?' * len(chunk)))
+                cursor.execute(query, [mediaType] + chunk)
+                urls.update(row[0] for row in cursor.fetchall())
+        self.deleteCachedArtworks(urls)
+
+    def deleteCachedArtworks(self, urls):
+        """
+        Bulk version of deleteCachedArtwork: one texture DB connection and
+        one commit for all urls
+        """
+        urls = list(urls)
+        if not urls:
+            return
+        connection = kodiSQL('texture')
+        cursor = connection.cursor()
+        try:
+            for i in range(0, len(urls), SQL_CHUNK):
+                chunk = urls[i:i + SQL_CHUNK]
+                query = ("SELECT cachedurl FROM texture WHERE url IN (%s)"
+                         % ','.join('?' * len(chunk)))
+                cursor.execute(query, chunk)
+                for row in cursor.fetchall():
+                    # Delete thumbnail as well as the entry
+                    thumbnails = tryDecode(
+                        translatePath("special://thumbnails/%s" % row[0]))
+                    try:
+                        delete(thumbnails)
+                    except Exception as e:
+                        log.error('Could not delete cached artwork %s. '
+                                  'Error: %s' % (thumbnails, e))
+            cursor.executemany("DELETE FROM texture WHERE url = ?",
+                               ((url,) for url in urls))
+            connection.commit()
+        finally:
+            connection.close()
+        log.debug("Deleted up to %s cached artworks" % len(urls))
+
     def deleteCachedArtwork(self, url):
         # Only necessary to remove and apply a new backdrop or poster
         connection = kodiSQL('texture')
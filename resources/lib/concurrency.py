@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+###############################################################################
+
+import logging
+from threading import Lock, local
+from time import time
+
+from downloadutils import set_monitor
+
+###############################################################################
+
+log = logging.getLogger("PLEX."+__name__)
+
+# Never run less download threads than this
+MIN_WORKERS = 1
+# Number of download threads we start out with (slow start)
+START_WORKERS = 2
+# Weight of the newest latency measurement in the moving average
+LATENCY_WEIGHT = 0.2
+# Shrink if the average latency is this many times the best we've seen
+LATENCY_FACTOR = 3.0
+# Back off for this many seconds after the first failure ...
+BACKOFF_MIN = 1.0
+# ... doubling with every failure in a row, but not longer than
+BACKOFF_MAX = 60.0
+# How many times should an item be retried after a 401 or 5xx?
+MAX_RETRIES = 3
+
+###############################################################################
+
+
+class AdaptiveConcurrency(object):
+    """
+    AIMD (additive increase, multiplicative decrease) controller for the
+    number of download threads that may talk to the PMS at the same time.
+
+    DownloadUtils.downloadUrl reports every request (latency and HTTP status)
+    of a thread that called attach(). Once every active thread completed a
+    request without trouble, one more thread may download. On a 401, 5xx or
+    connection error - or if the PMS becomes a lot slower than it used to
+    be - the number of active threads is halved and ALL threads pause for a
+    while (doubling with every failure in a row).
+
+    Usage for download thread number index (0, 1, ...):
+        controller.attach()
+        while ...:
+            if not controller.admit(index):
+                sleep; continue
+            download
+            if failed and controller.should_retry(): retry
+    """
+    def __init__(self, maximum, minimum=MIN_WORKERS, start=START_WORKERS):
+        self.maximum = max(maximum, 1)
+        self.minimum = min(minimum, self.maximum)
+        self.limit = float(max(self.minimum, min(start, self.maximum)))
+        self.lock = Lock()
+        # Per thread: did the last request fail in a way worth retrying?
+        self.thread = local()
+        self.latency = None
+        self.bestLatency = None
+        self.requests = 0
+        self.errors = 0
+        self.failuresInRow = 0
+        self.backoffUntil = 0.0
+        self.lastDecrease = 0.0
+
+    def attach(self):
+        """
+        Call from the download thread in order to report all its requests
+        """
+        set_monitor(self)
+
+    def detach(self):
+        set_monitor(None)
+
+    def admit(self, index):
+        """
+        Returns True if download thread number index may download now
+        """
+        with self.lock:
+            return index < int(self.limit) and time() >= self.backoffUntil
+
+    def should_retry(self):
+        """
+        Returns True if the last request of this thread failed because the
+        PMS is under strain (401, 5xx, connection error)
+        """
+        return getattr(self.thread, 'failed', False)
+
+    def request_done(self, latency, status):
+        """
+        Called by DownloadUtils.downloadUrl. status is the HTTP status code
+        or None if we did not get any answer
+        """
+        failed = status is None or status == 401 or status >= 500
+        self.thread.failed = failed
+        now = time()
+        with self.lock:
+            self.requests += 1
+            if failed:
+                self.errors += 1
+                self.failuresInRow += 1
+                backoff = min(BACKOFF_MAX,
+                              BACKOFF_MIN * 2 ** (self.failuresInRow - 1))
+                self.backoffUntil = max(self.backoffUntil, now + backoff)
+                self._decrease(now, 'HTTP status %s' % status)
+                return
+            self.failuresInRow = 0
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = (LATENCY_WEIGHT * latency +
+                                (1 - LATENCY_WEIGHT) * self.latency)
+            if self.bestLatency is None or self.latency < self.bestLatency:
+                self.bestLatency = self.latency
+            if self.latency > LATENCY_FACTOR * self.bestLatency:
+                self._decrease(now, 'latency %.2fs' % self.latency)
+                # The PMS might just be busier now - forget the very best
+                self.bestLatency = self.latency / LATENCY_FACTOR * 2
+            elif self.limit < self.maximum:
+                # One more thread once every thread succeeded once
+                self.limit = min(float(self.maximum),
+                                 self.limit + 1.0 / int(self.limit))
+
+    def _decrease(self, now, reason):
+        """
+        Halves the number of active threads - at most once per round trip
+        since requests already underway will fail as well. Hold self.lock!
+        """
+        if now - self.lastDecrease < (self.latency or BACKOFF_MIN):
+            return
+        self.lastDecrease = now
+        old = int(self.limit)
+        self.limit = float(max(self.minimum, old // 2))
+        log.info('Reducing download threads from %s to %s due to %s'
+                 % (old, int(self.limit), reason))
+
+    def metrics(self):
+        """
+        Returns a dict with the current state, e.g. for the progress dialog
+        """
+        with self.lock:
+            return {
+                'threads': int(self.limit),
+                'maximum': self.maximum,
+                'latency': self.latency,
+                'requests': self.requests,
+                'errors': self.errors,
+                'backoff': max(0.0, self.backoffUntil - time())
+            }
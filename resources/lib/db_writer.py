@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+###############################################################################
+
+import logging
+from threading import local
+from time import time
+
+from utils import kodiSQL
+
+###############################################################################
+
+log = logging.getLogger("PLEX."+__name__)
+
+# Commit changes after this many items ...
+COMMIT_ITEMS = 200
+# ... or after this many seconds, whatever comes first
+COMMIT_SECONDS = 5.0
+
+# Holds the DBWriter that is active for the current thread
+_THREAD = local()
+
+###############################################################################
+
+
+def current_writer():
+    """
+    Returns the DBWriter that is active for the current thread or None
+    """
+    return getattr(_THREAD, 'writer', None)
+
+
+class DBWriter(object):
+    """
+    Usage: with DBWriter() as writer:
+               with itemtypes.Movies() as movie:
+                   movie.add_update(xml)
+               writer.item_done()
+
+    Owns ONE connection per DB ('video', 'music', 'plex', ...), opened on
+    first use, for the current thread. While the writer is active,
+    itemtypes.Items, plexdb.Get_Plex_DB and kodidb.GetKodiDB lease these
+    connections instead of opening, committing and closing their own. Hence
+    sqlite's statement cache is reused across items.
+
+    Changes are committed every commit_items items or commit_seconds seconds
+    and, no matter what, on exiting "with". If another DBWriter is already
+    active for this thread, that outer writer is used instead.
+    """
+    def __init__(self, commit_items=COMMIT_ITEMS,
+                 commit_seconds=COMMIT_SECONDS):
+        self.commit_items = commit_items
+        self.commit_seconds = commit_seconds
+        self.connections = {}
+        # Caches that are only valid for this writer session, e.g.
+        # kodidb_functions.NameIdCache. Need to implement committed()
+        self.caches = {}
+        self.outer = None
+        self.items = 0
+        self.last_commit = time()
+
+    def __enter__(self):
+        self.outer = current_writer()
+        if self.outer is not None:
+            return self.outer
+        _THREAD.writer = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Make sure DB changes are committed and connections are closed.
+        """
+        if self.outer is not None:
+            return
+        _THREAD.writer = None
+        for conn in self.connections.itervalues():
+            conn.commit()
+            conn.close()
+        self.connections = {}
+        self.caches = {}
+
+    def connection(self, db_type):
+        """
+        Returns the sqlite connection to the db_type DB, e.g. 'video'
+        """
+        conn = self.connections.get(db_type)
+        if conn is None:
+            conn = kodiSQL(db_type)
+            # We commit rarely and in bulk; no need to sync every write
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.connections[db_type] = conn
+        return conn
+
+    def item_done(self):
+        """
+        Call once an item has been processed. Commits if necessary
+        """
+        self.items += 1
+        self.commit_if_due()
+
+    def commit_if_due(self):
+        """
+        Commits if enough items are pending or if the last commit was too
+        long ago. Call e.g. while waiting for new items
+        """
+        if self.items == 0:
+            return
+        if (self.items >= self.commit_items or
+                time() - self.last_commit >= self.commit_seconds):
+            self.commit()
+
+    def commit(self):
+        """
+        Commits all open connections
+        """
+        for conn in self.connections.itervalues():
+            conn.commit()
+        for cache in self.caches.itervalues():
+            cache.committed()
+        log.debug('Committed %s items to the DBs' % self.items)
+        self.items = 0
+        self.last_commit = time()
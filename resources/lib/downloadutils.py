@@ -3,11 +3,14 @@
 ###############################################################################
 
 import logging
+from threading import local
+from time import time
 import requests
 import xml.etree.ElementTree as etree
 
 from utils import settings, window, language as lang, dialog
 import clientinfo as client
+import metrics
 
 ###############################################################################
 
@@ -17,9 +20,21 @@ requests.packages.urllib3.disable_warnings()
 
 log = logging.getLogger("PLEX."+__name__)
 
+# Holds the monitor that gets told about every request of the current thread
+_THREAD = local()
+
 ###############################################################################
 
 
+def set_monitor(monitor):
+    """
+    All requests of the current thread are reported to monitor by calling
+    monitor.request_done(latency, status) with the latency in seconds and the
+    HTTP status code (None if we did not get an answer). Pass None to stop
+    """
+    _THREAD.monitor = monitor
+
+
 class DownloadUtils():
     """
     Manages any up/downloads with PKC. Careful to initiate correctly
@@ -45,21 +60,21 @@ class DownloadUtils():
         Reserved for userclient only
         """
         self.username = username
-        log.debug("Set username: %s" % username)
+        log.debug("Set username: %s", username)
 
     def setUserId(self, userId):
         """
         Reserved for userclient only
         """
         self.userId = userId
-        log.debug("Set userId: %s" % userId)
+        log.debug("Set userId: %s", userId)
 
     def setServer(self, server):
         """
         Reserved for userclient only
         """
         self.server = server
-        log.debug("Set server: %s" % server)
+        log.debug("Set server: %s", server)
 
     def setToken(self, token):
         """
@@ -83,8 +98,8 @@ class DownloadUtils():
             verifySSL = settings('sslverify')
         if certificate is None:
             certificate = settings('sslcert')
-        log.debug("Verify SSL certificates set to: %s" % verifySSL)
-        log.debug("SSL client side certificate set to: %s" % certificate)
+        log.debug("Verify SSL certificates set to: %s", verifySSL)
+        log.debug("SSL client side certificate set to: %s", certificate)
         if verifySSL != 'true':
             self.s.verify = False
         if certificate != 'None':
@@ -122,7 +137,7 @@ class DownloadUtils():
         self.s.mount("http://", requests.adapters.HTTPAdapter(max_retries=1))
         self.s.mount("https://", requests.adapters.HTTPAdapter(max_retries=1))
 
-        log.info("Requests session started on: %s" % self.server)
+        log.info("Requests session started on: %s", self.server)
 
     def stopSession(self):
         try:
@@ -156,13 +171,17 @@ class DownloadUtils():
 
     def downloadUrl(self, url, action_type="GET", postBody=None,
                     parameters=None, authenticate=True, headerOptions=None,
-                    verifySSL=True, timeout=None):
+                    verifySSL=True, timeout=None, stream=False):
         """
         Override SSL check with verifySSL=False
 
         If authenticate=True, existing request session will be used/started
         Otherwise, 'empty' request will be made
 
+        If stream=True, the body of a 200 answer is NOT downloaded. Instead,
+        the requests response is returned - read it from response.raw and
+        make sure to call response.close() once you're done
+
         Returns:
             None              If an error occured
             True               If connection worked but no body was received
@@ -170,6 +189,7 @@ class DownloadUtils():
                                (unauthorized) or other http error codes
             xml                xml etree root object, if applicable
             JSON               json() object, if applicable
+            response           requests response object, if stream=True
         """
         kwargs = {'timeout': self.timeout}
         if authenticate is True:
@@ -187,8 +207,9 @@ class DownloadUtils():
             # plex.tv and to check for PMS servers
             s = requests
             headerOptions = self.getHeader(options=headerOptions)
-            if settings('sslcert') != 'None':
-                kwargs['cert'] = settings('sslcert')
+            certificate = settings('sslcert')
+            if certificate != 'None':
+                kwargs['cert'] = certificate
 
         # Set the variables we were passed (fallback to request session
         # otherwise - faster)
@@ -203,35 +224,39 @@ class DownloadUtils():
             kwargs['params'] = parameters
         if timeout is not None:
             kwargs['timeout'] = timeout
+        if stream is True:
+            kwargs['stream'] = True
 
         # ACTUAL DOWNLOAD HAPPENING HERE
+        monitor = getattr(_THREAD, 'monitor', None)
+        start = time()
         try:
             r = self._doDownload(s, action_type, **kwargs)
 
         # THE EXCEPTIONS
         except requests.exceptions.ConnectionError as e:
             # Connection error
-            log.debug("Server unreachable at: %s" % url)
+            log.debug("Server unreachable at: %s", url)
             log.debug(e)
 
         except requests.exceptions.Timeout as e:
-            log.debug("Server timeout at: %s" % url)
+            log.debug("Server timeout at: %s", url)
             log.debug(e)
 
         except requests.exceptions.HTTPError as e:
-            log.warn('HTTP Error at %s' % url)
+            log.warn('HTTP Error at %s', url)
             log.warn(e)
 
         except requests.exceptions.SSLError as e:
-            log.warn("Invalid SSL certificate for: %s" % url)
+            log.warn("Invalid SSL certificate for: %s", url)
             log.warn(e)
 
         except requests.exceptions.TooManyRedirects as e:
-            log.warn("Too many redirects connecting to: %s" % url)
+            log.warn("Too many redirects connecting to: %s", url)
             log.warn(e)
 
         except requests.exceptions.RequestException as e:
-            log.warn("Unknown error connecting to: %s" % url)
+            log.warn("Unknown error connecting to: %s", url)
             log.warn(e)
 
         except SystemExit:
@@ -245,6 +270,10 @@ class DownloadUtils():
 
         # THE RESPONSE #####
         else:
+            latency = time() - start
+            metrics.request_done(url, latency, r.status_code)
+            if monitor is not None:
+                monitor.request_done(latency, r.status_code)
             # We COULD contact the PMS, hence it ain't dead
             if authenticate is True:
                 window('countError', value='0')
@@ -263,7 +292,7 @@ class DownloadUtils():
                     # Called when checking a connect - no need for rash action
                     return 401
                 r.encoding = 'utf-8'
-                log.warn('HTTP error 401 from PMS %s' % url)
+                log.warn('HTTP error 401 from PMS %s', url)
                 log.info(r.text)
                 if '401 Unauthorized' in r.text:
                     # Truly unauthorized
@@ -272,7 +301,7 @@ class DownloadUtils():
                     if (int(window('countUnauthorized')) >=
                             self.unauthorizedAttempts):
                         log.warn('We seem to be truly unauthorized for PMS'
-                                 ' %s ' % url)
+                                 ' %s ', url)
                         if window('plex_serverStatus') not in ('401', 'Auth'):
                             # Tell userclient token has been revoked.
                             log.debug('Setting PMS server status to '
@@ -287,6 +316,11 @@ class DownloadUtils():
                     log.info('PMS might only be under strain')
                 return 401
 
+            elif r.status_code == 200 and stream is True:
+                # Let the caller read the body piece by piece
+                r.raw.decode_content = True
+                return r
+
             elif r.status_code in (200, 201):
                 # 200: OK
                 # 201: Created
@@ -310,23 +344,32 @@ class DownloadUtils():
                             pass
                         else:
                             log.error("Unable to convert the response for: "
-                                      "%s" % url)
-                            log.info("Received headers were: %s" % r.headers)
+                                      "%s", url)
+                            log.info("Received headers were: %s", r.headers)
                             log.info('Received text:')
                             log.info(r.text)
                         return True
             elif r.status_code == 403:
                 # E.g. deleting a PMS item
-                log.error('PMS sent 403: Forbidden error for url %s' % url)
+                log.error('PMS sent 403: Forbidden error for url %s', url)
                 return None
+            elif r.status_code == 503:
+                # PMS is busy (e.g. too many simultaneous requests)
+                log.warn('PMS sent 503: Service unavailable for url %s', url)
+                r.content
+                return 503
             else:
                 log.error('Unknown answer from PMS %s with status code %s. '
-                          'Message:' % (url, r.status_code))
+                          'Message:', url, r.status_code)
                 r.encoding = 'utf-8'
                 log.info(r.text)
                 return True
 
         # And now deal with the consequences of the exceptions
+        latency = time() - start
+        metrics.request_done(url, latency, None)
+        if monitor is not None:
+            monitor.request_done(latency, None)
         if authenticate is True:
             # Make the addon aware of status
             try:
@@ -334,7 +377,7 @@ class DownloadUtils():
                        value=str(int(window('countError')) + 1))
                 if int(window('countError')) >= self.connectionAttempts:
                     log.warn('Failed to connect to %s too many times. '
-                             'Declare PMS dead' % url)
+                             'Declare PMS dead', url)
                     window('plex_online', value="false")
             except:
                 # 'countError' not yet set
@@ -8,7 +8,7 @@ from urllib import urlencode
 import xbmcplugin
 from xbmc import sleep, Player, executebuiltin, getCondVisibility, \
     translatePath
-from xbmcgui import ListItem
+from xbmcgui import ListItem, Dialog
 
 from utils import window, settings, language as lang, dialog, tryDecode,\
     tryEncode, CatchExceptions, JSONRPC
@@ -193,9 +193,31 @@ def doMainListing():
     # addDirectoryItem("Add user to session", "plugin://plugin.video.plexkodiconnect/?mode=adduser")
     addDirectoryItem(lang(39203), "plugin://plugin.video.plexkodiconnect/?mode=refreshplaylist")
     addDirectoryItem(lang(39204), "plugin://plugin.video.plexkodiconnect/?mode=manualsync")
+    # Sync metrics
+    addDirectoryItem(lang(39212),
+                     "plugin://plugin.video.plexkodiconnect/?mode=metrics",
+                     folder=False)
     xbmcplugin.endOfDirectory(HANDLE)
 
 
+def showMetrics():
+    """
+    Shows the metrics the service recorded during the last full sync
+    """
+    from metrics import FILE, load, report
+    data = load()
+    if data is None:
+        # "No sync metrics recorded yet"
+        dialog('ok', heading='{plex}', line1=lang(39216))
+        return
+    try:
+        Dialog().textviewer(lang(39212), report(data))
+    except AttributeError:
+        # Kodi 15 and older: no textviewer
+        log.info('Sync metrics:\n%s', report(data))
+        dialog('ok', heading='{plex}', line1=lang(39212), line2=FILE)
+
+
 ##### Generate a new deviceId
 def resetDeviceId():
     deviceId_old = window('plex_client_Id')
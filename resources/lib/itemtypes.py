@@ -12,6 +12,8 @@ from utils import tryEncode, tryDecode, settings, window, kodiSQL, \
     CatchExceptions
 import plexdb_functions as plexdb
 import kodidb_functions as kodidb
+from db_writer import current_writer
+import metrics
 
 import PlexAPI
 from PlexFunctions import GetPlexMetadata
@@ -29,9 +31,11 @@ class Items(object):
     Items to be called with "with Items() as xxx:" to ensure that __enter__
     method is called (opens db connections)
 
-    Input:
-        kodiType:       optional argument; e.g. 'video' or 'music'
+    If a db_writer.DBWriter is active for the current thread, its connections
+    are leased instead (and committed by the DBWriter)
     """
+    # Kodi DB that we're working with, e.g. 'video' or 'music'
+    kodi_db_type = 'video'
 
     def __init__(self):
         self.directpath = window('useDirectPaths') == 'true'
@@ -44,24 +48,45 @@ class Items(object):
         """
         Open DB connections and cursors
         """
-        self.plexconn = kodiSQL('plex')
+        self.writer = current_writer()
+        if self.writer is None:
+            self.plexconn = kodiSQL('plex')
+            self.kodiconn = kodiSQL(self.kodi_db_type)
+        else:
+            self.plexconn = self.writer.connection('plex')
+            self.kodiconn = self.writer.connection(self.kodi_db_type)
         self.plexcursor = self.plexconn.cursor()
-        self.kodiconn = kodiSQL('video')
-        self.kodicursor = self.kodiconn.cursor()
+        # Counts rows written per Kodi table and statements per item
+        self.kodicursor = metrics.CountingCursor(
+            self.kodiconn.cursor(), 'sql.rows.%s' % self.kodi_db_type)
         self.plex_db = plexdb.Plex_DB_Functions(self.plexcursor)
-        self.kodi_db = kodidb.Kodidb_Functions(self.kodicursor)
+        self.kodi_db = kodidb.Kodidb_Functions(
+            self.kodicursor,
+            cache=kodidb.session_cache(self.writer, self.kodi_db_type),
+            ids=kodidb.session_ids(self.writer, self.kodi_db_type))
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
         Make sure DB changes are committed and connection to DB is closed.
         """
+        if self.writer is not None:
+            # The DBWriter will commit and close for us
+            self.writer.item_done()
+            return self
         self.plexconn.commit()
         self.kodiconn.commit()
         self.plexconn.close()
         self.kodiconn.close()
         return self
 
+    def remove_many(self, plex_ids):
+        """
+        Removes all items with plex_ids. Overwrite with something faster
+        """
+        for plex_id in plex_ids:
+            self.remove(plex_id)
+
     @CatchExceptions(warnuser=True)
     def getfanart(self, plex_id, refresh=False):
         """
@@ -75,8 +100,8 @@ class Items(object):
             kodi_id = db_item[0]
             kodi_type = db_item[4]
         except TypeError:
-            log.error('Could not get Kodi id for plex id %s, abort getfanart'
-                      % plex_id)
+            log.error('Could not get Kodi id for plex id %s, abort getfanart',
+                      plex_id)
             return False
         if refresh is True:
             # Leave the Plex art untouched
@@ -91,14 +116,14 @@ class Items(object):
                     needsupdate = True
                     break
             if needsupdate is False:
-                log.debug('Already got all fanart for Plex id %s' % plex_id)
+                log.debug('Already got all fanart for Plex id %s', plex_id)
                 return True
 
         xml = GetPlexMetadata(plex_id)
         if xml is None:
             # Did not receive a valid XML - skip that item for now
             log.error("Could not get metadata for %s. Skipping that item "
-                      "for now" % plex_id)
+                      "for now", plex_id)
             return False
         elif xml == 401:
             log.error('HTTP 401 returned by PMS. Too much strain? '
@@ -115,7 +140,7 @@ class Items(object):
         # Also get artwork for collections/movie sets
         if kodi_type == v.KODI_TYPE_MOVIE:
             for setname in API.getCollections():
-                log.debug('Getting artwork for movie set %s' % setname)
+                log.debug('Getting artwork for movie set %s', setname)
                 setid = self.kodi_db.createBoxset(setname)
                 self.artwork.addArtwork(API.getSetArtwork(),
                                         setid,
@@ -182,6 +207,7 @@ class Items(object):
 class Movies(Items):
 
     @CatchExceptions(warnuser=True)
+    @metrics.count_statements
     def add_update(self, item, viewtag=None, viewid=None):
         # Process single movie
         kodicursor = self.kodicursor
@@ -207,8 +233,7 @@ class Movies(Items):
         except TypeError:
             # movieid
             update_item = False
-            kodicursor.execute("select coalesce(max(idMovie),0) from movie")
-            movieid = kodicursor.fetchone()[0] + 1
+            movieid = self.kodi_db.ids.next_id('movie', 'idMovie')
 
         else:
             # Verification the item is still in Kodi
@@ -219,8 +244,8 @@ class Movies(Items):
             except TypeError:
                 # item is not found, let's recreate it.
                 update_item = False
-                log.info("movieid: %s missing from Kodi, repairing the entry."
-                         % movieid)
+                log.info("movieid: %s missing from Kodi, repairing the entry.",
+                         movieid)
 
         # fileId information
         checksum = API.getChecksum()
@@ -309,8 +334,8 @@ class Movies(Items):
 
         # UPDATE THE MOVIE #####
         if update_item:
-            log.info("UPDATE movie itemid: %s - Title: %s"
-                     % (itemid, title))
+            log.info("UPDATE movie itemid: %s - Title: %s",
+                     itemid, title)
             # Update the movie entry
             if v.KODIVERSION >= 17:
                 # update new ratings Kodi 17
@@ -358,7 +383,7 @@ class Movies(Items):
 
         # OR ADD THE MOVIE #####
         else:
-            log.info("ADD movie itemid: %s - Title: %s" % (itemid, title))
+            log.info("ADD movie itemid: %s - Title: %s", itemid, title)
             if v.KODIVERSION >= 17:
                 # add new ratings Kodi 17
                 self.kodi_db.add_ratings(self.kodi_db.create_entry_rating(),
@@ -380,7 +405,7 @@ class Movies(Items):
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
                         ?, ?, ?, ?, ?, ?, ?)
                 '''
-                kodicursor.execute(query, (movieid, fileid, title, plot,
+                self.kodi_db.execute_new(query, (movieid, fileid, title, plot,
                     shortplot, tagline, votecount, rating, writer, year, imdb,
                     sorttitle, runtime, mpaa, genre, director, title, studio,
                     trailer, country, playurl, pathid, year,
@@ -393,7 +418,7 @@ class Movies(Items):
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
                         ?, ?, ?, ?, ?)
                 '''
-                kodicursor.execute(query, (movieid, fileid, title, plot,
+                self.kodi_db.execute_new(query, (movieid, fileid, title, plot,
                     shortplot, tagline, votecount, rating, writer, year, imdb,
                     sorttitle, runtime, mpaa, genre, director, title, studio,
                     trailer, country, playurl, pathid))
@@ -463,8 +488,8 @@ class Movies(Items):
             kodi_id = plex_dbitem[0]
             file_id = plex_dbitem[1]
             kodi_type = plex_dbitem[4]
-            log.info("Removing %sid: %s file_id: %s"
-                     % (kodi_type, kodi_id, file_id))
+            log.info("Removing %sid: %s file_id: %s",
+                     kodi_type, kodi_id, file_id)
         except TypeError:
             return
 
@@ -493,12 +518,46 @@ class Movies(Items):
                 # Update plex reference
                 plex_db.updateParentId(plexid, None)
             kodicursor.execute("DELETE FROM sets WHERE idSet = ?", (kodi_id,))
-        log.info("Deleted %s %s from kodi database" % (kodi_type, itemid))
+        log.info("Deleted %s %s from kodi database", kodi_type, itemid)
+
+    def remove_many(self, plex_ids):
+        """
+        Removes all movies with plex_ids with a few bulk statements. Other
+        items, e.g. sets, are removed one by one
+        """
+        plex_ids = set(plex_ids)
+        plex_db = self.plex_db
+        kodicursor = self.kodicursor
+        movies = []
+        files = []
+        for plex_id, kodi_id, file_id, _, _ in plex_db.getItems_byKodiTypes(
+                (v.KODI_TYPE_MOVIE,)):
+            if plex_id in plex_ids:
+                plex_ids.remove(plex_id)
+                movies.append((plex_id, kodi_id))
+                files.append(file_id)
+        if movies:
+            log.info("Removing %s movies", len(movies))
+            kodi_ids = [movie[1] for movie in movies]
+            # Art first - Kodi's triggers delete the art table entries
+            self.artwork.deleteArtworks({v.KODI_TYPE_MOVIE: kodi_ids},
+                                        kodicursor)
+            kodicursor.executemany("DELETE FROM movie WHERE idMovie = ?",
+                                   ((kodi_id,) for kodi_id in kodi_ids))
+            kodicursor.executemany("DELETE FROM files WHERE idFile = ?",
+                                   ((file_id,) for file_id in files))
+            if v.KODIVERSION >= 17:
+                self.kodi_db.remove_uniqueids(kodi_ids, v.KODI_TYPE_MOVIE)
+                self.kodi_db.remove_all_ratings(kodi_ids, v.KODI_TYPE_MOVIE)
+            plex_db.removeItems(movie[0] for movie in movies)
+        for plex_id in plex_ids:
+            self.remove(plex_id)
 
 
 class TVShows(Items):
 
     @CatchExceptions(warnuser=True)
+    @metrics.count_statements
     def add_update(self, item, viewtag=None, viewid=None):
         # Process single tvshow
         kodicursor = self.kodicursor
@@ -522,8 +581,7 @@ class TVShows(Items):
             pathid = plex_dbitem[2]
         except TypeError:
             update_item = False
-            kodicursor.execute("select coalesce(max(idShow),0) from tvshow")
-            showid = kodicursor.fetchone()[0] + 1
+            showid = self.kodi_db.ids.next_id('tvshow', 'idShow')
 
         else:
             # Verification the item is still in Kodi
@@ -534,8 +592,8 @@ class TVShows(Items):
             except TypeError:
                 # item is not found, let's recreate it.
                 update_item = False
-                log.info("showid: %s missing from Kodi, repairing the entry."
-                         % showid)
+                log.info("showid: %s missing from Kodi, repairing the entry.",
+                         showid)
                 # Force re-add episodes after the show is re-created.
                 force_episodes = True
 
@@ -592,8 +650,8 @@ class TVShows(Items):
         pathid = self.kodi_db.addPath(path)
         # UPDATE THE TVSHOW #####
         if update_item:
-            log.info("UPDATE tvshow itemid: %s - Title: %s"
-                     % (itemid, title))
+            log.info("UPDATE tvshow itemid: %s - Title: %s",
+                     itemid, title)
             if v.KODIVERSION >= 17:
                 # update new ratings Kodi 17
                 ratingid = self.kodi_db.get_ratingid(showid)
@@ -633,7 +691,7 @@ class TVShows(Items):
         
         ##### OR ADD THE TVSHOW #####
         else:
-            log.info("ADD tvshow itemid: %s - Title: %s" % (itemid, title))
+            log.info("ADD tvshow itemid: %s - Title: %s", itemid, title)
             if v.KODIVERSION >= 17:
                 # add new ratings Kodi 17
                 ratingid = self.kodi_db.create_entry_rating()
@@ -667,7 +725,7 @@ class TVShows(Items):
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 '''
             )
-            kodicursor.execute(query, (showid, title, plot, rating, premieredate, genre,
+            self.kodi_db.execute_new(query, (showid, title, plot, rating, premieredate, genre,
                 title, tvdb, mpaa, studio, sorttitle))
 
             # Link the path
@@ -714,6 +772,7 @@ class TVShows(Items):
         #     self.added_episode(all_episodes['Items'], None)
 
     @CatchExceptions(warnuser=True)
+    @metrics.count_statements
     def add_updateSeason(self, item, viewtag=None, viewid=None):
         API = PlexAPI.API(item)
         plex_id = API.getRatingKey()
@@ -732,7 +791,7 @@ class TVShows(Items):
             showid = plex_dbitem[0]
         except:
             log.error('Could not find parent tv show for season %s. '
-                      'Skipping season for now.' % (plex_id))
+                      'Skipping season for now.', plex_id)
             return
 
         seasonid = self.kodi_db.addSeason(showid, seasonnum)
@@ -763,6 +822,7 @@ class TVShows(Items):
                                  checksum=checksum)
 
     @CatchExceptions(warnuser=True)
+    @metrics.count_statements
     def add_updateEpisode(self, item, viewtag=None, viewid=None):
         """
         """
@@ -788,8 +848,7 @@ class TVShows(Items):
         except TypeError:
             update_item = False
             # episodeid
-            kodicursor.execute("select coalesce(max(idEpisode),0) from episode")
-            episodeid = kodicursor.fetchone()[0] + 1
+            episodeid = self.kodi_db.ids.next_id('episode', 'idEpisode')
 
         else:
             # Verification the item is still in Kodi
@@ -800,8 +859,8 @@ class TVShows(Items):
             except TypeError:
                 # item is not found, let's recreate it.
                 update_item = False
-                log.info("episodeid: %s missing from Kodi, repairing entry."
-                         % episodeid)
+                log.info("episodeid: %s missing from Kodi, repairing entry.",
+                         episodeid)
 
         # fileId information
         checksum = API.getChecksum()
@@ -913,7 +972,7 @@ class TVShows(Items):
 
         # UPDATE THE EPISODE #####
         if update_item:
-            log.info("UPDATE episode itemid: %s" % (itemid))
+            log.info("UPDATE episode itemid: %s", itemid)
             # Update the movie entry
             if v.KODIVERSION >= 17:
                 # Kodi Krypton
@@ -959,7 +1018,7 @@ class TVShows(Items):
 
         # OR ADD THE EPISODE #####
         else:
-            log.info("ADD episode itemid: %s - Title: %s" % (itemid, title))
+            log.info("ADD episode itemid: %s - Title: %s", itemid, title)
             # Create the episode entry
             if v.KODIVERSION >= 17:
                 # Kodi Krypton
@@ -970,9 +1029,9 @@ class TVShows(Items):
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
                     ?, ?)
                 '''
-                kodicursor.execute(query, (episodeid, fileid, title, plot,
-                    rating, writer, premieredate, runtime, director, season,
-                    episode, title, showid, airsBeforeSeason,
+                self.kodi_db.execute_new(query, (episodeid, fileid, title,
+                    plot, rating, writer, premieredate, runtime, director,
+                    season, episode, title, showid, airsBeforeSeason,
                     airsBeforeEpisode, playurl, pathid, seasonid,
                     userdata['UserRating']))
             elif v.KODIVERSION == 16:
@@ -984,9 +1043,9 @@ class TVShows(Items):
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
                         ?)
                     '''
-                kodicursor.execute(query, (episodeid, fileid, title, plot,
-                    rating, writer, premieredate, runtime, director, season,
-                    episode, title, showid, airsBeforeSeason,
+                self.kodi_db.execute_new(query, (episodeid, fileid, title,
+                    plot, rating, writer, premieredate, runtime, director,
+                    season, episode, title, showid, airsBeforeSeason,
                     airsBeforeEpisode, playurl, pathid, seasonid))
             else:
                 query = (
@@ -998,7 +1057,7 @@ class TVShows(Items):
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     '''
                 )
-                kodicursor.execute(query, (episodeid, fileid, title, plot, rating, writer,
+                self.kodi_db.execute_new(query, (episodeid, fileid, title, plot, rating, writer,
                     premieredate, runtime, director, season, episode, title, showid,
                     airsBeforeSeason, airsBeforeEpisode, playurl, pathid))
 
@@ -1085,8 +1144,8 @@ class TVShows(Items):
             fileid = plex_dbitem[1]
             parentid = plex_dbitem[3]
             mediatype = plex_dbitem[4]
-            log.info("Removing %s kodiid: %s fileid: %s"
-                     % (mediatype, kodiid, fileid))
+            log.info("Removing %s kodiid: %s fileid: %s",
+                     mediatype, kodiid, fileid)
         except TypeError:
             return
 
@@ -1182,7 +1241,89 @@ class TVShows(Items):
                 self.removeShow(parentid)
                 plex_db.removeItem_byKodiId(parentid, v.KODI_TYPE_SHOW)
 
-        log.debug("Deleted %s: %s from kodi database" % (mediatype, itemid))
+        log.debug("Deleted %s: %s from kodi database", mediatype, itemid)
+
+    def remove_many(self, plex_ids):
+        """
+        Removes all shows, seasons and episodes with plex_ids at once. First
+        figures out every affected episode, season and show - like remove(),
+        seasons without episodes and shows without episodes or seasons are
+        removed as well - then deletes them with a few bulk statements
+        """
+        plex_ids = set(plex_ids)
+        plex_db = self.plex_db
+        kodicursor = self.kodicursor
+        # Everything we know about TV shows in one go
+        shows = {}      # kodi_id: plex_id
+        seasons = {}    # kodi_id: (plex_id, show kodi_id)
+        episodes = {}   # kodi_id: (plex_id, file_id, season kodi_id)
+        for plex_id, kodi_id, file_id, parent_id, kodi_type in \
+                plex_db.getItems_byKodiTypes((v.KODI_TYPE_SHOW,
+                                              v.KODI_TYPE_SEASON,
+                                              v.KODI_TYPE_EPISODE)):
+            if kodi_type == v.KODI_TYPE_EPISODE:
+                episodes[kodi_id] = (plex_id, file_id, parent_id)
+            elif kodi_type == v.KODI_TYPE_SEASON:
+                seasons[kodi_id] = (plex_id, parent_id)
+            else:
+                shows[kodi_id] = plex_id
+
+        # Items to delete directly plus their children
+        del_shows = set(kodi_id for kodi_id, plex_id in shows.iteritems()
+                        if plex_id in plex_ids)
+        del_seasons = set(kodi_id for kodi_id, season in seasons.iteritems()
+                          if season[0] in plex_ids or season[1] in del_shows)
+        del_episodes = set(kodi_id for kodi_id, episode in episodes.iteritems()
+                           if episode[0] in plex_ids or
+                           episode[2] in del_seasons)
+        # Seasons and shows that lost episodes or seasons - anything left?
+        left_seasons = set(episode[2]
+                           for kodi_id, episode in episodes.iteritems()
+                           if kodi_id not in del_episodes)
+        empty_seasons = set(episodes[kodi_id][2] for kodi_id in del_episodes
+                            if episodes[kodi_id][2] not in left_seasons)
+        del_seasons.update(empty_seasons)
+        left_shows = set(seasons[season][1] for season in left_seasons
+                         if season in seasons)
+        touched_shows = set(seasons[season][1] for season in del_seasons
+                            if season in seasons)
+        for show in touched_shows - del_shows:
+            if show not in left_shows:
+                # There are no episodes left - delete show and its seasons
+                del_shows.add(show)
+        for show in touched_shows - del_shows:
+            if not any(season[1] == show and kodi_id not in del_seasons
+                       for kodi_id, season in seasons.iteritems()):
+                # There are no seasons left
+                del_shows.add(show)
+        del_seasons.update(kodi_id for kodi_id, season in seasons.iteritems()
+                           if season[1] in del_shows)
+        if not (del_shows or del_seasons or del_episodes):
+            return
+        log.info("Removing %s shows, %s seasons and %s episodes",
+                 len(del_shows), len(del_seasons), len(del_episodes))
+
+        # Art first - Kodi's triggers delete the art table entries
+        self.artwork.deleteArtworks({v.KODI_TYPE_SHOW: del_shows,
+                                     v.KODI_TYPE_SEASON: del_seasons,
+                                     v.KODI_TYPE_EPISODE: del_episodes},
+                                    kodicursor)
+        kodicursor.executemany("DELETE FROM episode WHERE idEpisode = ?",
+                               ((kodi_id,) for kodi_id in del_episodes))
+        kodicursor.executemany("DELETE FROM files WHERE idFile = ?",
+                               ((episodes[kodi_id][1],)
+                                for kodi_id in del_episodes))
+        kodicursor.executemany("DELETE FROM seasons WHERE idSeason = ?",
+                               ((kodi_id,) for kodi_id in del_seasons))
+        kodicursor.executemany("DELETE FROM tvshow WHERE idShow = ?",
+                               ((kodi_id,) for kodi_id in del_shows))
+        if v.KODIVERSION >= 17:
+            self.kodi_db.remove_uniqueids(del_shows, v.KODI_TYPE_SHOW)
+            self.kodi_db.remove_all_ratings(del_shows, v.KODI_TYPE_SHOW)
+        plex_db.removeItems(
+            [shows[kodi_id] for kodi_id in del_shows] +
+            [seasons[kodi_id][0] for kodi_id in del_seasons] +
+            [episodes[kodi_id][0] for kodi_id in del_episodes])
 
     def removeShow(self, kodi_id):
         kodicursor = self.kodicursor
@@ -1191,23 +1332,25 @@ class TVShows(Items):
         if v.KODIVERSION >= 17:
             self.kodi_db.remove_uniqueid(kodi_id, v.KODI_TYPE_SHOW)
             self.kodi_db.remove_ratings(kodi_id, v.KODI_TYPE_SHOW)
-        log.info("Removed tvshow: %s." % kodi_id)
+        log.info("Removed tvshow: %s.", kodi_id)
 
     def removeSeason(self, kodiid):
         kodicursor = self.kodicursor
         self.artwork.deleteArtwork(kodiid, "season", kodicursor)
         kodicursor.execute("DELETE FROM seasons WHERE idSeason = ?", (kodiid,))
-        log.info("Removed season: %s." % kodiid)
+        log.info("Removed season: %s.", kodiid)
 
     def removeEpisode(self, kodiid, fileid):
         kodicursor = self.kodicursor
         self.artwork.deleteArtwork(kodiid, "episode", kodicursor)
         kodicursor.execute("DELETE FROM episode WHERE idEpisode = ?", (kodiid,))
         kodicursor.execute("DELETE FROM files WHERE idFile = ?", (fileid,))
-        log.info("Removed episode: %s." % kodiid)
+        log.info("Removed episode: %s.", kodiid)
 
 
 class Music(Items):
+    # Here it is, not 'video' but 'music'
+    kodi_db_type = 'music'
 
     def __init__(self):
         Items.__init__(self)
@@ -1217,21 +1360,8 @@ class Music(Items):
         self.enableexportsongrating = settings('enableExportSongRating') == "true"
         self.enableupdatesongrating = settings('enableUpdateSongRating') == "true"
 
-    def __enter__(self):
-        """
-        OVERWRITE this method, because we need to open another DB.
-        Open DB connections and cursors
-        """
-        self.plexconn = kodiSQL('plex')
-        self.plexcursor = self.plexconn.cursor()
-        # Here it is, not 'video' but 'music'
-        self.kodiconn = kodiSQL('music')
-        self.kodicursor = self.kodiconn.cursor()
-        self.plex_db = plexdb.Plex_DB_Functions(self.plexcursor)
-        self.kodi_db = kodidb.Kodidb_Functions(self.kodicursor)
-        return self
-
     @CatchExceptions(warnuser=True)
+    @metrics.count_statements
     def add_updateArtist(self, item, viewtag=None, viewid=None,
                          artisttype="MusicArtist"):
         kodicursor = self.kodicursor
@@ -1272,13 +1402,13 @@ class Music(Items):
 
         # UPDATE THE ARTIST #####
         if update_item:
-            log.info("UPDATE artist itemid: %s - Name: %s" % (itemid, name))
+            log.info("UPDATE artist itemid: %s - Name: %s", itemid, name)
             # Update the checksum in plex table
             plex_db.updateReference(itemid, checksum)
 
         # OR ADD THE ARTIST #####
         else:
-            log.info("ADD artist itemid: %s - Name: %s" % (itemid, name))
+            log.info("ADD artist itemid: %s - Name: %s", itemid, name)
             # safety checks: It looks like plex supports the same artist
             # multiple times.
             # Kodi doesn't allow that. In case that happens we just merge the
@@ -1318,6 +1448,7 @@ class Music(Items):
         artwork.addArtwork(artworks, artistid, "artist", kodicursor)
 
     @CatchExceptions(warnuser=True)
+    @metrics.count_statements
     def add_updateAlbum(self, item, viewtag=None, viewid=None):
         kodicursor = self.kodicursor
         plex_db = self.plex_db
@@ -1369,13 +1500,13 @@ class Music(Items):
 
         # UPDATE THE ALBUM #####
         if update_item:
-            log.info("UPDATE album itemid: %s - Name: %s" % (itemid, name))
+            log.info("UPDATE album itemid: %s - Name: %s", itemid, name)
             # Update the checksum in plex table
             plex_db.updateReference(itemid, checksum)
 
         # OR ADD THE ALBUM #####
         else:
-            log.info("ADD album itemid: %s - Name: %s" % (itemid, name))
+            log.info("ADD album itemid: %s - Name: %s", itemid, name)
             # safety checks: It looks like plex supports the same artist
             # multiple times.
             # Kodi doesn't allow that. In case that happens we just merge the
@@ -1450,8 +1581,8 @@ class Music(Items):
             try:
                 artistid = plex_dbartist[0]
             except TypeError:
-                log.info('Artist %s does not exist in plex database'
-                         % parentId)
+                log.info('Artist %s does not exist in plex database',
+                         parentId)
                 artist = GetPlexMetadata(parentId)
                 # Item may not be an artist, verification necessary.
                 if artist is not None and artist != 401:
@@ -1475,7 +1606,7 @@ class Music(Items):
             artistid = plex_dbartist[0]
         except TypeError:
             # Artist does not exist in plex database, create the reference
-            log.info('Artist %s does not exist in Plex database' % artistId)
+            log.info('Artist %s does not exist in Plex database', artistId)
             artist = GetPlexMetadata(artistId)
             if artist is not None and artist != 401:
                 self.add_updateArtist(artist[0], artisttype="AlbumArtist")
@@ -1485,8 +1616,8 @@ class Music(Items):
             # Best take this name over anything else.
             query = "UPDATE artist SET strArtist = ? WHERE idArtist = ?"
             kodicursor.execute(query, (artistname, artistid,))
-            log.info("UPDATE artist: strArtist: %s, idArtist: %s"
-                     % (artistname, artistid))
+            log.info("UPDATE artist: strArtist: %s, idArtist: %s",
+                     artistname, artistid)
 
         # Add artist to album
         query = (
@@ -1514,6 +1645,7 @@ class Music(Items):
         artwork.addArtwork(artworks, albumid, "album", kodicursor)
 
     @CatchExceptions(warnuser=True)
+    @metrics.count_statements
     def add_updateSong(self, item, viewtag=None, viewid=None):
         # Process single song
         kodicursor = self.kodicursor
@@ -1534,8 +1666,7 @@ class Music(Items):
         except TypeError:
             # Songid not found
             update_item = False
-            kodicursor.execute("select coalesce(max(idSong),0) from song")
-            songid = kodicursor.fetchone()[0] + 1
+            songid = self.kodi_db.ids.next_id('song', 'idSong')
 
         # The song details #####
         checksum = API.getChecksum()
@@ -1595,8 +1726,8 @@ class Music(Items):
 
         # UPDATE THE SONG #####
         if update_item:
-            log.info("UPDATE song itemid: %s - Title: %s with path: %s"
-                     % (itemid, title, path))
+            log.info("UPDATE song itemid: %s - Title: %s with path: %s",
+                     itemid, title, path)
             # Update path
             # Use dummy strHash '123' for Kodi
             query = "UPDATE path SET strPath = ?, strHash = ? WHERE idPath = ?"
@@ -1619,7 +1750,7 @@ class Music(Items):
 
         # OR ADD THE SONG #####
         else:
-            log.info("ADD song itemid: %s - Title: %s" % (itemid, title))
+            log.info("ADD song itemid: %s - Title: %s", itemid, title)
 
             # Add path
             pathid = self.kodi_db.addPath(path, strHash="123")
@@ -1633,8 +1764,8 @@ class Music(Items):
                 # Verify if there's an album associated.
                 album_name = item.get('parentTitle')
                 if album_name:
-                    log.info("Creating virtual music album for song: %s."
-                             % itemid)
+                    log.info("Creating virtual music album for song: %s.",
+                             itemid)
                     albumid = self.kodi_db.addAlbum(album_name, API.getProvider('MusicBrainzAlbum'))
                     plex_db.addReference("%salbum%s" % (itemid, albumid),
                                          v.PLEX_TYPE_ALBUM,
@@ -1643,8 +1774,8 @@ class Music(Items):
                                          view_id=viewid)
                 else:
                     # No album Id associated to the song.
-                    log.error("Song itemid: %s has no albumId associated."
-                              % itemid)
+                    log.error("Song itemid: %s has no albumId associated.",
+                              itemid)
                     return False
 
             except TypeError:
@@ -1659,12 +1790,11 @@ class Music(Items):
                 plex_dbalbum = plex_db.getItem_byId(plex_albumId)
                 try:
                     albumid = plex_dbalbum[0]
-                    log.debug("Found albumid: %s" % albumid)
+                    log.debug("Found albumid: %s", albumid)
                 except TypeError:
                     # No album found, create a single's album
                     log.info("Failed to add album. Creating singles.")
-                    kodicursor.execute("select coalesce(max(idAlbum),0) from album")
-                    albumid = kodicursor.fetchone()[0] + 1
+                    albumid = self.kodi_db.ids.next_id('album', 'idAlbum')
                     if v.KODIVERSION >= 16:
                         # Kodi Jarvis
                         query = (
@@ -1674,7 +1804,7 @@ class Music(Items):
                             VALUES (?, ?, ?, ?)
                             '''
                         )
-                        kodicursor.execute(query, (albumid, genre, year, "single"))
+                        self.kodi_db.execute_new(query, (albumid, genre, year, "single"))
                     elif v.KODIVERSION == 15:
                         # Kodi Isengard
                         query = (
@@ -1684,7 +1814,7 @@ class Music(Items):
                             VALUES (?, ?, ?, ?, ?)
                             '''
                         )
-                        kodicursor.execute(query, (albumid, genre, year, dateadded, "single"))
+                        self.kodi_db.execute_new(query, (albumid, genre, year, dateadded, "single"))
                     else:
                         # Kodi Helix
                         query = (
@@ -1694,7 +1824,7 @@ class Music(Items):
                             VALUES (?, ?, ?, ?)
                             '''
                         )
-                        kodicursor.execute(query, (albumid, genre, year, dateadded))
+                        self.kodi_db.execute_new(query, (albumid, genre, year, dateadded))
 
             # Create the song entry
             query = (
@@ -1707,7 +1837,7 @@ class Music(Items):
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 '''
             )
-            kodicursor.execute(
+            self.kodi_db.execute_new(
                 query, (songid, albumid, pathid, artists, genre, title, track,
                         duration, year, filename, musicBrainzId, playcount,
                         dateplayed, rating, 0, 0))
@@ -1866,7 +1996,7 @@ class Music(Items):
         try:
             kodiid = plex_dbitem[0]
             mediatype = plex_dbitem[4]
-            log.info("Removing %s kodiid: %s" % (mediatype, kodiid))
+            log.info("Removing %s kodiid: %s", mediatype, kodiid)
         except TypeError:
             return
 
@@ -1941,7 +2071,7 @@ class Music(Items):
             # Remove artist
             self.removeArtist(kodiid)
 
-        log.info("Deleted %s: %s from kodi database" % (mediatype, itemid))
+        log.info("Deleted %s: %s from kodi database", mediatype, itemid)
 
     def removeSong(self, kodiid):
         self.artwork.deleteArtwork(kodiid, v.KODI_TYPE_SONG, self.kodicursor)
@@ -4,15 +4,21 @@
 
 import logging
 from ntpath import dirname
+from sqlite3 import IntegrityError
+from string import ascii_uppercase, ascii_lowercase
 
 import artwork
-from utils import kodiSQL
+from utils import kodiSQL, tryDecode
+from db_writer import current_writer
 import variables as v
 
 ###############################################################################
 
 log = logging.getLogger("PLEX."+__name__)
 
+# sqlite's COLLATE NOCASE only folds the 26 ASCII letters
+NOCASE = dict(zip(map(ord, ascii_uppercase), map(ord, ascii_lowercase)))
+
 ###############################################################################
 
 
@@ -25,26 +31,215 @@ class GetKodiDB():
         db_type:       DB to open: 'video', 'music', 'plex', 'texture'
 
     On exiting "with" (no matter what), commits get automatically committed
-    and the db gets closed
+    and the db gets closed - unless a db_writer.DBWriter is active for the
+    current thread. Then its connection is used (and committed by the
+    DBWriter)
     """
     def __init__(self, db_type):
         self.db_type = db_type
 
     def __enter__(self):
-        self.kodiconn = kodiSQL(self.db_type)
-        kodi_db = Kodidb_Functions(self.kodiconn.cursor())
+        self.writer = current_writer()
+        if self.writer is None:
+            self.kodiconn = kodiSQL(self.db_type)
+        else:
+            self.kodiconn = self.writer.connection(self.db_type)
+        kodi_db = Kodidb_Functions(
+            self.kodiconn.cursor(),
+            cache=session_cache(self.writer, self.db_type),
+            ids=session_ids(self.writer, self.db_type))
         return kodi_db
 
     def __exit__(self, type, value, traceback):
+        if self.writer is not None:
+            return
         self.kodiconn.commit()
         self.kodiconn.close()
 
 
-class Kodidb_Functions():
+def session_cache(writer, db_type):
+    """
+    Returns the NameIdCache for the Kodi DB db_type belonging to the
+    db_writer.DBWriter writer. The cache is thrown away together with the
+    writer, i.e. it lives for one sync.
+
+    Returns None if there is no writer or nothing to cache for db_type
+    """
+    if writer is None or db_type != 'video' or v.KODIVERSION <= 14:
+        return None
+    try:
+        cache = writer.caches[('names', db_type)]
+    except KeyError:
+        cache = NameIdCache(writer.connection(db_type).cursor())
+        writer.caches[('names', db_type)] = cache
+    return cache
+
+
+def session_ids(writer, db_type):
+    """
+    Returns the IdAllocator for the Kodi DB db_type belonging to the
+    db_writer.DBWriter writer (or None if there is no writer). The allocator
+    is reset every time the writer commits.
+    """
+    if writer is None:
+        return None
+    try:
+        ids = writer.caches[('ids', db_type)]
+    except KeyError:
+        ids = IdAllocator(writer.connection(db_type).cursor())
+        writer.caches[('ids', db_type)] = ids
+    return ids
+
+
+class IdAllocator(object):
+    """
+    Hands out new ids (primary keys) for Kodi tables. The current maximum is
+    read only once per table; afterwards, ids are counted up in memory.
+
+    Only valid within one transaction - other processes, e.g. Kodi itself,
+    might add entries as soon as we commit. Hence call committed() after
+    committing and reset() if an id turned out to be taken after all.
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.next_ids = {}
+
+    def next_id(self, table, id_column):
+        """
+        Returns a new, unused id for id_column of the Kodi table
+        """
+        try:
+            new_id = self.next_ids[table]
+        except KeyError:
+            self.cursor.execute("select coalesce(max(%s),0) from %s"
+                                % (id_column, table))
+            new_id = self.cursor.fetchone()[0] + 1
+        self.next_ids[table] = new_id + 1
+        return new_id
+
+    def reset(self, table=None):
+        """
+        Forget the ids for table (or for all tables if table=None); they will
+        be read from the DB again
+        """
+        if table is None:
+            self.next_ids = {}
+        else:
+            self.next_ids.pop(table, None)
+
+    def committed(self):
+        self.reset()
+
+
+class NameIdCache(object):
+    """
+    Caches name -> id for Kodi's actor, genre, studio, country and tag tables
+    (Kodi Isengard and later).
+
+    Every table is loaded with one single SELECT the first time it is used.
+    Entries we create ourselves are recorded with add(), so PKC's lookups
+    need to hit the DB only for names the cache has never seen.
+    """
+    # table: (id column, is name compared with COLLATE NOCASE?)
+    TABLES = {
+        'actor': ('actor_id', False),
+        'genre': ('genre_id', True),
+        'studio': ('studio_id', True),
+        'country': ('country_id', True),
+        'tag': ('tag_id', True)
+    }
+
     def __init__(self, cursor):
         self.cursor = cursor
+        self.tables = {}
+
+    def _key(self, table, name):
+        name = tryDecode(name)
+        if self.TABLES[table][1] is True:
+            name = name.translate(NOCASE)
+        return name
+
+    def _load(self, table):
+        ids = {}
+        self.cursor.execute('SELECT %s, name FROM %s'
+                            % (self.TABLES[table][0], table))
+        for entry_id, name in self.cursor.fetchall():
+            if name is None:
+                continue
+            # Keep the first entry, just like a SELECT would
+            ids.setdefault(self._key(table, name), entry_id)
+        log.debug('Cached %s entries of Kodi table %s' % (len(ids), table))
+        self.tables[table] = ids
+        return ids
+
+    def get(self, table, name):
+        """
+        Returns the cached id for name in table or None
+        """
+        try:
+            ids = self.tables[table]
+        except KeyError:
+            ids = self._load(table)
+        return ids.get(self._key(table, name))
+
+    def add(self, table, name, entry_id):
+        """
+        Records entry_id for name in table
+        """
+        try:
+            ids = self.tables[table]
+        except KeyError:
+            ids = self._load(table)
+        ids[self._key(table, name)] = entry_id
+
+    def committed(self):
+        # Names stay valid across commits - nothing to do
+        pass
+
+
+class Kodidb_Functions():
+    def __init__(self, cursor, cache=None, ids=None):
+        """
+        cache:      optional NameIdCache, see session_cache()
+        ids:        optional IdAllocator to share, see session_ids()
+        """
+        self.cursor = cursor
+        self.cache = cache
+        self.ids = ids if ids is not None else IdAllocator(cursor)
         self.artwork = artwork.Artwork()
 
+    def insert_new(self, table, id_column, query, params):
+        """
+        Adds a new entry to the Kodi table with a new id for id_column.
+        query needs to be an INSERT with the id as the very first parameter;
+        pass the remaining parameters in params.
+
+        Returns the new id
+        """
+        new_id = self.ids.next_id(table, id_column)
+        try:
+            self.cursor.execute(query, (new_id,) + tuple(params))
+        except IntegrityError:
+            # Someone else (e.g. Kodi) took that id in the meantime
+            log.warn('Id %s for Kodi table %s already taken, retrying'
+                     % (new_id, table))
+            self.ids.reset(table)
+            new_id = self.ids.next_id(table, id_column)
+            self.cursor.execute(query, (new_id,) + tuple(params))
+        return new_id
+
+    def execute_new(self, query, params):
+        """
+        Executes the INSERT query for an entry whose id was handed out by
+        self.ids earlier. If that id has been taken in the meantime, the
+        allocator is reset before the IntegrityError is raised again
+        """
+        try:
+            self.cursor.execute(query, params)
+        except IntegrityError:
+            self.ids.reset()
+            raise
+
     def pathHack(self):
         """
         Use with Kodi video DB
@@ -77,13 +272,11 @@ class Kodidb_Functions():
             parentpath = "%s/" % dirname(dirname(path))
         pathid = self.getPath(parentpath)
         if pathid is None:
-            self.cursor.execute("select coalesce(max(idPath),0) from path")
-            pathid = self.cursor.fetchone()[0] + 1
             query = ' '.join((
                 "INSERT INTO path(idPath, strPath)",
                 "VALUES (?, ?)"
             ))
-            self.cursor.execute(query, (pathid, parentpath))
+            pathid = self.insert_new('path', 'idPath', query, (parentpath,))
             parentPathid = self.getParentPathId(parentpath)
             query = ' '.join((
                 "UPDATE path",
@@ -107,8 +300,6 @@ class Kodidb_Functions():
         try:
             pathid = self.cursor.fetchone()[0]
         except TypeError:
-            self.cursor.execute("select coalesce(max(idPath),0) from path")
-            pathid = self.cursor.fetchone()[0] + 1
             if strHash is None:
                 query = (
                     '''
@@ -118,7 +309,7 @@ class Kodidb_Functions():
                     VALUES (?, ?)
                     '''
                 )
-                self.cursor.execute(query, (pathid, path))
+                pathid = self.insert_new('path', 'idPath', query, (path,))
             else:
                 query = (
                     '''
@@ -128,7 +319,8 @@ class Kodidb_Functions():
                     VALUES (?, ?, ?)
                     '''
                 )
-                self.cursor.execute(query, (pathid, path, strHash))
+                pathid = self.insert_new('path', 'idPath', query,
+                                         (path, strHash))
 
         return pathid
 
@@ -161,8 +353,6 @@ class Kodidb_Functions():
         try:
             fileid = self.cursor.fetchone()[0]
         except TypeError:
-            self.cursor.execute("select coalesce(max(idFile),0) from files")
-            fileid = self.cursor.fetchone()[0] + 1
             query = (
                 '''
                 INSERT INTO files(
@@ -171,7 +361,7 @@ class Kodidb_Functions():
                 VALUES (?, ?)
                 '''
             )
-            self.cursor.execute(query, (fileid, filename))
+            fileid = self.insert_new('files', 'idFile', query, (filename,))
 
         return fileid
 
@@ -208,37 +398,17 @@ class Kodidb_Functions():
         if v.KODIVERSION > 14:
             # Kodi Isengard, Jarvis, Krypton
             for country in countries:
-                query = ' '.join((
-
-                    "SELECT country_id",
-                    "FROM country",
-                    "WHERE name = ?",
-                    "COLLATE NOCASE"
-                ))
-                self.cursor.execute(query, (country,))
-
-                try:
-                    country_id = self.cursor.fetchone()[0]
-
-                except TypeError:
-                    # Country entry does not exists
-                    self.cursor.execute("select coalesce(max(country_id),0) from country")
-                    country_id = self.cursor.fetchone()[0] + 1
-
-                    query = "INSERT INTO country(country_id, name) values(?, ?)"
-                    self.cursor.execute(query, (country_id, country))
-                    log.debug("Add country to media, processing: %s" % country)
+                country_id = self._get_or_add_name('country', country)
+                # Assign country to content
+                query = (
+                    '''
+                    INSERT OR REPLACE INTO country_link(
+                        country_id, media_id, media_type)
 
-                finally: # Assign country to content
-                    query = (
-                        '''
-                        INSERT OR REPLACE INTO country_link(
-                            country_id, media_id, media_type)
-                        
-                        VALUES (?, ?, ?)
-                        '''
-                    )
-                    self.cursor.execute(query, (country_id, kodiid, mediatype))
+                    VALUES (?, ?, ?)
+                    '''
+                )
+                self.cursor.execute(query, (country_id, kodiid, mediatype))
         else:
             # Kodi Helix
             for country in countries:
@@ -256,11 +426,9 @@ class Kodidb_Functions():
                 
                 except TypeError:
                     # Country entry does not exists
-                    self.cursor.execute("select coalesce(max(idCountry),0) from country")
-                    idCountry = self.cursor.fetchone()[0] + 1
 
                     query = "INSERT INTO country(idCountry, strCountry) values(?, ?)"
-                    self.cursor.execute(query, (idCountry, country))
+                    idCountry = self.insert_new('country', 'idCountry', query, (country,))
                     log.debug("Add country to media, processing: %s" % country)
                 
                 finally:
@@ -276,26 +444,42 @@ class Kodidb_Functions():
                         )
                         self.cursor.execute(query, (idCountry, kodiid))
 
-    def _getactorid(self, name):
+    def _get_or_add_name(self, table, name):
         """
-        Crucial für sync speed!
+        Kodi Isengard and later: returns the id for name in the Kodi table
+        (e.g. 'genre'), creating the entry if it does not exist yet.
         """
+        if self.cache is not None:
+            entry_id = self.cache.get(table, name)
+            if entry_id is not None:
+                return entry_id
+        id_column, nocase = NameIdCache.TABLES[table]
         query = ' '.join((
-            "SELECT actor_id",
-            "FROM actor",
+            "SELECT %s" % id_column,
+            "FROM %s" % table,
             "WHERE name = ?",
+            "COLLATE NOCASE" if nocase else "",
             "LIMIT 1"
         ))
         self.cursor.execute(query, (name,))
         try:
-            actorid = self.cursor.fetchone()[0]
+            entry_id = self.cursor.fetchone()[0]
         except TypeError:
-            # Cast entry does not exists
-            self.cursor.execute("select coalesce(max(actor_id),0) from actor")
-            actorid = self.cursor.fetchone()[0] + 1
-            query = "INSERT INTO actor(actor_id, name) VALUES (?, ?)"
-            self.cursor.execute(query, (actorid, name))
-        return actorid
+            # Entry does not exist yet
+            query = "INSERT INTO %s(%s, name) VALUES (?, ?)" % (table,
+                                                                 id_column)
+            entry_id = self.insert_new(table, id_column, query, (name,))
+            if table != 'actor':
+                log.debug("Added %s %s with id %s" % (table, name, entry_id))
+        if self.cache is not None:
+            self.cache.add(table, name, entry_id)
+        return entry_id
+
+    def _getactorid(self, name):
+        """
+        Crucial für sync speed!
+        """
+        return self._get_or_add_name('actor', name)
 
     def _addPerson(self, role, person_type, actorid, kodiid, mediatype,
                    castorder):
@@ -358,11 +542,9 @@ class Kodidb_Functions():
                     actorid = self.cursor.fetchone()[0]
                 except TypeError:
                     # Cast entry does not exists
-                    self.cursor.execute("select coalesce(max(idActor),0) from actors")
-                    actorid = self.cursor.fetchone()[0] + 1
 
                     query = "INSERT INTO actors(idActor, strActor) values(?, ?)"
-                    self.cursor.execute(query, (actorid, person['Name']))
+                    actorid = self.insert_new('actors', 'idActor', query, (person['Name'],))
                 finally:
                     # Link person to content
                     if "Actor" == person['Type']:
@@ -540,39 +722,17 @@ class Kodidb_Functions():
 
             # Add genres
             for genre in genres:
-                
-                query = ' '.join((
+                genre_id = self._get_or_add_name('genre', genre)
+                # Assign genre to item
+                query = (
+                    '''
+                    INSERT OR REPLACE INTO genre_link(
+                        genre_id, media_id, media_type)
 
-                    "SELECT genre_id",
-                    "FROM genre",
-                    "WHERE name = ?",
-                    "COLLATE NOCASE"
-                ))
-                self.cursor.execute(query, (genre,))
-                
-                try:
-                    genre_id = self.cursor.fetchone()[0]
-                
-                except TypeError:
-                    # Create genre in database
-                    self.cursor.execute("select coalesce(max(genre_id),0) from genre")
-                    genre_id = self.cursor.fetchone()[0] + 1
-                    
-                    query = "INSERT INTO genre(genre_id, name) values(?, ?)"
-                    self.cursor.execute(query, (genre_id, genre))
-                    log.debug("Add Genres to media, processing: %s" % genre)
-                
-                finally:
-                    # Assign genre to item
-                    query = (
-                        '''
-                        INSERT OR REPLACE INTO genre_link(
-                            genre_id, media_id, media_type)
-
-                        VALUES (?, ?, ?)
-                        '''
-                    )
-                    self.cursor.execute(query, (genre_id, kodiid, mediatype))
+                    VALUES (?, ?, ?)
+                    '''
+                )
+                self.cursor.execute(query, (genre_id, kodiid, mediatype))
         else:
             # Kodi Helix
             # Delete current genres for clean slate
@@ -600,11 +760,9 @@ class Kodidb_Functions():
                 
                 except TypeError:
                     # Create genre in database
-                    self.cursor.execute("select coalesce(max(idGenre),0) from genre")
-                    idGenre = self.cursor.fetchone()[0] + 1
 
                     query = "INSERT INTO genre(idGenre, strGenre) values(?, ?)"
-                    self.cursor.execute(query, (idGenre, genre))
+                    idGenre = self.insert_new('genre', 'idGenre', query, (genre,))
                     log.debug("Add Genres to media, processing: %s" % genre)
                 
                 finally:
@@ -644,35 +802,16 @@ class Kodidb_Functions():
         for studio in studios:
             if v.KODIVERSION > 14:
                 # Kodi Isengard, Jarvis, Krypton
-                query = ' '.join((
-
-                    "SELECT studio_id",
-                    "FROM studio",
-                    "WHERE name = ?",
-                    "COLLATE NOCASE"
-                ))
-                self.cursor.execute(query, (studio,))
-                try:
-                    studioid = self.cursor.fetchone()[0]
-                
-                except TypeError:
-                    # Studio does not exists.
-                    self.cursor.execute("select coalesce(max(studio_id),0) from studio")
-                    studioid = self.cursor.fetchone()[0] + 1
-
-                    query = "INSERT INTO studio(studio_id, name) values(?, ?)"
-                    self.cursor.execute(query, (studioid, studio))
-                    log.debug("Add Studios to media, processing: %s" % studio)
+                studioid = self._get_or_add_name('studio', studio)
+                # Assign studio to item
+                query = (
+                    '''
+                    INSERT OR REPLACE INTO studio_link(
+                        studio_id, media_id, media_type)
 
-                finally: # Assign studio to item
-                    query = (
-                        '''
-                        INSERT OR REPLACE INTO studio_link(
-                            studio_id, media_id, media_type)
-                        
-                        VALUES (?, ?, ?)
-                        ''')
-                    self.cursor.execute(query, (studioid, kodiid, mediatype))
+                    VALUES (?, ?, ?)
+                    ''')
+                self.cursor.execute(query, (studioid, kodiid, mediatype))
             else:
                 # Kodi Helix
                 query = ' '.join((
@@ -688,11 +827,9 @@ class Kodidb_Functions():
 
                 except TypeError:
                     # Studio does not exists.
-                    self.cursor.execute("select coalesce(max(idstudio),0) from studio")
-                    studioid = self.cursor.fetchone()[0] + 1
 
                     query = "INSERT INTO studio(idstudio, strstudio) values(?, ?)"
-                    self.cursor.execute(query, (studioid, studio))
+                    studioid = self.insert_new('studio', 'idstudio', query, (studio,))
                     log.debug("Add Studios to media, processing: %s" % studio)
 
                 finally: # Assign studio to item
@@ -947,8 +1084,6 @@ class Kodidb_Functions():
         
         # Set the resume bookmark
         if resume_seconds:
-            self.cursor.execute("select coalesce(max(idBookmark),0) from bookmark")
-            bookmarkId =  self.cursor.fetchone()[0] + 1
             query = (
                 '''
                 INSERT INTO bookmark(
@@ -957,8 +1092,9 @@ class Kodidb_Functions():
                 VALUES (?, ?, ?, ?, ?, ?)
                 '''
             )
-            self.cursor.execute(query, (bookmarkId, fileid, resume_seconds, total_seconds,
-                "DVDPlayer", 1))
+            self.insert_new('bookmark', 'idBookmark', query,
+                            (fileid, resume_seconds, total_seconds,
+                             "DVDPlayer", 1))
 
     def addTags(self, kodiid, tags, mediatype):
         # First, delete any existing tags associated to the id
@@ -989,33 +1125,17 @@ class Kodidb_Functions():
     def addTag(self, kodiid, tag, mediatype):
         if v.KODIVERSION > 14:
             # Kodi Isengard, Jarvis, Krypton
-            query = ' '.join((
-
-                "SELECT tag_id",
-                "FROM tag",
-                "WHERE name = ?",
-                "COLLATE NOCASE"
-            ))
-            self.cursor.execute(query, (tag,))
-            try:
-                tag_id = self.cursor.fetchone()[0]
-            
-            except TypeError:
-                # Create the tag, because it does not exist
-                tag_id = self.createTag(tag)
-                log.debug("Adding tag: %s" % tag)
+            tag_id = self._get_or_add_name('tag', tag)
+            # Assign tag to item
+            query = (
+                '''
+                INSERT OR REPLACE INTO tag_link(
+                    tag_id, media_id, media_type)
 
-            finally:
-                # Assign tag to item
-                query = (
-                    '''
-                    INSERT OR REPLACE INTO tag_link(
-                        tag_id, media_id, media_type)
-                    
-                    VALUES (?, ?, ?)
-                    '''
-                )
-                self.cursor.execute(query, (tag_id, kodiid, mediatype))
+                VALUES (?, ?, ?)
+                '''
+            )
+            self.cursor.execute(query, (tag_id, kodiid, mediatype))
         else:
             # Kodi Helix
             query = ' '.join((
@@ -1050,24 +1170,7 @@ class Kodidb_Functions():
         # This will create and return the tag_id
         if v.KODIVERSION > 14:
             # Kodi Isengard, Jarvis, Krypton
-            query = ' '.join((
-
-                "SELECT tag_id",
-                "FROM tag",
-                "WHERE name = ?",
-                "COLLATE NOCASE"
-            ))
-            self.cursor.execute(query, (name,))
-            try:
-                tag_id = self.cursor.fetchone()[0]
-            
-            except TypeError:
-                self.cursor.execute("select coalesce(max(tag_id),0) from tag")
-                tag_id = self.cursor.fetchone()[0] + 1
-
-                query = "INSERT INTO tag(tag_id, name) values(?, ?)"
-                self.cursor.execute(query, (tag_id, name))
-                log.debug("Create tag_id: %s name: %s" % (tag_id, name))
+            tag_id = self._get_or_add_name('tag', name)
         else:
             # Kodi Helix
             query = ' '.join((
@@ -1082,11 +1185,9 @@ class Kodidb_Functions():
                 tag_id = self.cursor.fetchone()[0]
 
             except TypeError:
-                self.cursor.execute("select coalesce(max(idTag),0) from tag")
-                tag_id = self.cursor.fetchone()[0] + 1
 
                 query = "INSERT INTO tag(idTag, strTag) values(?, ?)"
-                self.cursor.execute(query, (tag_id, name))
+                tag_id = self.insert_new('tag', 'idTag', query, (name,))
                 log.debug("Create idTag: %s name: %s" % (tag_id, name))
 
         return tag_id
@@ -1207,11 +1308,9 @@ class Kodidb_Functions():
             setid = self.cursor.fetchone()[0]
 
         except TypeError:
-            self.cursor.execute("select coalesce(max(idSet),0) from sets")
-            setid = self.cursor.fetchone()[0] + 1
 
             query = "INSERT INTO sets(idSet, strSet) values(?, ?)"
-            self.cursor.execute(query, (setid, boxsetname))
+            setid = self.insert_new('sets', 'idSet', query, (boxsetname,))
 
         return setid
 
@@ -1248,10 +1347,8 @@ class Kodidb_Functions():
         try:
             seasonid = self.cursor.fetchone()[0]
         except TypeError:
-            self.cursor.execute("select coalesce(max(idSeason),0) from seasons")
-            seasonid = self.cursor.fetchone()[0] + 1
             query = "INSERT INTO seasons(idSeason, idShow, season) values(?, ?, ?)"
-            self.cursor.execute(query, (seasonid, showid, seasonnumber))
+            seasonid = self.insert_new('seasons', 'idSeason', query, (showid, seasonnumber))
 
         return seasonid
 
@@ -1282,8 +1379,6 @@ class Kodidb_Functions():
             try:
                 artistid = self.cursor.fetchone()[0]
             except TypeError:
-                self.cursor.execute("select coalesce(max(idArtist),0) from artist")
-                artistid = self.cursor.fetchone()[0] + 1
                 query = (
                     '''
                     INSERT INTO artist(idArtist, strArtist, strMusicBrainzArtistID)
@@ -1291,7 +1386,7 @@ class Kodidb_Functions():
                     VALUES (?, ?, ?)
                     '''
                 )
-                self.cursor.execute(query, (artistid, name, musicbrainz))
+                artistid = self.insert_new('artist', 'idArtist', query, (name, musicbrainz))
         else:
             if artistname != name:
                 query = "UPDATE artist SET strArtist = ? WHERE idArtist = ?"
@@ -1312,8 +1407,6 @@ class Kodidb_Functions():
             albumid = self.cursor.fetchone()[0]
         except TypeError:
             # Create the album
-            self.cursor.execute("select coalesce(max(idAlbum),0) from album")
-            albumid = self.cursor.fetchone()[0] + 1
             if v.KODIVERSION > 14:
                 query = (
                     '''
@@ -1322,7 +1415,7 @@ class Kodidb_Functions():
                     VALUES (?, ?, ?, ?)
                     '''
                 )
-                self.cursor.execute(query, (albumid, name, musicbrainz, "album"))
+                albumid = self.insert_new('album', 'idAlbum', query, (name, musicbrainz, "album"))
             else: # Helix
                 query = (
                     '''
@@ -1331,7 +1424,8 @@ class Kodidb_Functions():
                     VALUES (?, ?, ?)
                     '''
                 )
-                self.cursor.execute(query, (albumid, name, musicbrainz))
+                albumid = self.insert_new('album', 'idAlbum', query,
+                                          (name, musicbrainz))
 
         return albumid
 
@@ -1360,10 +1454,8 @@ class Kodidb_Functions():
                     genreid = self.cursor.fetchone()[0]
                 except TypeError:
                     # Create the genre
-                    self.cursor.execute("select coalesce(max(idGenre),0) from genre")
-                    genreid = self.cursor.fetchone()[0] + 1
                     query = "INSERT INTO genre(idGenre, strGenre) values(?, ?)"
-                    self.cursor.execute(query, (genreid, genre))
+                    genreid = self.insert_new('genre', 'idGenre', query, (genre,))
 
                 query = "INSERT OR REPLACE INTO album_genre(idGenre, idAlbum) values(?, ?)"
                 self.cursor.execute(query, (genreid, kodiid))
@@ -1391,10 +1483,8 @@ class Kodidb_Functions():
                     genreid = self.cursor.fetchone()[0]
                 except TypeError:
                     # Create the genre
-                    self.cursor.execute("select coalesce(max(idGenre),0) from genre")
-                    genreid = self.cursor.fetchone()[0] + 1
                     query = "INSERT INTO genre(idGenre, strGenre) values(?, ?)"
-                    self.cursor.execute(query, (genreid, genre))
+                    genreid = self.insert_new('genre', 'idGenre', query, (genre,))
 
                 query = "INSERT OR REPLACE INTO song_genre(idGenre, idSong) values(?, ?)"
                 self.cursor.execute(query, (genreid, kodiid))
@@ -1416,9 +1506,7 @@ class Kodidb_Functions():
         self.cursor.execute(query, (userrating, kodi_id))
 
     def create_entry_uniqueid(self):
-        self.cursor.execute(
-            "select coalesce(max(uniqueid_id),0) from uniqueid")
-        return self.cursor.fetchone()[0] + 1
+        return self.ids.next_id('uniqueid', 'uniqueid_id')
 
     def add_uniqueid(self, *args):
         """
@@ -1432,7 +1520,7 @@ class Kodidb_Functions():
                 uniqueid_id, media_id, media_type, value, type)
             VALUES (?, ?, ?, ?, ?)
         '''
-        self.cursor.execute(query, (args))
+        self.execute_new(query, args)
 
     def get_uniqueid(self, media_id):
         query = "SELECT uniqueid_id FROM uniqueid WHERE media_id = ?"
@@ -1461,9 +1549,19 @@ class Kodidb_Functions():
         '''
         self.cursor.execute(query, (kodi_id, kodi_type))
 
+    def remove_uniqueids(self, kodi_ids, kodi_type):
+        """
+        Bulk version of remove_uniqueid
+        """
+        query = '''
+            DELETE FROM uniqueid
+            WHERE media_id = ? AND media_type = ?
+        '''
+        self.cursor.executemany(query,
+                                ((kodi_id, kodi_type) for kodi_id in kodi_ids))
+
     def create_entry_rating(self):
-        self.cursor.execute("select coalesce(max(rating_id),0) from rating")
-        return self.cursor.fetchone()[0] + 1
+        return self.ids.next_id('rating', 'rating_id')
 
     def get_ratingid(self, media_id):
         query = "SELECT rating_id FROM rating WHERE media_id = ?"
@@ -1501,7 +1599,7 @@ class Kodidb_Functions():
                 rating_id, media_id, media_type, rating_type, rating, votes)
             VALUES (?, ?, ?, ?, ?, ?)
         '''
-        self.cursor.execute(query, (args))
+        self.execute_new(query, args)
 
     def remove_ratings(self, kodi_id, kodi_type):
         query = '''
@@ -1510,6 +1608,17 @@ class Kodidb_Functions():
         '''
         self.cursor.execute(query, (kodi_id, kodi_type))
 
+    def remove_all_ratings(self, kodi_ids, kodi_type):
+        """
+        Bulk version of remove_ratings
+        """
+        query = '''
+            DELETE FROM rating
+            WHERE media_id = ? AND media_type = ?
+        '''
+        self.cursor.executemany(query,
+                                ((kodi_id, kodi_type) for kodi_id in kodi_ids))
+
 
 def get_kodiid_from_filename(file):
     """
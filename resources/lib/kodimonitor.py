@@ -5,11 +5,12 @@
 import logging
 from json import loads
 
-from xbmc import Monitor, Player, sleep
+from xbmc import Player, sleep
 
 import downloadutils
 import plexdb_functions as plexdb
-from utils import window, settings, CatchExceptions, tryDecode, tryEncode
+from utils import window, settings, CatchExceptions, tryDecode, tryEncode, \
+    SettingsMonitor
 from PlexFunctions import scrobble
 from kodidb_functions import get_kodiid_from_filename
 from PlexAPI import API
@@ -22,14 +23,14 @@ log = logging.getLogger("PLEX."+__name__)
 ###############################################################################
 
 
-class KodiMonitor(Monitor):
+class KodiMonitor(SettingsMonitor):
 
     def __init__(self, callback):
         self.mgr = callback
         self.doUtils = downloadutils.DownloadUtils().downloadUrl
         self.xbmcplayer = Player()
         self.playqueue = self.mgr.playqueue
-        Monitor.__init__(self)
+        SettingsMonitor.__init__(self)
         log.info("Kodi monitor started.")
 
     def onScanStarted(self, library):
@@ -46,6 +47,8 @@ class KodiMonitor(Monitor):
         """
         Monitor the PKC settings for changes made by the user
         """
+        # Make sure we're not reading cached, outdated settings
+        SettingsMonitor.onSettingsChanged(self)
         # settings: window-variable
         items = {
             'logLevel': 'plex_logLevel',
@@ -82,6 +85,11 @@ class KodiMonitor(Monitor):
         if method == "Player.OnPlay":
             self.PlayBackStart(data)
 
+        elif method in ("Playlist.OnAdd", "Playlist.OnRemove",
+                        "Playlist.OnClear"):
+            # Let the Playqueue thread compare the playqueues right away
+            self.playqueue.wakeUp()
+
         elif method == "Player.OnStop":
             # Should refresh our video nodes, e.g. on deck
             # xbmc.executebuiltin('ReloadSkin()')
@@ -3,9 +3,13 @@
 ###############################################################################
 
 import logging
-from threading import Thread, Lock
+from threading import Thread, Lock, local
+from sys import exc_info
 import Queue
 from random import shuffle
+from re import search
+from operator import itemgetter
+from collections import OrderedDict
 
 import xbmc
 import xbmcgui
@@ -15,7 +19,8 @@ from utils import window, settings, getUnixTimestamp, sourcesXML,\
     ThreadMethods, ThreadMethodsAdditionalStop, LogTime, getScreensaver,\
     setScreensaver, playlistXSP, language as lang, DateToKodi, reset,\
     advancedSettingsXML, tryDecode, deletePlaylists, deleteNodes, \
-    ThreadMethodsAdditionalSuspend, create_actor_db_index, tryEncode, dialog
+    ThreadMethodsAdditionalSuspend, create_actor_db_index, tryEncode, dialog, \
+    settings_bool, settings_int
 import downloadutils
 import itemtypes
 import plexdb_functions as plexdb
@@ -24,109 +29,341 @@ import userclient
 import videonodes
 import artwork
 import variables as v
+import state
+from db_writer import DBWriter
+import metrics
+from concurrency import AdaptiveConcurrency, MAX_RETRIES
 
 from PlexFunctions import GetPlexMetadata, GetAllPlexLeaves, scrobble, \
-    GetPlexSectionResults, GetAllPlexChildren, GetPMSStatus
+    GetPlexSectionResults, GetPMSStatus, \
+    GetPlexMetadataBatch, GetPlexOnDeck
 import PlexAPI
 
 ###############################################################################
 
 log = logging.getLogger("PLEX."+__name__)
 
+# Sync priority tiers: items of a lower tier are synced first
+TIER_ONDECK = 0     # On Deck or in progress (and their shows and seasons)
+TIER_RECENT = 1     # Recently added
+TIER_VIEW = 2       # In the library the user is currently browsing
+TIER_REST = 3
+TIER_NAMES = {
+    TIER_ONDECK: 'On Deck',
+    TIER_RECENT: 'Recently added',
+    TIER_VIEW: 'Current library',
+    TIER_REST: 'Other'
+}
+# Items added less than this many seconds ago count as recently added
+RECENT_SECONDS = 14 * 24 * 60 * 60
+# Delta syncs look for PMS items updated this many seconds before the last
+# sync started - just in case our Kodi-PMS time offset is a bit off
+WATERMARK_MARGIN = 5 * 60
+# Process a PMS item this many seconds after its first websocket message at
+# the latest, even if the PMS keeps on sending new ones for it
+MAX_DEBOUNCE = 120
+# Forget PMS playback sessions we did not hear about for this many seconds
+SESSION_TTL = 10 * 60
+# Ask the PMS for its playback sessions at most every x seconds
+STATUS_INTERVAL = 10
+# Order in which the items of an interrupted sync are resumed: parents first
+JOURNAL_ORDER = (
+    ('Movies', 'add_update'),
+    ('TVShows', 'add_update'),
+    ('TVShows', 'add_updateSeason'),
+    ('TVShows', 'add_updateEpisode'),
+    ('Music', 'add_updateArtist'),
+    ('Music', 'add_updateAlbum'),
+    ('Music', 'add_updateSong')
+)
+
 ###############################################################################
 
 
-@ThreadMethodsAdditionalStop('suspend_LibraryThread')
-@ThreadMethods
-class ThreadedGetMetadata(Thread):
+class MetadataJob(object):
     """
-    Threaded download of Plex XML metadata for a certain library item.
-    Fills the out_queue with the downloaded etree XML objects
-
-    Input:
-        queue               Queue.Queue() object that you'll need to fill up
-                            with Plex itemIds
-        out_queue           Queue() object where this thread will store
-                            the downloaded metadata XMLs as etree objects
+    The metadata download and processing of one call of
+    LibrarySync.GetAndProcessXMLs. Shared between the DownloadPool, the
+    job's ThreadedProcessMetadata and ThreadedShowSyncInfo
+
+        queue               Queue.Queue() with batches (lists) of updatelist
+                            items still to download
+        out_queue           Queue.Queue() with the downloaded items, ready to
+                            be processed
         lock                Lock(), used for counting where we are
+        downloaded          Number of items downloaded (or skipped)
+        processed           Number of items processed (or skipped)
+        viewName            Title of the item processed last
+        tierTotal           {priority tier: number of items}
+        tierProcessed       {priority tier: number of items processed}
+        crashed             True if the PMS refused to answer (HTTP 401)
+        failed              List of the updatelist items that could not be
+                            downloaded
     """
-    def __init__(self, queue, out_queue, lock, processlock):
-        self.queue = queue
-        self.out_queue = out_queue
-        self.lock = lock
-        self.processlock = processlock
-        Thread.__init__(self)
+    def __init__(self):
+        self.queue = Queue.Queue()
+        self.out_queue = Queue.Queue(maxsize=100)
+        self.lock = Lock()
+        self.downloaded = 0
+        self.processed = 0
+        self.viewName = ''
+        self.tierTotal = {}
+        self.tierProcessed = {}
+        self.crashed = False
+        self.failed = []
+
+    def current_tier(self):
+        """
+        Returns the tuple (tier, processed, total) of the highest priority
+        tier that has not yet been processed completely. Returns None if all
+        are done. Hold self.lock!
+        """
+        for tier in sorted(self.tierTotal):
+            processed = self.tierProcessed.get(tier, 0)
+            if processed < self.tierTotal[tier]:
+                return tier, processed, self.tierTotal[tier]
 
-    def terminateNow(self):
-        while not self.queue.empty():
-            # Still try because remaining item might have been taken
-            try:
-                self.queue.get(block=False)
-            except Queue.Empty:
-                xbmc.sleep(10)
-                continue
-            else:
-                self.queue.task_done()
-        if self.threadStopped():
-            # Shutdown from outside requested; purge out_queue as well
-            while not self.out_queue.empty():
+    def purge(self, out_queue=False):
+        """
+        Empties queue - and out_queue if out_queue=True - so that everybody
+        waiting with join() may continue
+        """
+        queues = [self.queue]
+        if out_queue:
+            queues.append(self.out_queue)
+        for queue in queues:
+            while not queue.empty():
                 # Still try because remaining item might have been taken
                 try:
-                    self.out_queue.get(block=False)
+                    queue.get(block=False)
                 except Queue.Empty:
                     xbmc.sleep(10)
                     continue
                 else:
-                    self.out_queue.task_done()
+                    queue.task_done()
+
+
+class DownloadPool(object):
+    """
+    ONE pool of ThreadedGetMetadata threads shared by all sync pipelines
+    running at the same time, e.g. video and music.
+
+    Batches are handed out to the download threads round-robin across all
+    MetadataJobs (fair queuing), so a big library cannot starve the others.
+
+    workers download threads are spawned, but self.controller decides how
+    many of them may actually download depending on how the PMS copes.
+    Idle download threads block on self.tickets, which holds one entry per
+    batch added.
+
+    Usage:
+        pool = DownloadPool(workers)
+        pool.start()
+        pool.add(job)       # False if the download threads already quit
+        job.queue.join()
+        pool.remove(job)
+        pool.stop()
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.jobs = []
+        self.next = 0
+        self.lock = Lock()
+        self.closed = False
+        self.threads = []
+        self.controller = AdaptiveConcurrency(workers)
+        self.tickets = Queue.Queue()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = ThreadedGetMetadata(self, i)
+            thread.setDaemon(True)
+            thread.start()
+            self.threads.append(thread)
+        log.info("%s download threads spawned", len(self.threads))
+
+    def stop(self):
+        for thread in self.threads:
+            # Threads might already have quit by themselves (e.g. Kodi exit)
+            try:
+                thread.stopThread()
+            except:
+                pass
+        for thread in self.threads:
+            try:
+                thread.join(1.0)
+            except:
+                pass
+        self.threads = []
+        log.info("Download threads finished")
+
+    def add(self, job):
+        """
+        Adds the MetadataJob job. Returns False if the download threads have
+        already quit
+        """
+        with self.lock:
+            if self.closed:
+                return False
+            self.jobs.append(job)
+        for _ in range(job.queue.qsize()):
+            self.tickets.put(True)
+        return True
+
+    def remove(self, job):
+        with self.lock:
+            try:
+                self.jobs.remove(job)
+            except ValueError:
+                pass
+
+    def get(self):
+        """
+        Returns the tuple (job, batch) of the next job in line. Raises
+        Queue.Empty if there is nothing to download
+        """
+        with self.lock:
+            for _ in range(len(self.jobs)):
+                self.next = (self.next + 1) % len(self.jobs)
+                job = self.jobs[self.next]
+                try:
+                    return job, job.queue.get(block=False)
+                except Queue.Empty:
+                    pass
+        raise Queue.Empty
+
+    def close(self):
+        """
+        No more jobs are accepted. Empties all queues of all jobs (main
+        threads hang otherwise)
+        """
+        with self.lock:
+            self.closed = True
+            jobs = list(self.jobs)
+        for job in jobs:
+            job.purge(out_queue=True)
+
+
+@ThreadMethodsAdditionalStop('suspend_LibraryThread')
+@ThreadMethods
+class ThreadedGetMetadata(Thread):
+    """
+    Threaded download of Plex XML metadata for a certain library item.
+    Fills the out_queue of the item's MetadataJob with the downloaded etree
+    XML objects
+
+    Metadata for a batch of several items is downloaded with one single
+    request. If that fails, the items are retried one by one. If the PMS
+    answers with 401 or 5xx, we back off and retry up to MAX_RETRIES times.
+
+    Input:
+        pool                DownloadPool() to get the batches (lists) of Plex
+                            itemIds from
+        index               Number of this thread - the pool's controller
+                            decides whether it may download
+    """
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        Thread.__init__(self)
+
+    def wait_admitted(self):
+        """
+        Blocks until the controller lets this thread download (again)
+        """
+        while (not self.pool.controller.admit(self.index) and
+                self.waitStopped(0.1) is False):
+            pass
+
+    def get_metadata(self, plexId):
+        """
+        Downloads the metadata for plexId, retrying once the controller lets
+        us if the PMS is under strain. Returns None or 401 if that failed
+        """
+        controller = self.pool.controller
+        for _ in range(MAX_RETRIES + 1):
+            plexXML = GetPlexMetadata(plexId)
+            if plexXML not in (None, 401) or not controller.should_retry():
+                break
+            self.wait_admitted()
+        return plexXML
 
     def run(self):
         # cache local variables because it's faster
-        queue = self.queue
-        out_queue = self.out_queue
-        lock = self.lock
-        processlock = self.processlock
+        pool = self.pool
+        controller = pool.controller
+        index = self.index
         threadStopped = self.threadStopped
-        global getMetadataCount
-        global processMetadataCount
+        controller.attach()
         while threadStopped() is False:
-            # grabs Plex item from queue
+            if not controller.admit(index):
+                # Too many threads for the PMS right now or backing off
+                self.waitStopped(0.1)
+                continue
+            # Wait until there is a batch to download
+            if self.waitQueue(pool.tickets) is None:
+                # Woken up, e.g. to stop
+                continue
+            # grabs a batch of Plex items from the next job in line
             try:
-                updateItem = queue.get(block=False)
-            # Empty queue
+                job, batch = pool.get()
+            # Job has been purged in the meantime
             except Queue.Empty:
-                xbmc.sleep(10)
-                continue
-            # Download Metadata
-            plexXML = GetPlexMetadata(updateItem['itemId'])
-            if plexXML is None:
-                # Did not receive a valid XML - skip that item for now
-                log.warn("Could not get metadata for %s. Skipping that item "
-                         "for now" % updateItem['itemId'])
-                # Increase BOTH counters - since metadata won't be processed
-                with lock:
-                    getMetadataCount += 1
-                with processlock:
-                    processMetadataCount += 1
-                queue.task_done()
                 continue
-            elif plexXML == 401:
-                log.warn('HTTP 401 returned by PMS. Too much strain? '
-                         'Cancelling sync for now')
-                window('plex_scancrashed', value='401')
-                # Kill remaining items in queue (for main thread to cont.)
-                queue.task_done()
-                break
-
-            updateItem['XML'] = plexXML
-            # place item into out queue
-            out_queue.put(updateItem)
-            # Keep track of where we are at
-            with lock:
-                getMetadataCount += 1
+            metrics.observe('queue.getMetadata', job.queue.qsize(),
+                            bounds=metrics.COUNT_BUCKETS)
+            # Download Metadata for the entire batch
+            xmls = {}
+            if len(batch) > 1:
+                xmls = GetPlexMetadataBatch(
+                    [updateItem['itemId'] for updateItem in batch])
+                if xmls is None or xmls == 401:
+                    log.warn("Could not get metadata for batch of %s items. "
+                             "Retrying item by item", len(batch))
+                    xmls = {}
+                    if controller.should_retry():
+                        self.wait_admitted()
+            crashed = False
+            for updateItem in batch:
+                plexXML = xmls.get(updateItem['itemId'])
+                if plexXML is None:
+                    # Not part of the batch answer - try this item alone
+                    plexXML = self.get_metadata(updateItem['itemId'])
+                if plexXML is None:
+                    # Did not receive a valid XML - skip that item for now
+                    log.warn("Could not get metadata for %s. Skipping that "
+                             "item for now", updateItem['itemId'])
+                    # Increase BOTH counters - since metadata won't be
+                    # processed
+                    with job.lock:
+                        job.failed.append(updateItem)
+                        job.downloaded += 1
+                        job.processed += 1
+                        tier = updateItem['priority']
+                        job.tierProcessed[tier] = \
+                            job.tierProcessed.get(tier, 0) + 1
+                    continue
+                elif plexXML == 401:
+                    log.warn('HTTP 401 returned by PMS, even after backing '
+                             'off. Cancelling sync for now')
+                    window('plex_scancrashed', value='401')
+                    job.crashed = True
+                    crashed = True
+                    break
+                updateItem['XML'] = plexXML
+                # place item into out queue
+                job.out_queue.put(updateItem)
+                # Keep track of where we are at
+                with job.lock:
+                    job.downloaded += 1
             # signals to queue job is done
-            queue.task_done()
-        # Empty queue in case PKC was shut down (main thread hangs otherwise)
-        self.terminateNow()
+            job.queue.task_done()
+            if crashed:
+                # Kill remaining items of this job (for main thread to cont.)
+                job.purge()
+        controller.detach()
+        # Empty queues in case PKC was shut down (main thread hangs otherwise)
+        pool.close()
         log.debug('Download thread terminated')
 
 
@@ -134,50 +371,38 @@ class ThreadedGetMetadata(Thread):
 @ThreadMethods
 class ThreadedProcessMetadata(Thread):
     """
-    Not yet implemented - if ever. Only to be called by ONE thread!
-    Processes the XML metadata in the queue
+    Processes the XML metadata in the out_queue of ONE MetadataJob. Only to
+    be called by ONE thread per job!
 
     Input:
-        queue:      Queue.Queue() object that you'll need to fill up with
-                    the downloaded XML eTree objects
+        job:        MetadataJob() whose out_queue gets filled with the
+                    downloaded XML eTree objects
         itemType:   as used to call functions in itemtypes.py
                     e.g. 'Movies' => itemtypes.Movies()
-        lock:       Lock(), used for counting where we are
     """
-    def __init__(self, queue, itemType, lock):
-        self.queue = queue
-        self.lock = lock
+    def __init__(self, job, itemType):
+        self.job = job
         self.itemType = itemType
         Thread.__init__(self)
 
-    def terminateNow(self):
-        while not self.queue.empty():
-            # Still try because remaining item might have been taken
-            try:
-                self.queue.get(block=False)
-            except Queue.Empty:
-                xbmc.sleep(10)
-                continue
-            else:
-                self.queue.task_done()
-
     def run(self):
         # Constructs the method name, e.g. itemtypes.Movies
         itemFkt = getattr(itemtypes, self.itemType)
         # cache local variables because it's faster
-        queue = self.queue
-        lock = self.lock
+        job = self.job
+        queue = job.out_queue
+        lock = job.lock
         threadStopped = self.threadStopped
-        global processMetadataCount
-        global processingViewName
-        with itemFkt() as item:
+        with DBWriter() as writer, itemFkt() as item:
             while threadStopped() is False:
                 # grabs item from queue
-                try:
-                    updateItem = queue.get(block=False)
-                except Queue.Empty:
-                    xbmc.sleep(10)
+                updateItem = self.waitQueue(queue,
+                                            timeout=writer.commit_seconds)
+                if updateItem is None:
+                    writer.commit_if_due()
                     continue
+                metrics.observe('queue.processMetadata', queue.qsize(),
+                                bounds=metrics.COUNT_BUCKETS)
                 # Do the work
                 plexitem = updateItem['XML']
                 method = updateItem['method']
@@ -190,14 +415,21 @@ class ThreadedProcessMetadata(Thread):
                     itemSubFkt(child,
                                viewtag=viewName,
                                viewid=viewId)
+                # Committed together with the item by our DBWriter
+                with plexdb.Get_Plex_DB() as plex_db:
+                    plex_db.remove_journal_item(updateItem['itemId'])
+                writer.item_done()
                 # Keep track of where we are at
+                tier = updateItem['priority']
                 with lock:
-                    processMetadataCount += 1
-                    processingViewName = title
+                    job.processed += 1
+                    job.viewName = title
+                    job.tierProcessed[tier] = \
+                        job.tierProcessed.get(tier, 0) + 1
                 # signals to queue job is done
                 queue.task_done()
         # Empty queue in case PKC was shut down (main thread hangs otherwise)
-        self.terminateNow()
+        job.purge(out_queue=True)
         log.debug('Processing thread terminated')
 
 
@@ -209,11 +441,13 @@ class ThreadedShowSyncInfo(Thread):
 
     Input:
         dialog       xbmcgui.DialogProgressBG() object to show progress
-        locks = [downloadLock, processLock]     Locks() to the other threads
+        job          MetadataJob() to show the progress of
         total:       Total number of items to get
+        controller   AdaptiveConcurrency() of the download threads
     """
-    def __init__(self, dialog, locks, total, itemType):
-        self.locks = locks
+    def __init__(self, dialog, job, total, itemType, controller):
+        self.job = job
+        self.controller = controller
         self.total = total
         self.dialog = dialog
         self.itemType = itemType
@@ -224,22 +458,34 @@ class ThreadedShowSyncInfo(Thread):
         total = self.total
         dialog = self.dialog
         threadStopped = self.threadStopped
-        downloadLock = self.locks[0]
-        processLock = self.locks[1]
+        job = self.job
         dialog.create("%s: Sync %s: %s items"
                       % (lang(29999), self.itemType, str(total)),
                       "Starting")
-        global getMetadataCount
-        global processMetadataCount
-        global processingViewName
         total = 2 * total
         totalProgress = 0
         while threadStopped() is False:
-            with downloadLock:
-                getMetadataProgress = getMetadataCount
-            with processLock:
-                processMetadataProgress = processMetadataCount
-                viewName = processingViewName
+            with job.lock:
+                getMetadataProgress = job.downloaded
+                processMetadataProgress = job.processed
+                viewName = job.viewName
+                tier = job.current_tier()
+            if tier is not None:
+                # Tell the user which items are synced right now
+                viewName = '%s %s/%s: %s' % (TIER_NAMES[tier[0]],
+                                             tier[1],
+                                             tier[2],
+                                             viewName)
+            pms = self.controller.metrics()
+            if pms['backoff'] > 0:
+                viewName = 'PMS busy, waiting %ss - %s' % (
+                    int(pms['backoff'] + 1), viewName)
+            elif pms['latency'] is not None:
+                viewName = '%s/%s threads, %sms - %s' % (
+                    pms['threads'],
+                    pms['maximum'],
+                    int(pms['latency'] * 1000),
+                    viewName)
             totalProgress = getMetadataProgress + processMetadataProgress
             try:
                 percentage = int(float(totalProgress) / float(total)*100.0)
@@ -250,12 +496,54 @@ class ThreadedShowSyncInfo(Thread):
                                   % (getMetadataProgress,
                                      processMetadataProgress,
                                      viewName))
-            # Sleep for x milliseconds
-            xbmc.sleep(200)
+            self.waitStopped(0.2)
         dialog.close()
         log.debug('Dialog Infobox thread terminated')
 
 
+class ThreadedSyncPipeline(Thread):
+    """
+    Runs the sync methods steps one after the other, e.g.
+    [LibrarySync.PlexVideo, LibrarySync.ProcessChanged], and stops at the first
+    one that does not return True.
+
+    Afterwards, self.success is True if all steps succeeded. self.error
+    holds sys.exc_info() if a step raised an exception
+    """
+    def __init__(self, steps):
+        self.steps = steps
+        self.success = False
+        self.error = None
+        Thread.__init__(self)
+
+    def run(self):
+        try:
+            for step in self.steps:
+                with metrics.Timer('sync.stage.%s' % step.__name__):
+                    success = step()
+                if not success:
+                    log.info('Sync step %s failed or was aborted',
+                             step.__name__)
+                    return
+        except Exception:
+            self.error = exc_info()
+            return
+        self.success = True
+
+
+class PipelineState(local):
+    """
+    The state of the sync pipeline of the current thread. Several pipelines,
+    e.g. video and music, may run at the same time
+    """
+    def __init__(self):
+        self.updatelist = []
+        self.allPlexElementsId = {}
+        self.allKodiElementsId = {}
+        # [(itemType, updatelist)] of CHANGED items, see ProcessChanged()
+        self.deferred = []
+
+
 @ThreadMethodsAdditionalSuspend('suspend_LibraryThread')
 @ThreadMethodsAdditionalStop('plex_shouldStop')
 @ThreadMethods
@@ -284,34 +572,115 @@ class ProcessFanartThread(Thread):
         log.info("---===### Starting FanartSync ###===---")
         while not threadStopped():
             # In the event the server goes offline
-            while threadSuspended() or window('plex_dbScan'):
+            while threadSuspended() or state.get('plex_dbScan'):
                 # Set in service.py
-                if threadStopped():
+                if self.waitStopped():
                     # Abort was requested while waiting. We should exit
                     log.info("---===### Stopped FanartSync ###===---")
                     return
-                xbmc.sleep(1000)
             # grabs Plex item from queue
-            try:
-                item = queue.get(block=False)
-            except Queue.Empty:
-                xbmc.sleep(200)
+            item = self.waitQueue(queue)
+            if item is None:
                 continue
 
-            log.debug('Get additional fanart for Plex id %s' % item['plex_id'])
+            log.debug('Get additional fanart for Plex id %s', item['plex_id'])
             with getattr(itemtypes,
                          v.ITEMTYPE_FROM_PLEXTYPE[item['plex_type']])() as cls:
                 result = cls.getfanart(item['plex_id'],
                                        refresh=item['refresh'])
             if result is True:
-                log.debug('Done getting fanart for Plex id %s'
-                          % item['plex_id'])
+                log.debug('Done getting fanart for Plex id %s',
+                          item['plex_id'])
                 with plexdb.Get_Plex_DB() as plex_db:
                     plex_db.set_fanart_synched(item['plex_id'])
             queue.task_done()
         log.info("---===### Stopped FanartSync ###===---")
 
 
+class SessionTracker(object):
+    """
+    Remembers the PMS playback sessions (someone playing something
+    somewhere) so that process_playing does not need to ask the PMS for every
+    websocket message.
+
+        sessions        {sessionKey: {'userId', 'username', 'ratingKey',
+                                      'seen'}}
+        durations       {ratingKey: {'duration', 'viewCount', 'seen'}}
+
+    Entries not seen for SESSION_TTL seconds are forgotten, durations also
+    once playback stopped - viewCount changes then. /status/sessions
+    is queried only for unknown sessionKeys and at most every
+    STATUS_INTERVAL seconds; its answer is merged with what we already know.
+    """
+    def __init__(self):
+        self.sessions = {}
+        self.durations = {}
+        self.lastStatus = 0
+
+    def expire(self, now):
+        for cache in (self.sessions, self.durations):
+            for key in [key for key, entry in cache.iteritems()
+                        if now - entry['seen'] > SESSION_TTL]:
+                del cache[key]
+
+    def session(self, sessionKey):
+        """
+        Returns the session dict for sessionKey or None if the PMS does not
+        know (or tell us) about the session
+        """
+        now = getUnixTimestamp()
+        self.expire(now)
+        session = self.sessions.get(sessionKey)
+        if session is None:
+            if settings('plex_serverowned') == 'false':
+                # Not our PMS, we are not authorized to get the sessions
+                # On the bright side, it must be us playing :-)
+                session = {'userId': '', 'username': '', 'ratingKey': None}
+                self.sessions[sessionKey] = session
+            elif now - self.lastStatus >= STATUS_INTERVAL:
+                # PMS is ours - get all current sessions
+                self.lastStatus = now
+                for key, entry in GetPMSStatus(
+                        window('plex_token')).iteritems():
+                    entry['seen'] = now
+                    self.sessions.setdefault(key, {}).update(entry)
+                log.debug('Updated current sessions. They are: %s',
+                          self.sessions)
+                session = self.sessions.get(sessionKey)
+        if session is not None:
+            session['seen'] = now
+        return session
+
+    def duration(self, ratingKey):
+        """
+        Returns the dict {'duration', 'viewCount'} for ratingKey because PMS
+        will NOT directly tell us. Returns None if we could not get them
+        """
+        now = getUnixTimestamp()
+        entry = self.durations.get(ratingKey)
+        if entry is None:
+            xml = GetPlexMetadata(ratingKey)
+            if xml in (None, 401):
+                log.error('Could not get up-to-date xml for item %s',
+                          ratingKey)
+                return None
+            userdata = PlexAPI.API(xml[0]).getUserData()
+            entry = {
+                'duration': userdata['Runtime'],
+                'viewCount': userdata['PlayCount']
+            }
+            self.durations[ratingKey] = entry
+        entry['seen'] = now
+        return entry
+
+    def stopped(self, ratingKey):
+        """
+        Call once playback of ratingKey stopped or ended. Playing it again
+        will increase its viewCount
+        """
+        self.durations.pop(ratingKey, None)
+
+
 @ThreadMethodsAdditionalSuspend('suspend_LibraryThread')
 @ThreadMethodsAdditionalStop('plex_shouldStop')
 @ThreadMethods
@@ -321,27 +690,45 @@ class LibrarySync(Thread):
     def __init__(self, callback=None):
         self.mgr = callback
 
-        self.itemsToProcess = []
-        self.sessionKeys = []
+        # {ratingKey: item} of PMS items to process, see process_timeline()
+        self.itemsToProcess = OrderedDict()
+        # updatelist etc. of the sync pipeline running in the current thread
+        self.pipeline = PipelineState()
+        # DownloadPool shared by all pipelines, exists only during full syncs
+        self.downloads = None
+        # Plex ids that are synced first, see prioritize()
+        self.onDeckKeys = set()
+        self.browsedView = None
+        self.recentAddedAt = None
+        self.sessions = SessionTracker()
         self.fanartqueue = Queue.Queue()
         if settings('FanartTV') == 'true':
             self.fanartthread = ProcessFanartThread(self.fanartqueue)
         # How long should we wait at least to process new/changed PMS items?
-        self.saftyMargin = int(settings('backgroundsync_saftyMargin'))
-
-        self.fullSyncInterval = int(settings('fullSyncInterval')) * 60
+        self.saftyMargin = settings_int('backgroundsync_saftyMargin', 5)
+
+        self.fullSyncInterval = settings_int('fullSyncInterval', 60) * 60
+        self.deletionCheckInterval = \
+            settings_int('deletionCheckInterval', 1440) * 60
+        # Delta sync: only get PMS items updated since the last sync
+        self.delta = False
+        # {view_id: PMS time}, the last sync of view_id (delta syncs only)
+        self.watermarks = {}
+        # view_ids whose listing or some items failed during this sync
+        self.failedViews = set()
 
         self.user = userclient.UserClient()
         self.vnodes = videonodes.VideoNodes()
         self.dialog = xbmcgui.Dialog()
 
-        self.syncThreadNumber = int(settings('syncThreadNumber'))
+        self.syncThreadNumber = settings_int('syncThreadNumber', 10)
+        self.metadataBatchSize = max(settings_int('metadataBatchSize', 50), 1)
         self.installSyncDone = settings('SyncInstallRunDone') == 'true'
         window('dbSyncIndicator', value=settings('dbSyncIndicator'))
         self.enableMusic = settings('enableMusic') == "true"
         self.enableBackgroundSync = settings(
             'enableBackgroundSync') == "true"
-        self.limitindex = int(settings('limitindex'))
+        self.limitindex = settings_int('limitindex', 200)
 
         # Init for replacing paths
         window('remapSMB', value=settings('remapSMB'))
@@ -351,7 +738,7 @@ class LibrarySync(Thread):
                 key = 'remapSMB%s%s' % (typus, arg)
                 window(key, value=settings(key))
         # Just in case a time sync goes wrong
-        self.timeoffset = int(settings('kodiplextimeoffset'))
+        self.timeoffset = settings_int('kodiplextimeoffset')
         window('kodiplextimeoffset', value=str(self.timeoffset))
         Thread.__init__(self)
 
@@ -420,8 +807,8 @@ class LibrarySync(Thread):
                 items = GetAllPlexLeaves(libraryId,
                                          containerSize=self.limitindex)
                 if items in (None, 401):
-                    log.error("Could not download section %s"
-                              % view.attrib['key'])
+                    log.error("Could not download section %s",
+                              view.attrib['key'])
                     continue
                 for item in items:
                     if item.attrib.get('viewCount') is not None:
@@ -431,7 +818,7 @@ class LibrarySync(Thread):
                         # Don't mess with items with a resume point
                         continue
                     plexId = item.attrib.get('ratingKey')
-                    log.info('Found an item to sync with: %s' % plexId)
+                    log.info('Found an item to sync with: %s', plexId)
                     break
 
         if plexId is None:
@@ -448,10 +835,10 @@ class LibrarySync(Thread):
         timestamp = xml[0].attrib.get('lastViewedAt')
         if timestamp is None:
             timestamp = xml[0].attrib.get('updatedAt')
-            log.debug('Using items updatedAt=%s' % timestamp)
+            log.debug('Using items updatedAt=%s', timestamp)
             if timestamp is None:
                 timestamp = xml[0].attrib.get('addedAt')
-                log.debug('Using items addedAt=%s' % timestamp)
+                log.debug('Using items addedAt=%s', timestamp)
                 if timestamp is None:
                     timestamp = 0
                     log.debug('No timestamp; using 0')
@@ -486,8 +873,8 @@ class LibrarySync(Thread):
         self.timeoffset = int(koditime) - int(plextime)
         window('kodiplextimeoffset', value=str(self.timeoffset))
         settings('kodiplextimeoffset', value=str(self.timeoffset))
-        log.info("Time offset Koditime - Plextime in seconds: %s"
-                 % str(self.timeoffset))
+        log.info("Time offset Koditime - Plextime in seconds: %s",
+                 str(self.timeoffset))
         return True
 
     def initializeDBs(self):
@@ -495,6 +882,9 @@ class LibrarySync(Thread):
         Run once during startup to verify that plex db exists.
         """
         with plexdb.Get_Plex_DB() as plex_db:
+            # Write-ahead logging: readers don't block our (bulk) writes.
+            # Only for our own DB - Kodi's DBs are Kodi's business
+            plex_db.plexcursor.execute('PRAGMA journal_mode=WAL')
             # Create the tables for the plex database
             plex_db.plexcursor.execute('''
                 CREATE TABLE IF NOT EXISTS plex(
@@ -520,29 +910,66 @@ class LibrarySync(Thread):
             plex_db.plexcursor.execute('''
                 CREATE TABLE IF NOT EXISTS version(idVersion TEXT)
             ''')
+            plexdb.migrate_plex_db(plex_db.plexcursor)
+            plexdb.check_query_plans(plex_db.plexcursor)
         # Create an index for actors to speed up sync
         create_actor_db_index()
 
     @LogTime
-    def fullSync(self, repair=False):
+    def fullSync(self, repair=False, delta=False):
         """
         repair=True: force sync EVERY item
+        delta=True:  only sync PMS items updated since the last sync of their
+                     Plex library, playstates only for items viewed since.
+                     Will NOT detect deleted PMS items nor items marked
+                     unwatched. If that has not been done for
+                     deletionCheckInterval, runs a normal full sync
         """
         # self.compare == False: we're syncing EVERY item
         # True: we're syncing only the delta, e.g. different checksum
         self.compare = not repair
-
-        self.new_items_only = True
-        # This will also update playstates and userratings!
-        log.info('Running fullsync for NEW PMS items with repair=%s' % repair)
-        if self._fullSync() is False:
-            return False
-        self.new_items_only = False
-        # This will NOT update playstates and userratings!
-        log.info('Running fullsync for CHANGED PMS items with repair=%s'
-                 % repair)
-        if self._fullSync() is False:
+        lastDeletionCheck = settings_int('lastDeletionCheck')
+        if delta and (getUnixTimestamp() - lastDeletionCheck >
+                      self.deletionCheckInterval):
+            log.info('Deletion check due, listing all PMS items')
+            delta = False
+        self.delta = delta
+        # PMS time; every item updated later will be picked up next time
+        started = getUnixTimestamp() - self.timeoffset - WATERMARK_MARGIN
+        self.watermarks = {}
+        self.failedViews = set()
+        if delta:
+            with plexdb.Get_Plex_DB() as plex_db:
+                self.watermarks = plex_db.get_watermarks()
+
+        # One single pass over all PMS items. NEW items are synced first,
+        # CHANGED ones afterwards. This will also update playstates and
+        # userratings!
+        log.info('Running fullsync with repair=%s, delta=%s',
+                 repair, delta)
+        # Record this sync only, see the addon menu
+        metrics.reset()
+        try:
+            with metrics.Timer('sync.delta' if delta else 'sync.full'):
+                success = self._fullSync()
+        finally:
+            metrics.dump()
+        if success is False:
             return False
+        if not delta:
+            settings('lastDeletionCheck', value=str(getUnixTimestamp()))
+        with plexdb.Get_Plex_DB() as plex_db:
+            for view in self.views:
+                if (view['itemtype'] == v.PLEX_TYPE_ARTIST and
+                        not self.enableMusic):
+                    continue
+                if view['id'] in self.failedViews:
+                    # Keep the old watermark so that the next delta sync
+                    # lists the items we missed once again
+                    log.info('Not advancing the watermark of view %s',
+                             view['id'])
+                    continue
+                plex_db.set_watermark(view['id'], started)
         return True
 
     def _fullSync(self):
@@ -550,34 +977,52 @@ class LibrarySync(Thread):
         screensaver = getScreensaver()
         setScreensaver(value="")
 
-        if self.new_items_only is True:
-            # Only do the following once for new items
-            # Add sources
-            sourcesXML()
-
-            # Set views. Abort if unsuccessful
-            if not self.maintainViews():
-                xbmc.executebuiltin('InhibitIdleShutdown(false)')
-                setScreensaver(value=screensaver)
-                return False
+        # Add sources
+        sourcesXML()
 
-        process = {
-            'movies': self.PlexMovies,
-            'tvshows': self.PlexTVShows,
-        }
+        # Set views. Abort if unsuccessful
+        with metrics.Timer('sync.stage.maintainViews'):
+            success = self.maintainViews()
+        if not success:
+            xbmc.executebuiltin('InhibitIdleShutdown(false)')
+            setScreensaver(value=screensaver)
+            return False
+        # Learn what the user is most likely to look at
+        with metrics.Timer('sync.stage.prioritize'):
+            self.prioritize()
+
+        # Video and music live in different Kodi DBs: sync them at the same
+        # time, each in its own pipeline with its own DBWriter. Movies and
+        # TV shows share a DB and thus are synced by the same pipeline.
+        # CHANGED items of a pipeline are only synced after all NEW ones
+        pipelines = [[self.PlexVideo, self.ProcessChanged]]
         if self.enableMusic:
-            process['music'] = self.PlexMusic
+            pipelines.append([self.PlexMusic, self.ProcessChanged])
 
-        # Do the processing
-        for itemtype in process:
-            if self.threadStopped():
-                xbmc.executebuiltin('InhibitIdleShutdown(false)')
-                setScreensaver(value=screensaver)
-                return False
-            if not process[itemtype]():
+        # Do the processing. All pipelines share the same download threads
+        self.downloads = DownloadPool(self.syncThreadNumber)
+        self.downloads.start()
+        with metrics.Timer('sync.stage.ResumeJournal'):
+            self.ResumeJournal()
+        threads = []
+        for steps in pipelines:
+            thread = ThreadedSyncPipeline(steps)
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        self.downloads.stop()
+        for thread in threads:
+            if thread.error is not None:
                 xbmc.executebuiltin('InhibitIdleShutdown(false)')
                 setScreensaver(value=screensaver)
-                return False
+                raise thread.error[0], thread.error[1], thread.error[2]
+        if self.threadStopped() or not all(thread.success
+                                           for thread in threads):
+            xbmc.executebuiltin('InhibitIdleShutdown(false)')
+            setScreensaver(value=screensaver)
+            return False
 
         # Let kodi update the views in any case, since we're doing a full sync
         xbmc.executebuiltin('UpdateLibrary(video)')
@@ -604,7 +1049,7 @@ class LibrarySync(Thread):
                 log.info('Path hack successful')
             except Exception as e:
                 # Empty movies, tv shows?
-                log.error('Path hack failed with error message: %s' % str(e))
+                log.error('Path hack failed with error message: %s', str(e))
         return True
 
     def processView(self, folderItem, kodi_db, plex_db, totalnodes):
@@ -633,7 +1078,7 @@ class LibrarySync(Thread):
             current_viewtype = view[1]
             current_tagid = view[2]
         except TypeError:
-            log.info("Creating viewid: %s in Plex database." % folderid)
+            log.info("Creating viewid: %s in Plex database.", folderid)
             tagid = kodi_db.createTag(foldername)
             # Create playlist for the video library
             if (foldername not in playlists and
@@ -668,8 +1113,8 @@ class LibrarySync(Thread):
 
             # View was modified, update with latest info
             if current_viewname != foldername:
-                log.info("viewid: %s new viewname: %s"
-                         % (folderid, foldername))
+                log.info("viewid: %s new viewname: %s",
+                         folderid, foldername)
                 tagid = kodi_db.createTag(foldername)
 
                 # Update view with new info
@@ -774,7 +1219,7 @@ class LibrarySync(Thread):
             itemType = view.attrib['type']
             if itemType in (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_SHOW, v.PLEX_TYPE_PHOTO):  # NOT artist for now
                 self.sorted_views.append(view.attrib['title'])
-        log.debug('Sorted views: %s' % self.sorted_views)
+        log.debug('Sorted views: %s', self.sorted_views)
 
         # total nodes for window properties
         vnodes.clearProperties()
@@ -817,11 +1262,11 @@ class LibrarySync(Thread):
         # update views for all:
         with plexdb.Get_Plex_DB() as plex_db:
             self.views = plex_db.getAllViewInfo()
-        log.info("Finished processing views. Views saved: %s" % self.views)
+        log.info("Finished processing views. Views saved: %s", self.views)
         return True
 
     def delete_views(self):
-        log.info("Removing views: %s" % self.old_views)
+        log.info("Removing views: %s", self.old_views)
         delete_items = []
         with plexdb.Get_Plex_DB() as plex_db:
             for view in self.old_views:
@@ -843,25 +1288,123 @@ class LibrarySync(Thread):
                message=lang(30052),
                icon='{plex}',
                sound=False)
-        for item in delete_movies:
+        if delete_movies:
             with itemtypes.Movies() as movie:
-                movie.remove(item['plex_id'])
-        for item in delete_tv:
+                movie.remove_many(item['plex_id'] for item in delete_movies)
+        if delete_tv:
             with itemtypes.TVShows() as tv:
-                tv.remove(item['plex_id'])
+                tv.remove_many(item['plex_id'] for item in delete_tv)
         # And for the music DB:
-        for item in delete_music:
+        if delete_music:
             with itemtypes.Music() as music:
-                music.remove(item['plex_id'])
+                music.remove_many(item['plex_id'] for item in delete_music)
+
+    def ProcessChanged(self):
+        """
+        Processes the CHANGED PMS items that GetAndProcessXMLs put aside for
+        the current pipeline, in the same order
+        """
+        deferred = self.pipeline.deferred
+        self.pipeline.deferred = []
+        for itemType, updatelist in deferred:
+            if self.threadStopped():
+                return False
+            self.pipeline.updatelist = updatelist
+            self.GetAndProcessXMLs(itemType, defer=False)
+        return True
+
+    def ResumeJournal(self):
+        """
+        Processes the items an interrupted sync did not get to, e.g. because
+        Kodi was shut down. Afterwards, the normal sync will find these items
+        up to date.
+        """
+        with plexdb.Get_Plex_DB() as plex_db:
+            journal = plex_db.get_journal()
+        if not journal:
+            return
+        log.info('Resuming interrupted sync of %s items', len(journal))
+        for itemType, method in JOURNAL_ORDER:
+            if self.threadStopped():
+                return
+            self.pipeline.updatelist = [
+                item for item in journal
+                if item['itemType'] == itemType and item['method'] == method]
+            if itemType == 'Music' and not self.enableMusic:
+                # Music sync has been switched off in the meantime
+                with plexdb.Get_Plex_DB() as plex_db:
+                    plex_db.remove_journal_items(
+                        [item['itemId'] for item in self.pipeline.updatelist])
+                self.pipeline.updatelist = []
+                continue
+            self.GetAndProcessXMLs(itemType, defer=False)
+
+    def prioritize(self):
+        """
+        Remembers the Plex ids of all On Deck items (and their seasons and
+        shows) as well as the Plex library the user is currently browsing.
+        Their items are synced first, see priority()
+        """
+        self.onDeckKeys = set()
+        # PMS time!
+        self.recentAddedAt = (getUnixTimestamp() - self.timeoffset -
+                              RECENT_SECONDS)
+        for view in self.views:
+            if view['itemtype'] not in (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_SHOW):
+                continue
+            xml = GetPlexOnDeck(view['id'], containerSize=self.limitindex)
+            try:
+                xml[0].attrib
+            except (TypeError, AttributeError, IndexError):
+                continue
+            for item in xml:
+                for key in ('ratingKey', 'parentRatingKey',
+                            'grandparentRatingKey'):
+                    if item.get(key):
+                        self.onDeckKeys.add(item.get(key))
+        # Our video nodes live in library://video/Plex-<view id>/...
+        match = search(r'Plex-(\d+)',
+                       xbmc.getInfoLabel('Container.FolderPath'))
+        self.browsedView = match.group(1) if match else None
+        log.info('%s On Deck items, currently browsed library: %s',
+                 len(self.onDeckKeys), self.browsedView)
+
+    def priority(self, item, viewId):
+        """
+        Returns the sync priority tier, e.g. TIER_ONDECK, for the PMS item
+        (an xml element or a dict of its attributes) of the library viewId.
+        Called for every item by GetUpdatelist - keep it fast
+        """
+        if item.get('viewOffset'):
+            # In progress
+            return TIER_ONDECK
+        for key in ('ratingKey', 'parentRatingKey', 'grandparentRatingKey'):
+            if item.get(key) in self.onDeckKeys:
+                return TIER_ONDECK
+        if self.recentAddedAt is not None:
+            try:
+                addedAt = int(item.get('addedAt', 0))
+            except ValueError:
+                addedAt = 0
+            if addedAt > self.recentAddedAt:
+                return TIER_RECENT
+        if viewId == self.browsedView:
+            return TIER_VIEW
+        return TIER_REST
 
     def GetUpdatelist(self, xml, itemType, method, viewName, viewId):
         """
         THIS METHOD NEEDS TO BE FAST! => e.g. no API calls
 
-        Adds items to self.updatelist as well as self.allPlexElementsId dict
+        Adds items to self.updatelist as well as self.allPlexElementsId dict.
+        Every PMS item is either new, changed or unchanged (then skipped);
+        items in self.allKodiElementsId but not in self.allPlexElementsId
+        have been deleted on the PMS
 
         Input:
-            xml:                    PMS answer for section items
+            xml:                    PMS answer for section items, either
+                                    an xml or a ChunkStream of attribute
+                                    dicts (DownloadChunks with stream=True)
             itemType:               'Movies', 'TVShows', ...
             method:                 Method name to be called with this itemtype
                                     see itemtypes.py
@@ -879,74 +1422,50 @@ class LibrarySync(Thread):
                 'viewId': xxx,
                 'title': xxx
                 'mediaType': xxx, e.g. 'movie', 'episode'
+                'priority': xxx, sync priority tier, e.g. TIER_ONDECK
+                'changed': True if Kodi already has an older version
+                'parentId': xxx, Plex id of the season/album, if any
+                'grandparentId': xxx, Plex id of the show/artist, if any
 
             self.allPlexElementsId      APPENDED(!!) dict
                 = {itemid: checksum}
         """
-        if self.new_items_only is True:
-            # Only process Plex items that Kodi does not already have in lib
-            for item in xml:
-                itemId = item.attrib.get('ratingKey')
-                if not itemId:
-                    # Skipping items 'title=All episodes' without a 'ratingKey'
-                    continue
-                self.allPlexElementsId[itemId] = ("K%s%s" %
-                    (itemId, item.attrib.get('updatedAt', '')))
-                if itemId not in self.allKodiElementsId:
-                    self.updatelist.append({
-                        'itemId': itemId,
-                        'itemType': itemType,
-                        'method': method,
-                        'viewName': viewName,
-                        'viewId': viewId,
-                        'title': item.attrib.get('title', 'Missing Title'),
-                        'mediaType': item.attrib.get('type')
-                    })
-            return
+        # cache local variables because it's faster
+        allPlexElementsId = self.pipeline.allPlexElementsId
+        allKodiElementsId = self.pipeline.allKodiElementsId
+        updatelist = self.pipeline.updatelist
+        compare = self.compare
+        for item in xml:
+            itemId = item.get('ratingKey')
+            if not itemId:
+                # Skipping items 'title=All episodes' without a 'ratingKey'
+                continue
+            plex_checksum = "K%s%s" % (itemId, item.get('updatedAt', ''))
+            allPlexElementsId[itemId] = plex_checksum
+            kodi_checksum = allKodiElementsId.get(itemId)
+            # Only update if item is not in Kodi or checksum is different -
+            # unless we're repairing (then allKodiElementsId is empty)
+            if compare and kodi_checksum == plex_checksum:
+                continue
+            updatelist.append({
+                'itemId': itemId,
+                'itemType': itemType,
+                'method': method,
+                'viewName': viewName,
+                'viewId': viewId,
+                'title': item.get('title', 'Missing Title'),
+                'mediaType': item.get('type'),
+                'priority': self.priority(item, viewId),
+                'changed': kodi_checksum is not None,
+                'parentId': item.get('parentRatingKey'),
+                'grandparentId': item.get('grandparentRatingKey')
+            })
+        if getattr(xml, 'failed', False):
+            # Chunks of the listing are missing, and thus items
+            log.warn('Incomplete listing for view %s', viewId)
+            self.failedViews.add(viewId)
 
-        if self.compare:
-            # Only process the delta - new or changed items
-            for item in xml:
-                itemId = item.attrib.get('ratingKey')
-                if not itemId:
-                    # Skipping items 'title=All episodes' without a 'ratingKey'
-                    continue
-                plex_checksum = ("K%s%s"
-                                 % (itemId, item.attrib.get('updatedAt', '')))
-                self.allPlexElementsId[itemId] = plex_checksum
-                kodi_checksum = self.allKodiElementsId.get(itemId)
-                # Only update if movie is not in Kodi or checksum is
-                # different
-                if kodi_checksum != plex_checksum:
-                    self.updatelist.append({
-                        'itemId': itemId,
-                        'itemType': itemType,
-                        'method': method,
-                        'viewName': viewName,
-                        'viewId': viewId,
-                        'title': item.attrib.get('title', 'Missing Title'),
-                        'mediaType': item.attrib.get('type')
-                    })
-        else:
-            # Initial or repair sync: get all Plex movies
-            for item in xml:
-                itemId = item.attrib.get('ratingKey')
-                if not itemId:
-                    # Skipping items 'title=All episodes' without a 'ratingKey'
-                    continue
-                self.allPlexElementsId[itemId] = ("K%s%s"
-                    % (itemId, item.attrib.get('updatedAt', '')))
-                self.updatelist.append({
-                    'itemId': itemId,
-                    'itemType': itemType,
-                    'method': method,
-                    'viewName': viewName,
-                    'viewId': viewId,
-                    'title': item.attrib.get('title', 'Missing Title'),
-                    'mediaType': item.attrib.get('type')
-                })
-
-    def GetAndProcessXMLs(self, itemType):
+    def GetAndProcessXMLs(self, itemType, defer=True):
         """
         Downloads all XMLs for itemType (e.g. Movies, TV-Shows). Processes them
         by then calling itemtypes.<itemType>()
@@ -954,67 +1473,76 @@ class LibrarySync(Thread):
         Input:
             itemType:               'Movies', 'TVShows', ...
             self.updatelist
-            showProgress            If False, NEVER shows sync progress
+            defer                   If True, CHANGED items are only put
+                                    aside for ProcessChanged() so that NEW
+                                    items show up in Kodi first
         """
+        if defer:
+            changed = [x for x in self.pipeline.updatelist if x.get('changed')]
+            if changed:
+                self.pipeline.deferred.append((itemType, changed))
+                self.pipeline.updatelist = [
+                    x for x in self.pipeline.updatelist
+                    if not x.get('changed')]
+            log.info('%s: %s new items, %s changed items put aside',
+                     itemType, len(self.pipeline.updatelist), len(changed))
         # Some logging, just in case.
-        log.debug("self.updatelist: %s" % self.updatelist)
-        itemNumber = len(self.updatelist)
+        log.debug("self.updatelist: %s", self.pipeline.updatelist)
+        itemNumber = len(self.pipeline.updatelist)
         if itemNumber == 0:
+            self.pipeline.updatelist = []
             return
 
         # Run through self.updatelist, get XML metadata per item
         # Initiate threads
         log.info("Starting sync threads")
-        getMetadataQueue = Queue.Queue()
-        processMetadataQueue = Queue.Queue(maxsize=100)
-        getMetadataLock = Lock()
-        processMetadataLock = Lock()
-        # To keep track
-        global getMetadataCount
-        getMetadataCount = 0
-        global processMetadataCount
-        processMetadataCount = 0
-        global processingViewName
-        processingViewName = ''
-        # Populate queue: GetMetadata
-        for updateItem in self.updatelist:
-            getMetadataQueue.put(updateItem)
-        # Spawn GetMetadata threads for downloading
+        job = MetadataJob()
+        # Sync the items the user is most likely to look at first. Sort is
+        # stable, so the PMS order is kept within one priority tier
+        self.pipeline.updatelist.sort(key=itemgetter('priority'))
+        for item in self.pipeline.updatelist:
+            job.tierTotal[item['priority']] = \
+                job.tierTotal.get(item['priority'], 0) + 1
+        # Remember what we're about to do in case we get interrupted
+        with plexdb.Get_Plex_DB() as plex_db:
+            plex_db.add_journal_items(self.pipeline.updatelist)
+        # Populate queue: GetMetadata, in batches of several items
+        batchSize = self.metadataBatchSize
+        for i in range(0, itemNumber, batchSize):
+            job.queue.put(self.pipeline.updatelist[i:i + batchSize])
+        # Let the shared download threads work on our batches
+        if not self.downloads.add(job):
+            log.info('Download threads already quit, not syncing %s',
+                     itemType)
+            self.pipeline.updatelist = []
+            return
+        # Spawn one thread to process Metadata, once downloaded
         threads = []
-        for i in range(min(self.syncThreadNumber, itemNumber)):
-            thread = ThreadedGetMetadata(getMetadataQueue,
-                                         processMetadataQueue,
-                                         getMetadataLock,
-                                         processMetadataLock)
-            thread.setDaemon(True)
-            thread.start()
-            threads.append(thread)
-        log.info("%s download threads spawned" % len(threads))
-        # Spawn one more thread to process Metadata, once downloaded
-        thread = ThreadedProcessMetadata(processMetadataQueue,
-                                         itemType,
-                                         processMetadataLock)
+        thread = ThreadedProcessMetadata(job, itemType)
         thread.setDaemon(True)
         thread.start()
         threads.append(thread)
         log.info("Processing thread spawned")
-        # Start one thread to show sync progress ONLY for new PMS items
-        if self.new_items_only is True and window('dbSyncIndicator') == 'true':
+        # Start one thread to show sync progress
+        if window('dbSyncIndicator') == 'true':
             dialog = xbmcgui.DialogProgressBG()
             thread = ThreadedShowSyncInfo(
                 dialog,
-                [getMetadataLock, processMetadataLock],
+                job,
                 itemNumber,
-                itemType)
+                itemType,
+                self.downloads.controller)
             thread.setDaemon(True)
             thread.start()
             threads.append(thread)
             log.info("Kodi Infobox thread spawned")
 
         # Wait until finished
-        getMetadataQueue.join()
-        processMetadataQueue.join()
-        # Kill threads
+        job.queue.join()
+        job.out_queue.join()
+        self.downloads.remove(job)
+        # Kill threads - the processing thread commits on exiting. Before,
+        # its DBWriter locks plex.db for up to COMMIT_SECONDS
         log.info("Waiting to kill threads")
         for thread in threads:
             # Threads might already have quit by themselves (e.g. Kodi exit)
@@ -1030,40 +1558,149 @@ class LibrarySync(Thread):
             except:
                 pass
         log.info("Sync threads finished")
-        if (settings('FanartTV') == 'true' and
+        # The watermark of their views stays put, see fullSync()
+        self.failedViews.update(item['viewId'] for item in job.failed)
+        if not (job.crashed or self.downloads.closed or self.threadStopped()):
+            # Not interrupted. Items we could not download are not worth
+            # resuming; the next sync lists them again
+            with plexdb.Get_Plex_DB() as plex_db:
+                plex_db.remove_journal_items(
+                    [item['itemId'] for item in self.pipeline.updatelist])
+        if (settings_bool('FanartTV') and
                 itemType in ('Movies', 'TVShows')):
-            for item in self.updatelist:
+            for item in self.pipeline.updatelist:
                 if item['mediaType'] in (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_SHOW):
                     self.fanartqueue.put({
                         'plex_id': item['itemId'],
                         'plex_type': item['mediaType'],
                         'refresh': False
                     })
-        self.updatelist = []
+        self.pipeline.updatelist = []
 
     @LogTime
-    def PlexMovies(self):
+    def PlexVideo(self):
+        """
+        Syncs movies and TV shows. Lists all their libraries first so that
+        On Deck and recently added items of both types can be synced before
+        everything else; then the remaining items type by type.
+
+        Kodi skips episodes whose show or season is still missing. Hence
+        shows, seasons and episodes are processed one after the other
+        within every priority pass, see ListTVShows()
+        """
+        movies = self.ListMovies()
+        if movies is False:
+            return False
+        shows = self.ListTVShows()
+        if shows is False:
+            return False
+
+        steps = (('Movies', movies, 'add_update'),
+                 ('TVShows', shows, 'add_update'),
+                 ('TVShows', shows, 'add_updateSeason'),
+                 ('TVShows', shows, 'add_updateEpisode'))
+        # PROCESS On Deck and recently added items of all types #####
+        for tier in (TIER_ONDECK, TIER_RECENT):
+            for itemType, listing, method in steps:
+                if self.threadStopped():
+                    return False
+                self.pipeline.updatelist = [
+                    item for item in listing['updatelist']
+                    if item['priority'] == tier and item['method'] == method]
+                self.GetAndProcessXMLs(itemType)
+            log.info('Synced %s items', TIER_NAMES[tier])
+        # PROCESS all the rest, type by type #####
+        for itemType, listing, method in steps:
+            if self.threadStopped():
+                return False
+            self.pipeline.updatelist = [
+                item for item in listing['updatelist']
+                if item['priority'] > TIER_RECENT and item['method'] == method]
+            self.GetAndProcessXMLs(itemType)
+            log.debug("GetAndProcessXMLs completed for %s %s",
+                      itemType, method)
+
+        return (self.FinishVideo('Movies', movies) and
+                self.FinishVideo('TVShows', shows))
+
+    def TakeListing(self, views):
+        """
+        Returns the listing the pipeline has gathered so far with
+        GetUpdatelist() for the libraries views, and starts a new one:
+            {
+                'views':                views
+                'updatelist':           self.updatelist
+                'allPlexElementsId':    self.allPlexElementsId
+                'allKodiElementsId':    self.allKodiElementsId
+            }
+        """
+        listing = {
+            'views': views,
+            'updatelist': self.pipeline.updatelist,
+            'allPlexElementsId': self.pipeline.allPlexElementsId,
+            'allKodiElementsId': self.pipeline.allKodiElementsId
+        }
+        self.pipeline.updatelist = []
+        self.pipeline.allPlexElementsId = {}
+        self.pipeline.allKodiElementsId = {}
+        return listing
+
+    def FinishVideo(self, itemType, listing):
+        """
+        Updates the playstates and processes the deletes of itemType, e.g.
+        'Movies', once all its items have been synced. Returns False if we
+        were interrupted
+        """
+        # Update viewstate:
+        with DBWriter():
+            for view in listing['views']:
+                if self.threadStopped():
+                    return False
+                # Delta syncs: only items viewed since the last sync. Items
+                # marked unwatched on the PMS are corrected on the next
+                # normal full sync, see deletionCheckInterval
+                self.PlexUpdateWatched(
+                    view['id'],
+                    itemType,
+                    lastViewedAt=self.watermarks.get(view['id']))
+
+        # PROCESS DELETES #####
+        if self.compare and not self.delta:
+            # Manual sync, process deletes
+            allPlexElementsId = listing['allPlexElementsId']
+            with getattr(itemtypes, itemType)() as items:
+                items.remove_many(
+                    kodiElement for kodiElement in listing['allKodiElementsId']
+                    if kodiElement not in allPlexElementsId)
+        log.info("%s sync is finished.", itemType)
+        return True
+
+    def ListMovies(self):
+        """
+        Lists the movies to sync, see TakeListing(). Returns False if we were
+        interrupted
+        """
         # Initialize
-        self.allPlexElementsId = {}
+        self.pipeline.allPlexElementsId = {}
 
         itemType = 'Movies'
 
         views = [x for x in self.views if x['itemtype'] == v.KODI_TYPE_MOVIE]
-        log.info("Processing Plex %s. Libraries: %s" % (itemType, views))
+        log.info("Processing Plex %s. Libraries: %s", itemType, views)
 
-        self.allKodiElementsId = {}
+        self.pipeline.allKodiElementsId = {}
         if self.compare:
             with plexdb.Get_Plex_DB() as plex_db:
                 # Get movies from Plex server
                 # Pull the list of movies and boxsets in Kodi
                 try:
-                    self.allKodiElementsId = dict(
+                    self.pipeline.allKodiElementsId = dict(
                         plex_db.getChecksum(v.PLEX_TYPE_MOVIE))
                 except ValueError:
-                    self.allKodiElementsId = {}
+                    self.pipeline.allKodiElementsId = {}
 
-        # PROCESS MOVIES #####
-        self.updatelist = []
+        # LIST MOVIES #####
+        self.pipeline.updatelist = []
         for view in views:
             if self.threadStopped():
                 return False
@@ -1071,9 +1708,11 @@ class LibrarySync(Thread):
             viewId = view['id']
             viewName = view['name']
             all_plexmovies = GetPlexSectionResults(
-                viewId, args=None, containerSize=self.limitindex)
+                viewId, args=None, containerSize=self.limitindex,
+                stream=True, updatedAt=self.watermarks.get(viewId))
             if all_plexmovies is None:
                 log.info("Couldnt get section items, aborting for view.")
+                self.failedViews.add(viewId)
                 continue
             elif all_plexmovies == 401:
                 return False
@@ -1083,23 +1722,8 @@ class LibrarySync(Thread):
                                'add_update',
                                viewName,
                                viewId)
-        self.GetAndProcessXMLs(itemType)
-        log.info("Processed view")
-        # Update viewstate for EVERY item
-        for view in views:
-            if self.threadStopped():
-                return False
-            self.PlexUpdateWatched(view['id'], itemType)
-
-        # PROCESS DELETES #####
-        if self.compare:
-            # Manual sync, process deletes
-            with itemtypes.Movies() as Movie:
-                for kodimovie in self.allKodiElementsId:
-                    if kodimovie not in self.allPlexElementsId:
-                        Movie.remove(kodimovie)
-        log.info("%s sync is finished." % itemType)
-        return True
+        log.info("Listed %s movies to sync", len(self.pipeline.updatelist))
+        return self.TakeListing(views)
 
     def PlexUpdateWatched(self, viewId, itemType,
                           lastViewedAt=None, updatedAt=None):
@@ -1108,10 +1732,6 @@ class LibrarySync(Thread):
         also updates resume times.
         This is done by downloading one XML for ALL elements with viewId
         """
-        if self.new_items_only is False:
-            # Only do this once for fullsync: the first run where new items are
-            # added to Kodi
-            return
         xml = GetAllPlexLeaves(viewId,
                                lastViewedAt=lastViewedAt,
                                updatedAt=updatedAt,
@@ -1119,11 +1739,19 @@ class LibrarySync(Thread):
         # Return if there are no items in PMS reply - it's faster
         try:
             xml[0].attrib
-        except (TypeError, AttributeError, IndexError):
+        except IndexError:
+            # No (matching) items in this view
+            return
+        except (TypeError, AttributeError):
             log.error('Error updating watch status. Could not get viewId: '
                       '%s of itemType %s with lastViewedAt: %s, updatedAt: '
-                      '%s' % (viewId, itemType, lastViewedAt, updatedAt))
+                      '%s', viewId, itemType, lastViewedAt, updatedAt)
+            self.failedViews.add(viewId)
             return
+        if len(xml) < int(xml.attrib.get('totalSize', 0)):
+            # Some chunks could not be downloaded
+            log.warn('Missing playstates for view %s', viewId)
+            self.failedViews.add(viewId)
 
         if itemType in ('Movies', 'TVShows'):
             self.updateKodiVideoLib = True
@@ -1134,16 +1762,19 @@ class LibrarySync(Thread):
         with itemMth() as method:
             method.updateUserdata(xml)
 
-    @LogTime
-    def PlexTVShows(self):
+    def ListTVShows(self):
+        """
+        Lists the TV shows, seasons and episodes to sync, see TakeListing().
+        Returns False if we were interrupted
+        """
         # Initialize
-        self.allPlexElementsId = {}
+        self.pipeline.allPlexElementsId = {}
         itemType = 'TVShows'
 
         views = [x for x in self.views if x['itemtype'] == 'show']
-        log.info("Media folders for %s: %s" % (itemType, views))
+        log.info("Media folders for %s: %s", itemType, views)
 
-        self.allKodiElementsId = {}
+        self.pipeline.allKodiElementsId = {}
         if self.compare:
             with plexdb.Get_Plex_DB() as plex:
                 # Pull the list of TV shows already in Kodi
@@ -1152,13 +1783,13 @@ class LibrarySync(Thread):
                              v.PLEX_TYPE_EPISODE):
                     try:
                         elements = dict(plex.getChecksum(kind))
-                        self.allKodiElementsId.update(elements)
+                        self.pipeline.allKodiElementsId.update(elements)
                     # Yet empty/not yet synched
                     except ValueError:
                         pass
 
-        # PROCESS TV Shows #####
-        self.updatelist = []
+        # LIST TV Shows #####
+        self.pipeline.updatelist = []
         for view in views:
             if self.threadStopped():
                 return False
@@ -1166,9 +1797,11 @@ class LibrarySync(Thread):
             viewId = view['id']
             viewName = view['name']
             allPlexTvShows = GetPlexSectionResults(
-                viewId, containerSize=self.limitindex)
+                viewId, containerSize=self.limitindex,
+                stream=True, updatedAt=self.watermarks.get(viewId))
             if allPlexTvShows is None:
-                log.error("Error downloading show xml for view %s" % viewId)
+                log.error("Error downloading show xml for view %s", viewId)
+                self.failedViews.add(viewId)
                 continue
             elif allPlexTvShows == 401:
                 return False
@@ -1178,25 +1811,21 @@ class LibrarySync(Thread):
                                'add_update',
                                viewName,
                                viewId)
-            log.debug("Analyzed view %s with ID %s" % (viewName, viewId))
-
-        # COPY for later use
-        allPlexTvShowsId = self.allPlexElementsId.copy()
+            log.debug("Analyzed view %s with ID %s", viewName, viewId)
 
-        # Process self.updatelist
-        self.GetAndProcessXMLs(itemType)
-        log.debug("GetAndProcessXMLs completed for tv shows")
-
-        # PROCESS TV Seasons #####
-        # Cycle through tv shows
-        for tvShowId in allPlexTvShowsId:
+        # LIST TV Seasons #####
+        # One paged query per view for all seasons, not one per show. Seasons
+        # whose checksum did not change are skipped by GetUpdatelist
+        for view in views:
             if self.threadStopped():
                 return False
-            # Grab all seasons to tvshow from PMS
-            seasons = GetAllPlexChildren(
-                tvShowId, containerSize=self.limitindex)
+            seasons = GetPlexSectionResults(
+                view['id'], args={'type': 3}, containerSize=self.limitindex,
+                stream=True, updatedAt=self.watermarks.get(view['id']))
             if seasons is None:
-                log.error("Error download season xml for show %s" % tvShowId)
+                log.error("Error downloading season xml for view %s",
+                          view['id'])
+                self.failedViews.add(view['id'])
                 continue
             elif seasons == 401:
                 return False
@@ -1204,26 +1833,24 @@ class LibrarySync(Thread):
             self.GetUpdatelist(seasons,
                                itemType,
                                'add_updateSeason',
-                               viewName,
-                               viewId)
-            log.debug("Analyzed all seasons of TV show with Plex Id %s"
-                      % tvShowId)
-
-        # Process self.updatelist
-        self.GetAndProcessXMLs(itemType)
-        log.debug("GetAndProcessXMLs completed for seasons")
+                               view['name'],
+                               view['id'])
+            log.debug("Analyzed all seasons of view %s", view['id'])
 
-        # PROCESS TV Episodes #####
+        # LIST TV Episodes #####
         # Cycle through tv shows
         for view in views:
             if self.threadStopped():
                 return False
             # Grab all episodes to tvshow from PMS
             episodes = GetAllPlexLeaves(
-                view['id'], containerSize=self.limitindex)
+                view['id'], containerSize=self.limitindex,
+                updatedAt=self.watermarks.get(view['id']),
+                stream=True)
             if episodes is None:
-                log.error("Error downloading episod xml for view %s"
-                          % view.get('name'))
+                log.error("Error downloading episod xml for view %s",
+                          view.get('name'))
+                self.failedViews.add(view['id'])
                 continue
             elif episodes == 401:
                 return False
@@ -1231,46 +1858,35 @@ class LibrarySync(Thread):
             self.GetUpdatelist(episodes,
                                itemType,
                                'add_updateEpisode',
-                               viewName,
-                               viewId)
-            log.debug("Analyzed all episodes of TV show with Plex Id %s"
-                      % view['id'])
-
-        # Process self.updatelist
-        self.GetAndProcessXMLs(itemType)
-        log.debug("GetAndProcessXMLs completed for episodes")
-        # Refresh season info
-        # Cycle through tv shows
-        with itemtypes.TVShows() as TVshow:
-            for tvShowId in allPlexTvShowsId:
-                XMLtvshow = GetPlexMetadata(tvShowId)
-                if XMLtvshow is None or XMLtvshow == 401:
-                    log.error('Could not download XMLtvshow')
-                    continue
-                TVshow.refreshSeasonEntry(XMLtvshow, tvShowId)
-        log.debug("Season info refreshed")
-
-        # Update viewstate:
-        for view in views:
-            if self.threadStopped():
-                return False
-            self.PlexUpdateWatched(view['id'], itemType)
-
-        if self.compare:
-            # Manual sync, process deletes
-            with itemtypes.TVShows() as TVShow:
-                for kodiTvElement in self.allKodiElementsId:
-                    if kodiTvElement not in self.allPlexElementsId:
-                        TVShow.remove(kodiTvElement)
-        log.info("%s sync is finished." % itemType)
-        return True
+                               view['name'],
+                               view['id'])
+            log.debug("Analyzed all episodes of TV show with Plex Id %s",
+                      view['id'])
+
+        # Kodi skips episodes whose show or season is missing: sync the
+        # new shows and seasons of On Deck or recently added episodes at
+        # least as early as the episodes themselves
+        tiers = {}
+        for item in self.pipeline.updatelist:
+            if item['priority'] > TIER_RECENT:
+                continue
+            for key in (item['parentId'], item['grandparentId']):
+                if key and tiers.get(key, TIER_REST) > item['priority']:
+                    tiers[key] = item['priority']
+        if tiers:
+            for item in self.pipeline.updatelist:
+                item['priority'] = min(item['priority'],
+                                       tiers.get(item['itemId'], TIER_REST))
+        log.info("Listed %s TV shows, seasons and episodes to sync",
+                 len(self.pipeline.updatelist))
+        return self.TakeListing(views)
 
     @LogTime
     def PlexMusic(self):
         itemType = 'Music'
 
         views = [x for x in self.views if x['itemtype'] == v.PLEX_TYPE_ARTIST]
-        log.info("Media folders for %s: %s" % (itemType, views))
+        log.info("Media folders for %s: %s", itemType, views)
 
         methods = {
             v.PLEX_TYPE_ARTIST: 'add_updateArtist',
@@ -1289,33 +1905,37 @@ class LibrarySync(Thread):
                      v.PLEX_TYPE_SONG):
             if self.threadStopped():
                 return False
-            log.debug("Start processing music %s" % kind)
+            log.debug("Start processing music %s", kind)
             if self.ProcessMusic(views,
                                  kind,
                                  urlArgs[kind],
                                  methods[kind]) is False:
                 return False
-            log.debug("Processing of music %s done" % kind)
+            log.debug("Processing of music %s done", kind)
             self.GetAndProcessXMLs(itemType)
-            log.debug("GetAndProcessXMLs for music %s completed" % kind)
+            log.debug("GetAndProcessXMLs for music %s completed", kind)
 
         # Update viewstate for EVERY item
-        for view in views:
-            if self.threadStopped():
-                return False
-            self.PlexUpdateWatched(view['id'], itemType)
+        with DBWriter():
+            for view in views:
+                if self.threadStopped():
+                    return False
+                self.PlexUpdateWatched(
+                    view['id'],
+                    itemType,
+                    lastViewedAt=self.watermarks.get(view['id']))
 
         # reset stuff
-        self.allKodiElementsId = {}
-        self.allPlexElementsId = {}
-        self.updatelist = []
-        log.info("%s sync is finished." % itemType)
+        self.pipeline.allKodiElementsId = {}
+        self.pipeline.allPlexElementsId = {}
+        self.pipeline.updatelist = []
+        log.info("%s sync is finished.", itemType)
         return True
 
     def ProcessMusic(self, views, kind, urlArgs, method):
-        self.allKodiElementsId = {}
-        self.allPlexElementsId = {}
-        self.updatelist = []
+        self.pipeline.allKodiElementsId = {}
+        self.pipeline.allPlexElementsId = {}
+        self.pipeline.updatelist = []
 
         # Get a list of items already existing in Kodi db
         if self.compare:
@@ -1323,7 +1943,7 @@ class LibrarySync(Thread):
                 # Pull the list of items already in Kodi
                 try:
                     elements = dict(plex_db.getChecksum(kind))
-                    self.allKodiElementsId.update(elements)
+                    self.pipeline.allKodiElementsId.update(elements)
                 # Yet empty/nothing yet synched
                 except ValueError:
                     pass
@@ -1335,9 +1955,11 @@ class LibrarySync(Thread):
             viewId = view['id']
             viewName = view['name']
             itemsXML = GetPlexSectionResults(
-                viewId, args=urlArgs, containerSize=self.limitindex)
+                viewId, args=urlArgs, containerSize=self.limitindex,
+                stream=True, updatedAt=self.watermarks.get(viewId))
             if itemsXML is None:
-                log.error("Error downloading xml for view %s" % viewId)
+                log.error("Error downloading xml for view %s", viewId)
+                self.failedViews.add(viewId)
                 continue
             elif itemsXML == 401:
                 return False
@@ -1348,16 +1970,16 @@ class LibrarySync(Thread):
                                viewName,
                                viewId)
 
-        if self.compare:
+        if self.compare and not self.delta:
             # Manual sync, process deletes
             with itemtypes.Music() as Music:
-                for itemid in self.allKodiElementsId:
-                    if itemid not in self.allPlexElementsId:
+                for itemid in self.pipeline.allKodiElementsId:
+                    if itemid not in self.pipeline.allPlexElementsId:
                         Music.remove(itemid)
 
     def compareDBVersion(self, current, minimum):
         # It returns True is database is up to date. False otherwise.
-        log.info("current DB: %s minimum DB: %s" % (current, minimum))
+        log.info("current DB: %s minimum DB: %s", current, minimum)
         try:
             currMajor, currMinor, currPatch = current.split(".")
         except ValueError:
@@ -1397,22 +2019,28 @@ class LibrarySync(Thread):
         elif typus == 'timeline':
             self.process_timeline(message['TimelineEntry'])
 
-    def multi_delete(self, liste, deleteListe):
+    def idle_time(self, now, lastSync, lastTimeSync):
         """
-        Deletes the list items of liste at the positions in deleteListe
-        (which can be in any arbitrary order)
+        Returns the number of seconds run_internal may wait for PMS messages
+        until something else is due: websocket items to process, the
+        scheduled sync or the daily time sync
         """
-        indexes = sorted(deleteListe, reverse=True)
-        for index in indexes:
-            del liste[index]
-        return liste
+        due = min(lastSync + self.fullSyncInterval,
+                  lastTimeSync + 60*60*24) - now
+        if self.itemsToProcess:
+            due = min(due, 5)
+        # E.g. the scheduled sync is postponed while something is playing
+        return max(due, 1)
 
     def processItems(self):
         """
         Periodically called to process new/updated PMS items
 
         PMS needs a while to download info from internet AFTER it
-        showed up under 'timeline' websocket messages
+        showed up under 'timeline' websocket messages. Hence an item is only
+        processed once no new message arrived for it for saftyMargin seconds
+        (but after MAX_DEBOUNCE seconds at the latest). Deletions are
+        processed right away.
 
         data['type']:
             1:      movie
@@ -1433,44 +2061,39 @@ class LibrarySync(Thread):
             6: 'analyzing',
             9: 'deleted'
         """
-        self.videoLibUpdate = False
-        self.musicLibUpdate = False
         now = getUnixTimestamp()
-        deleteListe = []
-        for i, item in enumerate(self.itemsToProcess):
-            if self.threadStopped():
-                # Chances are that Kodi gets shut down
-                break
+        deleted = []
+        updated = []
+        for item in self.itemsToProcess.itervalues():
             if item['state'] == 9:
-                successful = self.process_deleteditems(item)
-            elif now - item['timestamp'] < self.saftyMargin:
-                # We haven't waited long enough for the PMS to finish
-                # processing the item. Do it later (excepting deletions)
-                continue
-            else:
-                successful = self.process_newitems(item)
-                if successful and settings('FanartTV') == 'true':
-                    plex_type = v.PLEX_TYPE_FROM_WEBSOCKET[item['type']]
-                    if plex_type in (v.PLEX_TYPE_MOVIE, v.PLEX_TYPE_SHOW):
-                        self.fanartqueue.put({
-                            'plex_id': item['ratingKey'],
-                            'plex_type': plex_type,
-                            'refresh': False
-                        })
-            if successful is True:
-                deleteListe.append(i)
-            else:
+                deleted.append(item)
+            elif (now - item['timestamp'] >= self.saftyMargin or
+                    now - item['first'] >= MAX_DEBOUNCE):
+                updated.append(item)
+        if not deleted and not updated:
+            return
+        self.videoLibUpdate = False
+        self.musicLibUpdate = False
+        # Share the DB connections and transactions for all items
+        with DBWriter():
+            done = self.process_deleteditems(deleted)
+            for i in range(0, len(updated), self.metadataBatchSize):
+                if self.threadStopped():
+                    # Chances are that Kodi gets shut down
+                    break
+                done.extend(self.process_newitems(
+                    updated[i:i + self.metadataBatchSize]))
+        stopped = self.threadStopped()
+        for item in deleted + updated:
+            if item['ratingKey'] in done:
+                del self.itemsToProcess[item['ratingKey']]
+            elif not stopped:
                 # Safety net if we can't process an item
                 item['attempt'] += 1
                 if item['attempt'] > 3:
-                    log.error('Repeatedly could not process item %s, abort'
-                              % item)
-                    deleteListe.append(i)
-
-        # Get rid of the items we just processed
-        if len(deleteListe) > 0:
-            self.itemsToProcess = self.multi_delete(
-                self.itemsToProcess, deleteListe)
+                    log.error('Repeatedly could not process item %s, abort',
+                              item)
+                    del self.itemsToProcess[item['ratingKey']]
         # Let Kodi know of the change
         if self.videoLibUpdate is True:
             log.info("Doing Kodi Video Lib update")
@@ -1479,60 +2102,101 @@ class LibrarySync(Thread):
             log.info("Doing Kodi Music Lib update")
             xbmc.executebuiltin('UpdateLibrary(music)')
 
-    def process_newitems(self, item):
-        xml = GetPlexMetadata(item['ratingKey'])
-        try:
-            mediatype = xml[0].attrib['type']
-        except (IndexError, KeyError, TypeError):
-            log.error('Could not download metadata for %s' % item['ratingKey'])
-            return False
-        log.debug("Processing new/updated PMS item: %s" % item['ratingKey'])
-        viewtag = xml.attrib.get('librarySectionTitle')
-        viewid = xml.attrib.get('librarySectionID')
-        if mediatype == v.PLEX_TYPE_MOVIE:
-            self.videoLibUpdate = True
-            with itemtypes.Movies() as movie:
-                movie.add_update(xml[0],
-                                 viewtag=viewtag,
-                                 viewid=viewid)
-        elif mediatype == v.PLEX_TYPE_EPISODE:
-            self.videoLibUpdate = True
-            with itemtypes.TVShows() as show:
-                show.add_updateEpisode(xml[0],
-                                       viewtag=viewtag,
-                                       viewid=viewid)
-        elif mediatype == v.PLEX_TYPE_SONG:
-            self.musicLibUpdate = True
-            with itemtypes.Music() as music:
-                music.add_updateSong(xml[0],
-                                     viewtag=viewtag,
-                                     viewid=viewid)
-        return True
-
-    def process_deleteditems(self, item):
-        if item.get('type') == 1:
-            log.debug("Removing movie %s" % item.get('ratingKey'))
-            self.videoLibUpdate = True
-            with itemtypes.Movies() as movie:
-                movie.remove(item.get('ratingKey'))
-        elif item.get('type') in (2, 3, 4):
-            log.debug("Removing episode/season/tv show %s"
-                      % item.get('ratingKey'))
-            self.videoLibUpdate = True
-            with itemtypes.TVShows() as show:
-                show.remove(item.get('ratingKey'))
-        elif item.get('type') in (8, 9, 10):
-            log.debug("Removing song/album/artist %s" % item.get('ratingKey'))
-            self.musicLibUpdate = True
-            with itemtypes.Music() as music:
-                music.remove(item.get('ratingKey'))
-        return True
+    def process_newitems(self, items):
+        """
+        Downloads the metadata for all items with one request and adds/updates
+        them. Returns a set of the ratingKeys that were processed successfully
+        """
+        xmls = {}
+        if len(items) > 1:
+            xmls = GetPlexMetadataBatch([item['ratingKey'] for item in items])
+            if xmls is None or xmls == 401:
+                log.warn("Could not get metadata for batch of %s items. "
+                         "Retrying item by item", len(items))
+                xmls = {}
+        # {mediatype: [xml]}
+        todo = {}
+        for item in items:
+            xml = xmls.get(item['ratingKey'])
+            if xml is None:
+                xml = GetPlexMetadata(item['ratingKey'])
+            try:
+                mediatype = xml[0].attrib['type']
+            except (IndexError, KeyError, TypeError):
+                log.error('Could not download metadata for %s',
+                          item['ratingKey'])
+                continue
+            todo.setdefault(mediatype, []).append(xml)
+        done = set()
+        for mediatype, itemType, method in (
+                (v.PLEX_TYPE_MOVIE, 'Movies', 'add_update'),
+                (v.PLEX_TYPE_EPISODE, 'TVShows', 'add_updateEpisode'),
+                (v.PLEX_TYPE_SONG, 'Music', 'add_updateSong')):
+            if mediatype not in todo:
+                continue
+            if itemType == 'Music':
+                self.musicLibUpdate = True
+            else:
+                self.videoLibUpdate = True
+            with getattr(itemtypes, itemType)() as itemClass:
+                itemFkt = getattr(itemClass, method)
+                for xml in todo[mediatype]:
+                    log.debug("Processing new/updated PMS item: %s",
+                              xml[0].get('ratingKey'))
+                    # Batched answers might lack the section on top level
+                    itemFkt(xml[0],
+                            viewtag=(xml.get('librarySectionTitle') or
+                                     xml[0].get('librarySectionTitle')),
+                            viewid=(xml.get('librarySectionID') or
+                                    xml[0].get('librarySectionID')))
+                    done.add(xml[0].get('ratingKey'))
+                    if (settings_bool('FanartTV') and
+                            mediatype == v.PLEX_TYPE_MOVIE):
+                        self.fanartqueue.put({
+                            'plex_id': xml[0].get('ratingKey'),
+                            'plex_type': mediatype,
+                            'refresh': False
+                        })
+        # Nothing to do for other media types
+        for mediatype in todo:
+            if mediatype not in (v.PLEX_TYPE_MOVIE,
+                                 v.PLEX_TYPE_EPISODE,
+                                 v.PLEX_TYPE_SONG):
+                done.update(xml[0].get('ratingKey') for xml in todo[mediatype])
+        return done
+
+    def process_deleteditems(self, items):
+        """
+        Removes all items from Kodi, one itemtypes context per media type.
+        Returns a list of the ratingKeys processed
+        """
+        done = []
+        for types, itemType in (((1,), 'Movies'),
+                                ((2, 3, 4), 'TVShows'),
+                                ((8, 9, 10), 'Music')):
+            todo = [item for item in items if item['type'] in types]
+            if not todo:
+                continue
+            if itemType == 'Music':
+                self.musicLibUpdate = True
+            else:
+                self.videoLibUpdate = True
+            log.debug("Removing %s %s", len(todo), itemType)
+            with getattr(itemtypes, itemType)() as itemClass:
+                itemClass.remove_many(item['ratingKey'] for item in todo)
+            done.extend(item['ratingKey'] for item in todo)
+        # Nothing to do for other types
+        done.extend(item['ratingKey'] for item in items
+                    if item['type'] not in (1, 2, 3, 4, 8, 9, 10))
+        return done
 
     def process_timeline(self, data):
         """
         PMS is messing with the library items, e.g. new or changed. Put in our
-        "processing queue" for later
+        "processing queue" for later. Several messages for the same item are
+        coalesced into one entry with the latest state
         """
+        now = getUnixTimestamp()
         for item in data:
             if 'tv.plex' in item.get('identifier', ''):
                 # Ommit Plex DVR messages - the Plex IDs are not corresponding
@@ -1545,61 +2209,44 @@ class LibrarySync(Thread):
                 # Only process deleted items OR movies, episodes, tracks/songs
                 plex_id = str(item.get('itemID', '0'))
                 if plex_id == '0':
-                    log.error('Received malformed PMS message: %s' % item)
+                    log.error('Received malformed PMS message: %s', item)
                     continue
-                # Have we already added this element?
-                for existingItem in self.itemsToProcess:
-                    if existingItem['ratingKey'] == plex_id:
-                        break
-                else:
-                    # Haven't added this element to the queue yet
-                    self.itemsToProcess.append({
+                existing = self.itemsToProcess.get(plex_id)
+                if existing is None:
+                    self.itemsToProcess[plex_id] = {
                         'state': state,
                         'type': typus,
                         'ratingKey': plex_id,
-                        'timestamp': getUnixTimestamp(),
+                        'timestamp': now,
+                        'first': now,
                         'attempt': 0
-                    })
+                    }
+                else:
+                    # PMS is still busy with this item. Wait some more
+                    existing['state'] = state
+                    existing['type'] = typus
+                    existing['timestamp'] = now
 
     def process_playing(self, data):
         """
         Someone (not necessarily the user signed in) is playing something some-
         where
         """
-        items = []
-        with plexdb.Get_Plex_DB() as plex_db:
+        sessions = self.sessions
+        # One connection and one commit for all items
+        with DBWriter(), plexdb.Get_Plex_DB() as plex_db:
             for item in data:
                 # Drop buffering messages immediately
                 state = item.get('state')
                 if state == 'buffering':
                     continue
                 ratingKey = item.get('ratingKey')
-                kodiInfo = plex_db.getItem_byId(ratingKey)
-                if kodiInfo is None:
-                    # Item not (yet) in Kodi library
-                    continue
                 sessionKey = item.get('sessionKey')
-                # Do we already have a sessionKey stored?
-                if sessionKey not in self.sessionKeys:
-                    if settings('plex_serverowned') == 'false':
-                        # Not our PMS, we are not authorized to get the
-                        # sessions
-                        # On the bright side, it must be us playing :-)
-                        self.sessionKeys = {
-                            sessionKey: {}
-                        }
-                    else:
-                        # PMS is ours - get all current sessions
-                        self.sessionKeys = GetPMSStatus(
-                            window('plex_token'))
-                        log.debug('Updated current sessions. They are: %s'
-                                  % self.sessionKeys)
-                        if sessionKey not in self.sessionKeys:
-                            log.warn('Session key %s still unknown! Skip '
-                                     'item' % sessionKey)
-                            continue
-
-                currSess = self.sessionKeys[sessionKey]
+                currSess = sessions.session(sessionKey)
+                if currSess is None:
+                    log.warn('Session key %s still unknown! Skip item',
+                             sessionKey)
+                    continue
                 if settings('plex_serverowned') != 'false':
                     # Identify the user - same one as signed on with PKC? Skip
                     # update if neither session's username nor userid match
@@ -1615,55 +2262,48 @@ class LibrarySync(Thread):
                               or
                               currSess['username'] == window('plex_username')):
                         log.debug('Our username %s, userid %s did not match '
-                                  'the session username %s with userid %s'
-                                  % (window('plex_username'),
-                                     window('currUserId'),
-                                     currSess['username'],
-                                     currSess['userId']))
-                        continue
-
-                # Get an up-to-date XML from the PMS
-                # because PMS will NOT directly tell us:
-                #   duration of item
-                #   viewCount
-                if currSess.get('duration') is None:
-                    xml = GetPlexMetadata(ratingKey)
-                    if xml in (None, 401):
-                        log.error('Could not get up-to-date xml for item %s'
-                                  % ratingKey)
+                                  'the session username %s with userid %s',
+                                  window('plex_username'),
+                                  window('currUserId'),
+                                  currSess['username'],
+                                  currSess['userId'])
                         continue
-                    API = PlexAPI.API(xml[0])
-                    userdata = API.getUserData()
-                    currSess['duration'] = userdata['Runtime']
-                    currSess['viewCount'] = userdata['PlayCount']
+                kodiInfo = plex_db.getItem_byId(ratingKey)
+                if kodiInfo is None:
+                    # Item not (yet) in Kodi library
+                    continue
+                # Get an up-to-date duration and viewCount
+                userdata = sessions.duration(ratingKey)
+                if userdata is None:
+                    continue
+                if state in ('stopped', 'ended'):
+                    sessions.stopped(ratingKey)
                 # Sometimes, Plex tells us resume points in milliseconds and
                 # not in seconds - thank you very much!
-                if item.get('viewOffset') > currSess['duration']:
+                if item.get('viewOffset') > userdata['duration']:
                     resume = item.get('viewOffset') / 1000
                 else:
                     resume = item.get('viewOffset')
-                # Append to list that we need to process
-                items.append({
+                item = {
                     'ratingKey': ratingKey,
                     'kodi_id': kodiInfo[0],
                     'file_id': kodiInfo[1],
                     'kodi_type': kodiInfo[4],
                     'viewOffset': resume,
                     'state': state,
-                    'duration': currSess['duration'],
-                    'viewCount': currSess['viewCount'],
+                    'duration': userdata['duration'],
+                    'viewCount': userdata['viewCount'],
                     'lastViewedAt': DateToKodi(getUnixTimestamp())
-                })
-                log.debug('Update playstate for user %s with id %s: %s'
-                          % (window('plex_username'),
-                             window('currUserId'),
-                             items[-1]))
-        # Now tell Kodi where we are
-        for item in items:
-            itemFkt = getattr(itemtypes,
-                              v.ITEMTYPE_FROM_KODITYPE[item['kodi_type']])
-            with itemFkt() as Fkt:
-                Fkt.updatePlaystate(item)
+                }
+                log.debug('Update playstate for user %s with id %s: %s',
+                          window('plex_username'),
+                          window('currUserId'),
+                          item)
+                # Now tell Kodi where we are
+                itemFkt = getattr(itemtypes,
+                                  v.ITEMTYPE_FROM_KODITYPE[item['kodi_type']])
+                with itemFkt() as Fkt:
+                    Fkt.updatePlaystate(item)
 
     def fanartSync(self, refresh=False):
         """
@@ -1689,9 +2329,9 @@ class LibrarySync(Thread):
             self.run_internal()
         except Exception as e:
             window('plex_dbScan', clear=True)
-            log.error('LibrarySync thread crashed. Error message: %s' % e)
+            log.error('LibrarySync thread crashed. Error message: %s', e)
             import traceback
-            log.error("Traceback:\n%s" % traceback.format_exc())
+            log.error("Traceback:\n%s", traceback.format_exc())
             # Library sync thread has crashed
             self.dialog.ok(lang(29999), lang(39400))
             raise
@@ -1699,7 +2339,9 @@ class LibrarySync(Thread):
     def run_internal(self):
         # Re-assign handles to have faster calls
         threadStopped = self.threadStopped
-        threadSuspended = self.threadSuspended
+        waitResumed = self.waitResumed
+        waitQueue = self.waitQueue
+        waitStopped = self.waitStopped
         installSyncDone = self.installSyncDone
         enableBackgroundSync = self.enableBackgroundSync
         fullSync = self.fullSync
@@ -1734,13 +2376,10 @@ class LibrarySync(Thread):
         while not threadStopped():
 
             # In the event the server goes offline
-            while threadSuspended():
-                # Set in service.py
-                if threadStopped():
-                    # Abort was requested while waiting. We should exit
-                    log.info("###===--- LibrarySync Stopped ---===###")
-                    return
-                xbmc.sleep(1000)
+            if not waitResumed():
+                # Abort was requested while waiting. We should exit
+                log.info("###===--- LibrarySync Stopped ---===###")
+                return
 
             if (window('plex_dbCheck') != "true" and installSyncDone):
                 # Verify the validity of the database
@@ -1749,7 +2388,7 @@ class LibrarySync(Thread):
 
                 if not self.compareDBVersion(currentVersion, minVersion):
                     log.warn("Db version out of date: %s minimum version "
-                             "required: %s" % (currentVersion, minVersion))
+                             "required: %s", currentVersion, minVersion)
                     # DB out of date. Proceed to recreate?
                     resp = self.dialog.yesno(heading=lang(29999),
                                              line1=lang(39401))
@@ -1772,14 +2411,14 @@ class LibrarySync(Thread):
                     # Database does not exists
                     log.error("The current Kodi version is incompatible "
                               "to know which Kodi versions are supported.")
-                    log.error('Current Kodi version: %s' % tryDecode(
+                    log.error('Current Kodi version: %s', tryDecode(
                         xbmc.getInfoLabel('System.BuildVersion')))
                     # "Current Kodi version is unsupported, cancel lib sync"
                     self.dialog.ok(heading=lang(29999), line1=lang(39403))
                     break
                 # Run start up sync
                 window('plex_dbScan', value="true")
-                log.info("Db version: %s" % settings('dbCreatedWithVersion'))
+                log.info("Db version: %s", settings('dbCreatedWithVersion'))
                 lastTimeSync = getUnixTimestamp()
                 # Initialize time offset Kodi - PMS
                 self.syncPMStime()
@@ -1793,8 +2432,8 @@ class LibrarySync(Thread):
                     # Start getting additional missing artwork
                     with plexdb.Get_Plex_DB() as plex_db:
                         missing_fanart = plex_db.get_missing_fanart()
-                        log.info('Trying to get %s additional fanart'
-                                 % len(missing_fanart))
+                        log.info('Trying to get %s additional fanart',
+                                 len(missing_fanart))
                         for item in missing_fanart:
                             self.fanartqueue.put({
                                 'plex_id': item['plex_id'],
@@ -1883,7 +2522,8 @@ class LibrarySync(Thread):
                         lastSync = now
                         log.info('Doing scheduled full library scan')
                         window('plex_dbScan', value="true")
-                        if fullSync() is False and not threadStopped():
+                        if (fullSync(delta=True) is False and
+                                not threadStopped()):
                             log.error('Could not finish scheduled full sync')
                             self.showKodiNote(lang(39410),
                                               forced=True,
@@ -1904,23 +2544,25 @@ class LibrarySync(Thread):
                         if now - lastProcessing > 5:
                             lastProcessing = now
                             processItems()
-                        # See if there is a PMS message we need to handle
-                        try:
-                            message = queue.get(block=False)
-                        except Queue.Empty:
-                            xbmc.sleep(100)
-                            continue
-                        # Got a message from PMS; process it
-                        else:
+                        # Wait for a PMS message we need to handle - or
+                        # until it's time to do something else
+                        message = waitQueue(queue, timeout=self.idle_time(
+                            now, lastSync, lastTimeSync))
+                        if message is not None:
                             processMessage(message)
                             queue.task_done()
-                            # NO sleep!
-                            continue
+                        continue
                     else:
-                        # Still sleep if backgroundsync disabled
-                        xbmc.sleep(100)
+                        # Nothing to do until the next scheduled sync
+                        waitStopped(self.idle_time(now, lastSync,
+                                                   lastTimeSync))
+                        continue
+            else:
+                # Wait for the other scan to finish (plex_dbScan cleared)
+                waitStopped(5)
+                continue
 
-            xbmc.sleep(100)
+            waitStopped(0.1)
 
         # doUtils could still have a session open due to interrupted sync
         try:
@@ -3,18 +3,60 @@
 ##################################################################################################
 
 import logging
+from Queue import Queue
+from threading import Thread
+
 import xbmc
 
-from utils import window, tryEncode
+from utils import tryEncode
+import state
 
 ##################################################################################################
 
-
-def config():
-
+# PKC's setting logLevel: most verbose Python logging level to log
+LEVELS = {
+    0: logging.WARNING,
+    1: logging.INFO,
+    2: logging.DEBUG
+}
+# Put into the queue to stop the logging thread
+_STOP = object()
+# Our handlers, see stop()
+_HANDLERS = []
+
+
+def config(asynchronous=False):
+    """
+    Set asynchronous=True to let a background thread call xbmc.log() - for
+    the long-running service only. Call stop() before exiting
+    """
     logger = logging.getLogger('PLEX')
-    logger.addHandler(LogHandler())
-    logger.setLevel(logging.DEBUG)
+    handler = QueueHandler() if asynchronous else LogHandler()
+    logger.addHandler(handler)
+    _HANDLERS.append(handler)
+    set_level('plex_logLevel', state.get('plex_logLevel'))
+    # Log records below the log level are not even created
+    state.subscribe('plex_logLevel', set_level)
+
+
+def set_level(name, log_level):
+    """
+    Sets the level of our logger according to PKC's log_level (an int)
+    """
+    logging.getLogger('PLEX').setLevel(
+        LEVELS.get(log_level, logging.DEBUG if log_level > 2 else
+                   logging.WARNING))
+
+
+def stop():
+    """
+    Writes all remaining log records and stops the logging thread
+    """
+    logger = logging.getLogger('PLEX')
+    while _HANDLERS:
+        handler = _HANDLERS.pop()
+        logger.removeHandler(handler)
+        handler.close()
 
 
 class LogHandler(logging.StreamHandler):
@@ -26,27 +68,54 @@ class LogHandler(logging.StreamHandler):
 
     def emit(self, record):
 
-        if self._get_log_level(record.levelno):
-            try:
-                xbmc.log(self.format(record), level=xbmc.LOGNOTICE)
-            except UnicodeEncodeError:
-                xbmc.log(tryEncode(self.format(record)), level=xbmc.LOGNOTICE)
-
-    @classmethod
-    def _get_log_level(cls, level):
-
-        levels = {
-            logging.ERROR: 0,
-            logging.WARNING: 0,
-            logging.INFO: 1,
-            logging.DEBUG: 2
-        }
         try:
-            log_level = int(window('plex_logLevel'))
-        except ValueError:
-            log_level = 0
+            xbmc.log(self.format(record), level=xbmc.LOGNOTICE)
+        except UnicodeEncodeError:
+            xbmc.log(tryEncode(self.format(record)), level=xbmc.LOGNOTICE)
+
 
-        return log_level >= levels[level]
+class QueueHandler(LogHandler):
+    """
+    Hands log records over to a background thread that formats them and
+    calls xbmc.log(). The logging thread never waits for Kodi's log file
+    """
+    def __init__(self):
+
+        LogHandler.__init__(self)
+        self.queue = Queue()
+        self.thread = Thread(target=self.run, name='PKC logging')
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def emit(self, record):
+
+        try:
+            # Merge the arguments right away - they might change later on
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                # Don't keep the traceback's frames alive
+                record.exc_text = self.formatter.formatException(
+                    record.exc_info)
+                record.exc_info = None
+        except Exception:
+            self.handleError(record)
+        else:
+            self.queue.put(record)
+
+    def run(self):
+
+        while True:
+            record = self.queue.get()
+            if record is _STOP:
+                break
+            LogHandler.emit(self, record)
+
+    def close(self):
+
+        self.queue.put(_STOP)
+        self.thread.join(5.0)
+        LogHandler.close(self)
 
 
 class MyFormatter(logging.Formatter):
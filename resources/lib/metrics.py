@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of counters and histograms describing how PKC's library sync
+performs, e.g. to tune syncThreadNumber and limitindex.
+
+    count(name, value=1)        Increase a counter
+    observe(name, value)        Put value into a histogram, e.g. a latency
+    Timer(name)                 Time a block: "with Timer(name):"
+
+The service dumps the registry as JSON to the addon's profile directory
+after every full sync (dump()); the addon menu shows it (load(), report()).
+Names are dot-separated, e.g. 'http.latency./library/metadata/#'
+"""
+import logging
+from bisect import bisect_left
+from functools import wraps
+from json import dump as json_dump, load as json_load
+from os.path import join
+from re import compile as re_compile, IGNORECASE
+from threading import Lock
+from time import time
+from urlparse import urlparse
+
+import xbmc
+
+import variables as v
+
+###############################################################################
+
+log = logging.getLogger("PLEX."+__name__)
+
+# Upper bounds of the buckets for durations in seconds ...
+TIME_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                30.0, 60.0, 300.0, 900.0, 3600.0)
+# ... and for counts, e.g. queue depths or SQL statements per item
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+FILE = join(v.tryDecode(xbmc.translatePath(
+    'special://profile/addon_data/%s/' % v.ADDON_ID)), 'metrics.json')
+
+# Numeric path segments of PMS urls, e.g. /library/metadata/123 - or
+# /library/metadata/1,2,3 for batches
+_NUMBERS = re_compile(r'/\d+(?:,\d+)*(?=/|$)')
+# The Kodi table that an SQL statement writes to (if any)
+_WRITE = re_compile(r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|'
+                    r'UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(\w+)',
+                    IGNORECASE)
+# {SQL statement: table written to or None} ...
+_TABLES = {}
+# ... but don't remember more statements than this
+MAX_TABLES = 1000
+
+_LOCK = Lock()
+_COUNTERS = {}
+_HISTOGRAMS = {}
+_SINCE = time()
+
+###############################################################################
+
+
+class Histogram(object):
+    """
+    Counts observed values in buckets with the upper bounds bounds (a sorted
+    tuple). Values larger than the last bound go into an overflow bucket
+    """
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def as_dict(self):
+        buckets = {}
+        for i, number in enumerate(self.buckets):
+            if number == 0:
+                continue
+            if i < len(self.bounds):
+                buckets['<=%s' % self.bounds[i]] = number
+            else:
+                buckets['>%s' % self.bounds[-1]] = number
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.minimum,
+            'max': self.maximum,
+            'buckets': buckets
+        }
+
+
+class Timer(object):
+    """
+    Use "with Timer(name):" to put the duration of the block (in seconds)
+    into the histogram name
+    """
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        observe(self.name, time() - self.start)
+
+
+def count(name, value=1):
+    """
+    Increases the counter name by value
+    """
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+
+def observe(name, value, bounds=TIME_BUCKETS):
+    """
+    Puts value into the histogram name. bounds is only used when the
+    histogram is created
+    """
+    with _LOCK:
+        try:
+            _HISTOGRAMS[name].add(value)
+        except KeyError:
+            histogram = _HISTOGRAMS[name] = Histogram(bounds)
+            histogram.add(value)
+
+
+def endpoint(url):
+    """
+    Returns the path of url with all numbers replaced by '#', e.g.
+    '/library/metadata/#' for 'http://pms:32400/library/metadata/1?x=y' or
+    for '.../library/metadata/1,2,3'
+    """
+    return _NUMBERS.sub('/#', urlparse(url).path) or '/'
+
+
+def request_done(url, latency, status):
+    """
+    Call for every HTTP request; status is None if we did not get an answer
+    """
+    path = endpoint(url)
+    observe('http.latency.%s' % path, latency)
+    count('http.status.%s' % status)
+    if status is None or status >= 400:
+        count('http.errors.%s' % path)
+
+
+def reset():
+    """
+    Forgets everything recorded so far
+    """
+    global _SINCE
+    with _LOCK:
+        _COUNTERS.clear()
+        _HISTOGRAMS.clear()
+        _SINCE = time()
+
+
+def snapshot():
+    """
+    Returns everything recorded so far as a dict that can be dumped as JSON
+    """
+    with _LOCK:
+        return {
+            'since': _SINCE,
+            'until': time(),
+            'counters': dict(_COUNTERS),
+            'histograms': dict((name, histogram.as_dict())
+                               for name, histogram
+                               in _HISTOGRAMS.iteritems())
+        }
+
+
+def dump():
+    """
+    Writes snapshot() to FILE. Never raises
+    """
+    try:
+        with open(FILE, 'wb') as f:
+            json_dump(snapshot(), f, indent=2, sort_keys=True)
+    except (IOError, OSError) as err:
+        log.warn('Could not write metrics to %s: %s', FILE, err)
+    else:
+        log.debug('Metrics written to %s', FILE)
+
+
+def load():
+    """
+    Returns the metrics dumped last or None
+    """
+    try:
+        with open(FILE, 'rb') as f:
+            return json_load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def report(data):
+    """
+    Returns the dumped metrics data as human-readable unicode
+    """
+    lines = [u'%.0f seconds recorded' % (data['until'] - data['since']), u'']
+    for name, value in sorted(data['counters'].iteritems()):
+        lines.append(u'%s: %s' % (name, value))
+    for name, histogram in sorted(data['histograms'].iteritems()):
+        lines.append(u'')
+        lines.append(u'%s: %s times, mean %.3f, min %.3f, max %.3f, '
+                     u'total %.3f' % (name,
+                                      histogram['count'],
+                                      histogram['mean'],
+                                      histogram['min'],
+                                      histogram['max'],
+                                      histogram['sum']))
+        lines.append(u'    ' + u', '.join(
+            u'%s: %s' % (bucket, number) for bucket, number
+            in sorted(histogram['buckets'].iteritems(), key=_bucket_order)))
+    return u'\n'.join(lines)
+
+
+def _bucket_order(item):
+    bucket = item[0]
+    if bucket.startswith('>'):
+        return float('inf')
+    return float(bucket[2:])
+
+
+class CountingCursor(object):
+    """
+    Wraps the sqlite3 cursor cursor and counts the SQL statements executed
+    (self.statements) as well as the rows written per table to the
+    counters '<prefix>.<table>'
+    """
+    def __init__(self, cursor, prefix):
+        self.cursor = cursor
+        self.prefix = prefix
+        self.statements = 0
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def _written(self, sql):
+        self.statements += 1
+        try:
+            table = _TABLES[sql]
+        except KeyError:
+            match = _WRITE.match(sql)
+            table = match.group(1) if match else None
+            if len(_TABLES) < MAX_TABLES:
+                _TABLES[sql] = table
+        if table is not None and self.cursor.rowcount > 0:
+            count('%s.%s' % (self.prefix, table), self.cursor.rowcount)
+
+    def execute(self, sql, *args):
+        self.cursor.execute(sql, *args)
+        self._written(sql)
+        return self
+
+    def executemany(self, sql, *args):
+        self.cursor.executemany(sql, *args)
+        self._written(sql)
+        return self
+
+
+def count_statements(method):
+    """
+    Decorator for methods of itemtypes.Items: puts the number of SQL
+    statements the method executed on self.kodicursor (a CountingCursor)
+    into the histogram 'sql.statements.<class>.<method>'
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        before = self.kodicursor.statements
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            observe('sql.statements.%s.%s' % (self.__class__.__name__,
+                                              method.__name__),
+                    self.kodicursor.statements - before,
+                    bounds=COUNT_BUCKETS)
+    return wrapper
@@ -4,8 +4,6 @@ import logging
 from threading import Thread
 from Queue import Queue
 
-from xbmc import sleep
-
 from utils import window, ThreadMethods
 
 ###############################################################################
@@ -35,7 +33,8 @@ class Monitor_Kodi_Play(Thread):
                 queue.put(window('plex_play_new_item'))
                 window('plex_play_new_item', clear=True)
             else:
-                sleep(20)
+                # Woken up as soon as default.py sets plex_play_new_item
+                self.waitStopped()
         # Put one last item into the queue to let playback_starter end
         queue.put(None)
         log.info("----===## Kodi_Play_Client stopped ##===----")
@@ -3,7 +3,7 @@
 import logging
 from threading import RLock, Thread
 
-from xbmc import sleep, Player, PlayList, PLAYLIST_MUSIC, PLAYLIST_VIDEO
+from xbmc import Player, PlayList, PLAYLIST_MUSIC, PLAYLIST_VIDEO
 
 from utils import window, ThreadMethods, ThreadMethodsAdditionalSuspend
 import playlist_func as PL
@@ -15,6 +15,8 @@ log = logging.getLogger("PLEX."+__name__)
 
 # Lock used for playqueue manipulations
 lock = RLock()
+# Compare Kodi's playqueues at least every x seconds
+PLAYQUEUE_RECHECK = 1.0
 ###############################################################################
 
 
@@ -159,7 +161,6 @@ class Playqueue(Thread):
 
     def run(self):
         threadStopped = self.threadStopped
-        threadSuspended = self.threadSuspended
         log.info("----===## Starting PlayQueue client ##===----")
         # Initialize the playqueues, if Kodi already got items in them
         for playqueue in self.playqueues:
@@ -169,10 +170,8 @@ class Playqueue(Thread):
                 else:
                     PL.add_item_to_PMS_playlist(playqueue, i, kodi_item=item)
         while not threadStopped():
-            while threadSuspended():
-                if threadStopped():
-                    break
-                sleep(1000)
+            if not self.waitResumed():
+                break
             with lock:
                 for playqueue in self.playqueues:
                     kodi_playqueue = PL.get_kodi_playlist_items(playqueue)
@@ -180,5 +179,6 @@ class Playqueue(Thread):
                         # compare old and new playqueue
                         self._compare_playqueues(playqueue, kodi_playqueue)
                         playqueue.old_kodi_pl = list(kodi_playqueue)
-            sleep(50)
+            # KodiMonitor wakes us up early if a Kodi playlist changed
+            self.waitStopped(PLAYQUEUE_RECHECK)
         log.info("----===## PlayQueue client stopped ##===----")
@@ -3,6 +3,7 @@
 ###############################################################################
 
 from utils import kodiSQL
+from db_writer import current_writer
 import logging
 import variables as v
 
@@ -10,22 +11,97 @@ import variables as v
 
 log = logging.getLogger("PLEX."+__name__)
 
+# Schema migrations for plex.db. The n-th entry brings the DB from
+# PRAGMA user_version n to n+1. Only ever append to this list!
+MIGRATIONS = [
+    # 1: indices for the lookups that a sync actually performs
+    [
+        'CREATE INDEX IF NOT EXISTS ix_plex_kodi ON plex (kodi_id, kodi_type)',
+        'CREATE INDEX IF NOT EXISTS ix_plex_parent ON plex (parent_id, '
+        'kodi_type)',
+        'CREATE INDEX IF NOT EXISTS ix_plex_view ON plex (view_id)',
+        'CREATE INDEX IF NOT EXISTS ix_plex_type_fanart ON plex (plex_type, '
+        'fanart_synced)'
+    ],
+    # 2: per-view watermarks for delta syncs
+    [
+        'CREATE TABLE IF NOT EXISTS watermark(view_id TEXT UNIQUE, '
+        'updated_at INTEGER)'
+    ],
+    # 3: journal of the items a running sync still needs to process
+    [
+        'CREATE TABLE IF NOT EXISTS journal(plex_id TEXT UNIQUE, '
+        'item_type TEXT, method TEXT, view_name TEXT, view_id TEXT, '
+        'title TEXT, media_type TEXT, priority INTEGER)'
+    ],
+]
+
+# Hot queries that should never need a full table scan; checked at startup
+HOT_QUERIES = [
+    ('SELECT plex_id FROM plex WHERE kodi_id = ? AND kodi_type = ?',
+     (1, 'movie')),
+    ('SELECT plex_id FROM plex WHERE parent_id = ? AND kodi_type = ?',
+     (1, 'season')),
+    ('SELECT plex_id FROM plex WHERE view_id = ?', ('1',)),
+    ('SELECT plex_id, checksum FROM plex WHERE plex_type = ?', ('movie',)),
+    ('SELECT plex_id, plex_type FROM plex WHERE fanart_synced = ? '
+     'AND (plex_type = ? OR plex_type = ?)', (0, 'movie', 'show')),
+]
+
 ###############################################################################
 
 
+def migrate_plex_db(cursor):
+    """
+    Applies all outstanding MIGRATIONS to plex.db, tracked by sqlite's
+    PRAGMA user_version. Tables need to exist already.
+    """
+    cursor.execute('PRAGMA user_version')
+    version = cursor.fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:],
+                                        start=version + 1):
+        log.info('Migrating plex.db to schema version %s' % number)
+        for statement in statements:
+            cursor.execute(statement)
+        # PRAGMA does not accept parameters
+        cursor.execute('PRAGMA user_version = %d' % number)
+
+
+def check_query_plans(cursor):
+    """
+    Logs a warning for every HOT_QUERIES entry for which sqlite would scan
+    the entire plex table instead of using an index
+    """
+    for query, args in HOT_QUERIES:
+        cursor.execute('EXPLAIN QUERY PLAN ' + query, args)
+        for row in cursor.fetchall():
+            detail = row[-1]
+            if detail.startswith('SCAN') and 'INDEX' not in detail:
+                log.warn('plex.db query does a full table scan: %s (%s)'
+                         % (query, detail))
+
+
 class Get_Plex_DB():
     """
     Usage: with Get_Plex_DB() as plex_db:
                plex_db.do_something()
 
     On exiting "with" (no matter what), commits get automatically committed
-    and the db gets closed
+    and the db gets closed - unless a db_writer.DBWriter is active for the
+    current thread. Then its connection is used (and committed by the
+    DBWriter)
     """
     def __enter__(self):
-        self.plexconn = kodiSQL('plex')
+        self.writer = current_writer()
+        if self.writer is None:
+            self.plexconn = kodiSQL('plex')
+        else:
+            self.plexconn = self.writer.connection('plex')
         return Plex_DB_Functions(self.plexconn.cursor())
 
     def __exit__(self, type, value, traceback):
+        if self.writer is not None:
+            return
         self.plexconn.commit()
         self.plexconn.close()
 
@@ -159,6 +235,30 @@ class Plex_DB_Functions():
             WHERE view_id = ?
         '''
         self.plexcursor.execute(query, (view_id,))
+        query = '''
+            DELETE FROM watermark
+            WHERE view_id = ?
+        '''
+        self.plexcursor.execute(query, (view_id,))
+
+    def get_watermarks(self):
+        """
+        Returns the dict {view_id: updated_at} with the PMS time of the last
+        successful sync of every Plex library
+        """
+        query = '''SELECT view_id, updated_at FROM watermark'''
+        self.plexcursor.execute(query)
+        return dict(self.plexcursor.fetchall())
+
+    def set_watermark(self, view_id, updated_at):
+        """
+        Sets the PMS time updated_at of the last successful sync of view_id
+        """
+        query = '''
+            INSERT OR REPLACE INTO watermark(view_id, updated_at)
+            VALUES (?, ?)
+        '''
+        self.plexcursor.execute(query, (view_id, updated_at))
 
     def get_items_by_viewid(self, view_id):
         """
@@ -278,7 +378,7 @@ class Plex_DB_Functions():
             SELECT plex_id, kodi_id, kodi_fileid
             FROM plex
             WHERE parent_id = ?
-            AND kodi_type = ?"
+            AND kodi_type = ?
         '''
         self.plexcursor.execute(query, (parent_id, kodi_type,))
         return self.plexcursor.fetchall()
@@ -385,6 +485,27 @@ class Plex_DB_Functions():
         query = "DELETE FROM plex WHERE plex_id = ?"
         self.plexcursor.execute(query, (plex_id,))
 
+    def removeItems(self, plex_ids):
+        """
+        Removes all entries with the plex_ids
+        """
+        query = "DELETE FROM plex WHERE plex_id = ?"
+        self.plexcursor.executemany(query,
+                                    ((plex_id,) for plex_id in plex_ids))
+
+    def getItems_byKodiTypes(self, kodi_types):
+        """
+        Returns a list of tuples (plex_id, kodi_id, kodi_fileid, parent_id,
+        kodi_type) for all items of any of the kodi_types
+        """
+        query = '''
+            SELECT plex_id, kodi_id, kodi_fileid, parent_id, kodi_type
+            FROM plex
+            WHERE kodi_type IN (%s)
+        ''' % ','.join('?' * len(kodi_types))
+        self.plexcursor.execute(query, tuple(kodi_types))
+        return self.plexcursor.fetchall()
+
     def removeWildItem(self, plex_id):
         """
         Removes all entries with plex_id with % added
@@ -425,6 +546,57 @@ class Plex_DB_Functions():
         query = '''UPDATE plex SET fanart_synced = 1 WHERE plex_id = ?'''
         self.plexcursor.execute(query, (plex_id,))
 
+    def add_journal_items(self, updatelist):
+        """
+        Records the items of LibrarySync's updatelist in the sync journal
+        """
+        query = '''
+            INSERT OR REPLACE INTO journal(
+                plex_id, item_type, method, view_name, view_id, title,
+                media_type, priority)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        '''
+        self.plexcursor.executemany(
+            query,
+            ((item['itemId'], item['itemType'], item['method'],
+              item['viewName'], item['viewId'], item['title'],
+              item['mediaType'], item['priority']) for item in updatelist))
+
+    def remove_journal_item(self, plex_id):
+        """
+        Removes plex_id from the sync journal, e.g. once it has been synced
+        """
+        query = '''DELETE FROM journal WHERE plex_id = ?'''
+        self.plexcursor.execute(query, (plex_id,))
+
+    def remove_journal_items(self, plex_ids):
+        """
+        Removes all plex_ids from the sync journal
+        """
+        query = '''DELETE FROM journal WHERE plex_id = ?'''
+        self.plexcursor.executemany(query,
+                                    ((plex_id,) for plex_id in plex_ids))
+
+    def get_journal(self):
+        """
+        Returns the items in the sync journal as a list of dicts in the
+        format of LibrarySync's updatelist
+        """
+        query = '''
+            SELECT plex_id, item_type, method, view_name, view_id, title,
+                media_type, priority
+            FROM journal
+        '''
+        self.plexcursor.execute(query)
+        return [{'itemId': row[0],
+                 'itemType': row[1],
+                 'method': row[2],
+                 'viewName': row[3],
+                 'viewId': row[4],
+                 'title': row[5],
+                 'mediaType': row[6],
+                 'priority': row[7]} for row in self.plexcursor.fetchall()]
+
     def get_missing_fanart(self):
         """
         Returns a list of {'plex_id': x, 'plex_type': y} where fanart_synced
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory registry of PKC's state within the service's Python instance.
+
+Every utils.window() call means a round trip to Kodi via
+xbmcgui.Window.getProperty plus encoding/decoding strings. For the
+properties registered in PROPERTIES, the service keeps the values in memory
+instead - both as the raw string and parsed to their type, e.g. a bool for
+'true'. Window properties are only written if other Python instances (e.g.
+default.py) need them; properties other Python instances may set are
+re-read with every utils.threads_tick().
+
+utils.window() uses this registry for all PROPERTIES automatically. On hot
+paths, use get() to obtain the typed value directly; get_raw() and set_raw()
+work with the strings. Use subscribe() to get notified of changes.
+
+Outside of the service (activate() never called), everything is read from
+and written to the window properties directly.
+"""
+import logging
+from threading import Lock
+
+import xbmcgui
+
+import variables as v
+
+###############################################################################
+
+log = logging.getLogger("PLEX."+__name__)
+
+WINDOW = xbmcgui.Window(10000)
+
+###############################################################################
+
+
+class Property(object):
+    """
+    typus:      type of the parsed value; bool for 'true', int or unicode
+    mirror:     set the window property as well - other Python instances
+                need to read it
+    external:   other Python instances might set the window property
+    """
+    def __init__(self, typus=unicode, mirror=True, external=False):
+        self.typus = typus
+        self.mirror = mirror
+        self.external = external
+
+    def parse(self, raw):
+        if self.typus is bool:
+            return raw == 'true'
+        elif self.typus is int:
+            try:
+                return int(raw)
+            except ValueError:
+                return 0
+        return raw
+
+
+PROPERTIES = {
+    # Stop, suspend or wake up threads
+    'plex_terminateNow': Property(bool, external=True),
+    'suspend_LibraryThread': Property(bool, external=True),
+    'plex_shouldStop': Property(bool, external=True),
+    'plex_serverStatus': Property(external=True),
+    'plex_dbScan': Property(bool, external=True),
+    'plex_runLibScan': Property(external=True),
+    'plex_play_new_item': Property(external=True),
+    # Only set by the service
+    'plex_logLevel': Property(int),
+    'plex_initialScan': Property(bool, mirror=False),
+    'dbSyncIndicator': Property(bool),
+    'useDirectPaths': Property(bool),
+    'plex_force_transcode_pix': Property(bool),
+    'remapSMB': Property(bool),
+    'replaceSMB': Property(bool),
+    # validatePlayurl() might run in another Python instance
+    'plex_pathverified': Property(bool, external=True)
+}
+for typus in frozenset(v.REMAP_TYPE_FROM_PLEXTYPE.values()):
+    for arg in ('Org', 'New'):
+        PROPERTIES['remapSMB%s%s' % (typus, arg)] = Property()
+
+# True once the service called activate()
+ACTIVE = False
+_RAW = {}
+_VALUES = {}
+_LISTENERS = {}
+_LOCK = Lock()
+
+###############################################################################
+
+
+def _read(name):
+    return WINDOW.getProperty(name).decode('utf-8')
+
+
+def _write(name, raw):
+    if raw:
+        WINDOW.setProperty(name, raw.encode('utf-8'))
+    else:
+        WINDOW.clearProperty(name)
+
+
+def _update(name, raw):
+    """
+    Caches raw and tells the listeners if the value changed
+    """
+    with _LOCK:
+        if name in _RAW and _RAW[name] == raw:
+            return
+        _RAW[name] = raw
+        value = _VALUES[name] = PROPERTIES[name].parse(raw)
+        listeners = list(_LISTENERS.get(name, ()))
+    for listener in listeners:
+        listener(name, value)
+
+
+def activate():
+    """
+    Call once from the service, before any of its threads start. From now
+    on, all PROPERTIES are cached
+    """
+    global ACTIVE
+    for name in PROPERTIES:
+        _update(name, _read(name))
+    ACTIVE = True
+    log.debug('State registry active for %s properties' % len(PROPERTIES))
+
+
+def get(name):
+    """
+    Returns the parsed value of the property name, e.g. a bool
+    """
+    if ACTIVE:
+        return _VALUES[name]
+    return PROPERTIES[name].parse(_read(name))
+
+
+def get_raw(name):
+    """
+    Returns the value of the property name as unicode, just like
+    utils.window(name)
+    """
+    if ACTIVE and name in PROPERTIES:
+        return _RAW[name]
+    return _read(name)
+
+
+def set_raw(name, raw):
+    """
+    Sets the property name to raw (string or unicode). Pass '' to clear
+    """
+    if isinstance(raw, str):
+        raw = raw.decode('utf-8')
+    elif not isinstance(raw, unicode):
+        raw = unicode(raw)
+    if not ACTIVE:
+        _write(name, raw)
+        for listener in list(_LISTENERS.get(name, ())):
+            listener(name, PROPERTIES[name].parse(raw))
+        return
+    if PROPERTIES[name].mirror:
+        _write(name, raw)
+    _update(name, raw)
+
+
+def refresh():
+    """
+    Re-reads all properties that other Python instances might have changed
+    """
+    if not ACTIVE:
+        return
+    for name, prop in PROPERTIES.iteritems():
+        if prop.external:
+            _update(name, _read(name))
+
+
+def subscribe(name, listener):
+    """
+    listener(name, value) is called whenever the property name changes
+    """
+    with _LOCK:
+        _LISTENERS.setdefault(name, []).append(listener)
@@ -8,12 +8,14 @@ from pstats import Stats
 from sqlite3 import connect, OperationalError
 from datetime import datetime, timedelta
 from StringIO import StringIO
-from time import localtime, strftime, strptime
+from time import localtime, strftime, strptime, time
 from unicodedata import normalize
 import xml.etree.ElementTree as etree
 from functools import wraps
 from calendar import timegm
 from os import path as os_path
+from threading import Event, Lock, Thread
+from Queue import Empty
 
 import xbmc
 import xbmcaddon
@@ -22,6 +24,7 @@ import xbmcvfs
 
 from variables import DB_VIDEO_PATH, DB_MUSIC_PATH, DB_TEXTURE_PATH, \
     DB_PLEX_PATH
+import state
 
 ###############################################################################
 
@@ -30,6 +33,33 @@ log = logging.getLogger("PLEX."+__name__)
 WINDOW = xbmcgui.Window(10000)
 ADDON = xbmcaddon.Addon(id='plugin.video.plexkodiconnect')
 
+# Window properties that stop, suspend or wake up our threads. Any change
+# - by us or another Python instance, e.g. default.py - wakes up all threads
+# waiting with @ThreadMethods' waitQueue() or waitStopped()
+THREAD_PROPERTIES = ('plex_terminateNow', 'suspend_LibraryThread',
+                     'plex_shouldStop', 'plex_serverStatus', 'plex_dbScan',
+                     'plex_runLibScan', 'plex_play_new_item')
+# Put into a queue to wake up the thread waiting for it with waitQueue()
+THREAD_SENTINEL = object()
+# Threads waiting right now: {thread: time to wake it up or None}
+_WAITING = {}
+_WAITING_LOCK = Lock()
+# True once service.py calls threads_tick() regularly
+_TICKING = False
+# Seconds between two threads_tick() calls of ThreadTicker
+TICK_SECONDS = 0.05
+
+# Cache of our addon settings {setting: unicode value}. Within the service,
+# reload_settings() is called whenever Kodi tells us the settings changed.
+# Other, short-lived Python instances re-read settings after SETTINGS_TTL
+# seconds
+SETTINGS_TTL = 5.0
+_SETTINGS = {}
+_SETTINGS_LOCK = Lock()
+# xbmcaddon.Addon() instance the cache was loaded from and when
+_SETTINGS_ADDON = None
+_SETTINGS_LOADED = 0.0
+
 ###############################################################################
 # Main methods
 
@@ -44,6 +74,15 @@ def window(property, value=None, clear=False, windowid=10000):
     """
     if windowid != 10000:
         win = xbmcgui.Window(windowid)
+    elif property in state.PROPERTIES:
+        # Cached in-memory, see state.py
+        if clear:
+            state.set_raw(property, '')
+        elif value is not None:
+            state.set_raw(property, value)
+        else:
+            return state.get_raw(property)
+        return
     else:
         win = WINDOW
 
@@ -55,6 +94,66 @@ def window(property, value=None, clear=False, windowid=10000):
         return tryDecode(win.getProperty(property))
 
 
+def wake_threads(due=None):
+    """
+    Wakes up all threads waiting with waitQueue() or waitStopped() - or,
+    if due is set, only those whose timeout passed before due
+    """
+    with _WAITING_LOCK:
+        threads = [thread for thread, deadline in _WAITING.iteritems()
+                   if due is None or (deadline is not None and
+                                      deadline <= due)]
+    for thread in threads:
+        thread.wakeUp()
+
+
+def threads_tick():
+    """
+    Call regularly, e.g. from service.py's main loop. Picks up window
+    properties changed by other Python instances (see state.refresh()) and
+    wakes up threads whose timeout passed.
+
+    This way, waiting threads do not need to poll at all: Python 2's timed
+    waits (Queue.get(timeout=...), Event.wait(timeout)) poll every 50ms.
+    Once called, keep calling it - the timeouts of our threads depend on it.
+    Use ThreadTicker so that service.py may block, e.g. on the PMS
+    """
+    global _TICKING
+    _TICKING = True
+    state.refresh()
+    wake_threads(due=time())
+
+
+class ThreadTicker(Thread):
+    """
+    Calls threads_tick() every TICK_SECONDS until stopTicking(), no matter
+    what the thread that started it is busy with
+    """
+    def __init__(self):
+        self._stopTicking = Event()
+        Thread.__init__(self, name='ThreadTicker')
+        self.setDaemon(True)
+
+    def stopTicking(self):
+        self._stopTicking.set()
+
+    def run(self):
+        while not self._stopTicking.is_set():
+            try:
+                threads_tick()
+            except Exception:
+                log.exception('threads_tick() failed')
+            self._stopTicking.wait(TICK_SECONDS)
+
+
+def _property_changed(name, value):
+    wake_threads()
+
+
+for _property in THREAD_PROPERTIES:
+    state.subscribe(_property, _property_changed)
+
+
 def pickl_window(property, value=None, clear=False, windowid=10000):
     """
     Get or set window property - thread safe! For use with Pickle
@@ -78,15 +177,71 @@ def settings(setting, value=None):
     Get or add addon setting. Returns unicode
 
     setting and value can either be unicode or string
+
+    Settings are cached, see reload_settings()
     """
-    # We need to instantiate every single time to read changed variables!
-    addon = xbmcaddon.Addon(id='plugin.video.plexkodiconnect')
+    global _SETTINGS_ADDON, _SETTINGS_LOADED
     if value is not None:
+        # We need a new instance to write changes of other instances!
+        addon = xbmcaddon.Addon(id='plugin.video.plexkodiconnect')
         # Takes string or unicode by default!
         addon.setSetting(tryEncode(setting), tryEncode(value))
-    else:
+        _SETTINGS[setting] = tryDecode(value)
+        return
+    if (not state.ACTIVE and
+            time() - _SETTINGS_LOADED > SETTINGS_TTL):
+        reload_settings()
+    try:
+        return _SETTINGS[setting]
+    except KeyError:
+        pass
+    with _SETTINGS_LOCK:
+        if _SETTINGS_ADDON is None:
+            # An Addon() instance does not see later changes - hence one
+            # per reload_settings()
+            _SETTINGS_ADDON = xbmcaddon.Addon(
+                id='plugin.video.plexkodiconnect')
+            _SETTINGS_LOADED = time()
         # Should return unicode by default, but just in case
-        return tryDecode(addon.getSetting(setting))
+        value = _SETTINGS[setting] = tryDecode(
+            _SETTINGS_ADDON.getSetting(setting))
+    return value
+
+
+def settings_bool(setting):
+    """
+    Returns True if the addon setting is 'true'
+    """
+    return settings(setting) == 'true'
+
+
+def settings_int(setting, default=0):
+    """
+    Returns the addon setting as an int or default if that's not possible
+    """
+    try:
+        return int(settings(setting))
+    except ValueError:
+        return default
+
+
+def reload_settings():
+    """
+    Empties the settings cache; settings are read again on their next use.
+    Called by SettingsMonitor if Kodi tells us the settings changed
+    """
+    global _SETTINGS_ADDON
+    with _SETTINGS_LOCK:
+        _SETTINGS.clear()
+        _SETTINGS_ADDON = None
+
+
+class SettingsMonitor(xbmc.Monitor):
+    """
+    xbmc.Monitor that keeps the settings cache up to date
+    """
+    def onSettingsChanged(self):
+        reload_settings()
 
 
 def language(stringid):
@@ -372,6 +527,8 @@ def reset():
             cursor.execute("DELETE FROM " + tablename)
     cursor.execute('DROP table IF EXISTS plex')
     cursor.execute('DROP table IF EXISTS view')
+    # Indices are gone with the tables - rerun all migrations on next start
+    cursor.execute('PRAGMA user_version = 0')
     connection.commit()
     cursor.close()
 
@@ -891,8 +1048,8 @@ def ThreadMethodsAdditionalStop(windowAttribute):
     def wrapper(cls):
         def threadStopped(self):
             return (self._threadStopped or
-                    (window('plex_terminateNow') == "true") or
-                    window(windowAttribute) == "true")
+                    state.get('plex_terminateNow') or
+                    state.get_raw(windowAttribute) == "true")
         cls.threadStopped = threadStopped
         return cls
     return wrapper
@@ -908,7 +1065,7 @@ def ThreadMethodsAdditionalSuspend(windowAttribute):
     def wrapper(cls):
         def threadSuspended(self):
             return (self._threadSuspended or
-                    window(windowAttribute) == 'true')
+                    state.get_raw(windowAttribute) == 'true')
         cls.threadSuspended = threadSuspended
         return cls
     return wrapper
@@ -926,6 +1083,19 @@ def ThreadMethods(cls):
     threadStopped():    returns True if thread is stopped (or should stop ;-))
                         ALSO stops if Kodi is exited
 
+    Instead of polling with xbmc.sleep(), use:
+    waitQueue(queue, timeout=None)
+                        blocks until queue has an item and returns it.
+                        Returns None if woken up or after timeout seconds
+    waitStopped(timeout=None)
+                        blocks until woken up or for timeout seconds.
+                        Returns threadStopped()
+    waitResumed():      blocks while the thread is suspended. Returns False
+                        if the thread should stop
+    wakeUp():           wakes up the thread waiting. Done automatically on
+                        stopThread(), suspendThread(), resumeThread() and
+                        if one of the utils.THREAD_PROPERTIES changes
+
     Also adds the following class attributes:
         _threadStopped
         _threadSuspended
@@ -933,18 +1103,23 @@ def ThreadMethods(cls):
     # Attach new attributes to class
     cls._threadStopped = False
     cls._threadSuspended = False
+    # Queue we're waiting for in waitQueue()
+    cls._waitingOn = None
 
     # Define new class methods and attach them to class
     def stopThread(self):
         self._threadStopped = True
+        self.wakeUp()
     cls.stopThread = stopThread
 
     def suspendThread(self):
         self._threadSuspended = True
+        self.wakeUp()
     cls.suspendThread = suspendThread
 
     def resumeThread(self):
         self._threadSuspended = False
+        self.wakeUp()
     cls.resumeThread = resumeThread
 
     def threadSuspended(self):
@@ -952,9 +1127,74 @@ def ThreadMethods(cls):
     cls.threadSuspended = threadSuspended
 
     def threadStopped(self):
-        return self._threadStopped or (window('plex_terminateNow') == 'true')
+        return (self._threadStopped or
+                state.get('plex_terminateNow'))
     cls.threadStopped = threadStopped
 
+    def _wakeupEvent(self):
+        # One Event per thread instance, created on first use
+        return self.__dict__.setdefault('_wakeup', Event())
+    cls._wakeupEvent = _wakeupEvent
+
+    def wakeUp(self):
+        with _WAITING_LOCK:
+            queue, self._waitingOn = self._waitingOn, None
+            self._wakeupEvent().set()
+        if queue is not None:
+            queue.put(THREAD_SENTINEL)
+    cls.wakeUp = wakeUp
+
+    def _register(self, timeout, queue=None):
+        with _WAITING_LOCK:
+            self._waitingOn = queue
+            _WAITING[self] = None if timeout is None else time() + timeout
+
+    def _unregister(self):
+        with _WAITING_LOCK:
+            self._waitingOn = None
+            _WAITING.pop(self, None)
+
+    def waitQueue(self, queue, timeout=None):
+        event = self._wakeupEvent()
+        _register(self, timeout, queue)
+        try:
+            if (event.is_set() or self.threadStopped() or
+                    self.threadSuspended()):
+                # Woken up before we even started waiting
+                return
+            # Blocking get without a timeout does not poll. threads_tick()
+            # wakes us up on timeout - if service.py is calling it
+            item = queue.get(timeout=None if _TICKING else timeout)
+        except Empty:
+            return
+        finally:
+            _unregister(self)
+            event.clear()
+        if item is THREAD_SENTINEL:
+            queue.task_done()
+            return
+        return item
+    cls.waitQueue = waitQueue
+
+    def waitStopped(self, timeout=None):
+        event = self._wakeupEvent()
+        _register(self, timeout)
+        try:
+            if not self.threadStopped():
+                event.wait(None if _TICKING else timeout)
+        finally:
+            _unregister(self)
+            event.clear()
+        return self.threadStopped()
+    cls.waitStopped = waitStopped
+
+    def waitResumed(self):
+        while self.threadSuspended():
+            if self.waitStopped():
+                return False
+        return not self.threadStopped()
+    cls.waitResumed = waitResumed
+
     # Return class to render this a decorator
     return cls
 
@@ -30,7 +30,8 @@ sys_path.append(_base_resource)
 
 ###############################################################################
 
-from utils import settings, window, language as lang, dialog
+from utils import settings, window, language as lang, dialog, \
+    SettingsMonitor, ThreadTicker
 from userclient import UserClient
 import initialsetup
 from kodimonitor import KodiMonitor
@@ -46,12 +47,13 @@ from monitor_kodi_play import Monitor_Kodi_Play
 from playback_starter import Playback_Starter
 from artwork import Image_Cache_Thread
 import variables as v
+import state
 
 ###############################################################################
 
 import loghandler
 
-loghandler.config()
+loghandler.config(asynchronous=True)
 log = logging.getLogger("PLEX.service")
 
 ###############################################################################
@@ -79,8 +81,10 @@ class Service():
 
     def __init__(self):
 
+        # From now on, keep PKC's state in memory for this Python instance
+        state.activate()
         logLevel = self.getLogLevel()
-        self.monitor = Monitor()
+        self.monitor = SettingsMonitor()
 
         window('plex_logLevel', value=str(logLevel))
         window('plex_kodiProfile',
@@ -138,6 +142,11 @@ class Service():
         monitor = self.monitor
         kodiProfile = v.KODI_PROFILE
 
+        # Keeps the timeouts of our threads going while we block below,
+        # e.g. on the PMS
+        ticker = ThreadTicker()
+        ticker.start()
+
         # Detect playback start early on
         self.monitor_kodi_play = Monitor_Kodi_Play(self)
         self.monitor_kodi_play.start()
@@ -333,6 +342,7 @@ class Service():
             downloadutils.DownloadUtils().stopSession()
         except:
             pass
+        ticker.stopTicking()
 
         log.warn("======== STOP %s ========" % v.ADDON_NAME)
 
@@ -345,3 +355,5 @@ if delay and Monitor().waitForAbort(delay):
     log.warn("Abort requested while waiting. PKC not started.")
 else:
     Service().ServiceEntryPoint()
+# Make sure every log record made it to Kodi's log
+loghandler.stop()
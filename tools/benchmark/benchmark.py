@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks PKC's library sync without Kodi and without a Plex Media Server.
+
+Starts fake_pms.py with a generated library, then runs
+LibrarySync.fullSync() against empty Kodi databases (kodi_schema.py) with
+the xbmc modules of stubs/. Every run happens in a fresh Python process with
+a fresh Kodi profile. Reported are the items synced per second, the requests
+to the PMS, the SQL statements per database and the peak RSS of the sync.
+
+    python2 tools/benchmark/benchmark.py --movies 2000 --shows 50 --runs 3
+
+PKC's dependencies that Kodi usually provides need to be installed, i.e.
+requests. Use --json to save the results, e.g. to compare releases
+"""
+from argparse import ArgumentParser
+from json import dump, dumps, load, loads
+from os import environ, times
+from os.path import abspath, dirname, join
+from resource import getrusage, RUSAGE_SELF
+from shutil import rmtree
+from subprocess import Popen, PIPE
+from tempfile import mkdtemp
+from threading import Lock
+from time import time
+from urllib2 import urlopen
+import sqlite3
+import sys
+
+import fake_pms
+import kodi_schema
+
+###############################################################################
+
+HERE = dirname(abspath(__file__))
+ROOT = abspath(join(HERE, '..', '..'))
+# Kodi Krypton's databases, see variables.py
+DATABASES = (
+    ('MyVideos107.db', kodi_schema.VIDEO),
+    ('MyMusic60.db', kodi_schema.MUSIC),
+    ('Textures13.db', kodi_schema.TEXTURE)
+)
+# Printed before the results of a run, see child()
+MARKER = 'PKC-BENCHMARK-RESULT '
+LABELS = {
+    'full': 'Full sync',
+    'resync': 'Second full sync, nothing changed'
+}
+
+###############################################################################
+
+
+class Statements(object):
+    """
+    Counts the SQL statements per database file of all connections that
+    utils.kodiSQL() opens. Use connect() instead of sqlite3.connect()
+    """
+    def __init__(self):
+        self.counts = {}
+        self.lock = Lock()
+
+    def add(self, database):
+        with self.lock:
+            self.counts[database] = self.counts.get(database, 0) + 1
+
+    def connect(self, path, **kwargs):
+        database = path.replace('\\', '/').rsplit('/', 1)[-1]
+        add = self.add
+
+        class Cursor(sqlite3.Cursor):
+            def execute(self, *args):
+                add(database)
+                return sqlite3.Cursor.execute(self, *args)
+
+            def executemany(self, *args):
+                add(database)
+                return sqlite3.Cursor.executemany(self, *args)
+
+        class Connection(sqlite3.Connection):
+            def cursor(self, factory=Cursor):
+                return sqlite3.Connection.cursor(self, factory)
+
+        return sqlite3.connect(path, factory=Connection, **kwargs)
+
+
+def pms_stats(server):
+    return load(urlopen('%s/benchmark/stats' % server))
+
+
+def settings(args, music=True):
+    """
+    Returns PKC's settings for a benchmark as a dict
+    """
+    return {
+        'syncThreadNumber': str(args.threads),
+        'metadataBatchSize': str(args.batch),
+        'limitindex': str(args.limitindex),
+        'enableMusic': 'true' if music else 'false',
+        'enableTextureCache': 'false',
+        'FanartTV': 'false',
+        'dbSyncIndicator': 'false',
+        'SyncInstallRunDone': 'true'
+    }
+
+
+def window_properties(server, log_level):
+    """
+    Returns the window properties of a signed-in PKC as a dict
+    """
+    return {
+        'pms_server': server,
+        'pms_token': 'benchmark',
+        'plex_machineIdentifier': fake_pms.MACHINE_IDENTIFIER,
+        'plex_servername': 'Fake PMS',
+        'currUserId': '1',
+        'plex_username': 'benchmark',
+        'plex_online': 'true',
+        'plex_authenticated': 'true',
+        'countError': '0',
+        'countUnauthorized': '0',
+        'plex_logLevel': str(log_level)
+    }
+
+
+def prepare(home, settings, window):
+    """
+    Points the xbmc modules of stubs/ to the Kodi profile home and applies
+    PKC's settings and window properties (dicts). Call before importing
+    anything of PKC
+    """
+    environ['PKC_BENCHMARK_HOME'] = home
+    sys.path[0:0] = [join(HERE, 'stubs'), join(ROOT, 'resources', 'lib')]
+    import xbmc
+    xbmc.LOG = open(join(home, 'kodi.log'), 'ab')
+    import xbmcaddon
+    xbmcaddon.SETTINGS.update(settings)
+    import xbmcgui
+    properties = xbmcgui.Window(10000)
+    for key, value in window.iteritems():
+        properties.setProperty(key, value)
+
+
+def child(config):
+    """
+    Sets up Kodi and PKC in this (fresh) Python process, then syncs. Returns
+    a list of results, one per sync
+    """
+    home = config['home']
+    prepare(home, config['settings'], config['window'])
+    for filename, statements in DATABASES:
+        kodi_schema.create(join(home, 'userdata', 'Database', filename),
+                           statements)
+
+    import utils
+    import state
+    import loghandler
+    statements = Statements()
+    utils.connect = statements.connect
+    state.activate()
+    loghandler.config(asynchronous=True)
+    from librarysync import LibrarySync
+
+    library = LibrarySync()
+    library.initializeDBs()
+    results = []
+    for sync in ['full'] + (['resync'] if config['resync'] else []):
+        statements.counts = {}
+        before = pms_stats(config['server'])
+        started, cpu = time(), sum(times()[:2])
+        success = library.fullSync()
+        seconds, cpu = time() - started, sum(times()[:2]) - cpu
+        after = pms_stats(config['server'])
+        conn = sqlite3.connect(join(home, 'userdata', 'Database', 'plex.db'))
+        items = conn.execute('SELECT COUNT(*) FROM plex').fetchone()[0]
+        conn.close()
+        requests = {}
+        for endpoint, number in after['requests'].iteritems():
+            number -= before['requests'].get(endpoint, 0)
+            if number:
+                requests[endpoint] = number
+        results.append({
+            'sync': sync,
+            'success': success,
+            'seconds': seconds,
+            'cpu_seconds': cpu,
+            'items': items,
+            'items_per_second': items / seconds,
+            'requests': requests,
+            'requests_total': sum(requests.itervalues()),
+            'bytes': after['bytes'] - before['bytes'],
+            'statements': dict(statements.counts),
+            'statements_total': sum(statements.counts.itervalues()),
+            # Kilobytes on Linux - and the peak of the whole process so far
+            'peak_rss_kb': getrusage(RUSAGE_SELF).ru_maxrss
+        })
+    loghandler.stop()
+    return results
+
+
+def start_pms(args):
+    """
+    Starts fake_pms.py in its own process - it should not compete with the
+    sync for the GIL. Returns the process and the server's url
+    """
+    command = [sys.executable, join(HERE, 'fake_pms.py'), '--port', '0']
+    for name in ('movies', 'shows', 'seasons', 'episodes', 'artists',
+                 'albums', 'tracks', 'watched', 'seed', 'latency'):
+        command += ['--%s' % name, str(getattr(args, name))]
+    process = Popen(command, stdout=PIPE)
+    port = int(process.stdout.readline())
+    return process, 'http://127.0.0.1:%s' % port
+
+
+def run(args, server):
+    """
+    Runs one benchmark in a child process and returns its results
+    """
+    home = mkdtemp(prefix='pkc-benchmark-')
+    config = {
+        'home': home,
+        'server': server,
+        'resync': args.resync,
+        'settings': settings(args, music=bool(args.artists)),
+        'window': window_properties(server, args.log_level)
+    }
+    process = Popen([sys.executable, abspath(__file__), '--child',
+                     dumps(config)], stdout=PIPE)
+    output = process.communicate()[0]
+    for line in output.splitlines():
+        if line.startswith(MARKER):
+            break
+    else:
+        # Keep the Kodi profile to look at the log
+        raise RuntimeError('Sync process failed with exit code %s, see %s'
+                           % (process.returncode, join(home, 'kodi.log')))
+    if args.keep:
+        sys.stderr.write('Kept the Kodi profile %s\n' % home)
+    else:
+        rmtree(home, ignore_errors=True)
+    return loads(line[len(MARKER):])
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def report(runs):
+    """
+    Returns the results of all runs as a human-readable table
+    """
+    lines = []
+    for i, sync in enumerate(runs[0]):
+        results = [run_[i] for run_ in runs]
+        lines.append('%s - median of %s run(s):'
+                     % (LABELS[sync['sync']], len(results)))
+        lines.append('    %-24s %s' % ('items', sync['items']))
+        for name, key, fmt in (('seconds', 'seconds', '%.2f'),
+                               ('CPU seconds', 'cpu_seconds', '%.2f'),
+                               ('items/sec', 'items_per_second', '%.1f'),
+                               ('PMS requests', 'requests_total', '%d'),
+                               ('PMS bytes', 'bytes', '%d'),
+                               ('SQL statements', 'statements_total', '%d'),
+                               ('peak RSS (KB)', 'peak_rss_kb', '%d')):
+            lines.append('    %-24s %s' % (
+                name, fmt % median([result[key] for result in results])))
+        for endpoint, number in sorted(sync['requests'].iteritems()):
+            lines.append('    %-24s %s' % ('  ' + endpoint, number))
+        for database, number in sorted(sync['statements'].iteritems()):
+            lines.append('    %-24s %s' % ('  ' + database, number))
+        if not all(result['success'] for result in results):
+            lines.append('    FAILED - see the log with --keep')
+    return '\n'.join(lines)
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--child':
+        results = child(loads(sys.argv[2]))
+        sys.stdout.write('%s%s\n' % (MARKER, dumps(results)))
+        sys.stdout.flush()
+        return
+    parser = ArgumentParser(description=__doc__.split('\n')[1])
+    fake_pms.add_arguments(parser)
+    parser.add_argument('--threads', type=int, default=10,
+                        help='setting syncThreadNumber')
+    parser.add_argument('--batch', type=int, default=50,
+                        help='setting metadataBatchSize')
+    parser.add_argument('--limitindex', type=int, default=200,
+                        help='setting limitindex')
+    parser.add_argument('--log-level', type=int, default=0,
+                        help="setting logLevel: 0, 1 or 2 (debug)")
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--resync', action='store_true',
+                        help='sync a second time, with nothing changed')
+    parser.add_argument('--json', metavar='FILE',
+                        help='save the results of all runs to FILE')
+    parser.add_argument('--keep', action='store_true',
+                        help="don't delete the Kodi profiles")
+    args = parser.parse_args()
+
+    process, server = start_pms(args)
+    try:
+        runs = [run(args, server) for _ in xrange(args.runs)]
+    finally:
+        process.terminate()
+        process.wait()
+    print(report(runs))
+    if args.json:
+        with open(args.json, 'wb') as f:
+            dump({'arguments': vars(args), 'runs': runs}, f, indent=2,
+                 sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,812 @@
+# -*- coding: utf-8 -*-
+"""
+A stand-in Plex Media Server that serves a generated library - for the sync
+benchmark. Run it on its own:
+
+    python fake_pms.py --movies 1000 --shows 20 --port 32400
+
+or use Library and serve() from Python. Supported are the requests that
+PKC's library sync sends:
+
+    /identity
+    /library/sections
+    /library/sections/<id>/all          type=, updatedAt>=, paging
+    /library/sections/<id>/allLeaves    updatedAt>=, lastViewedAt>=, paging
+    /library/sections/<id>/onDeck
+    /library/metadata/<id>[,<id>...]
+    /library/metadata/<id>/children
+
+/benchmark/stats returns the number of requests per endpoint as JSON. All
+other requests are answered with an empty MediaContainer, e.g. scrobbles.
+Everything is deterministic: the same arguments yield the same library
+"""
+from argparse import ArgumentParser
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from collections import OrderedDict
+from json import dumps
+from random import Random
+from re import compile as re_compile
+from SocketServer import ThreadingMixIn
+from sys import stdout
+from threading import Lock, Thread
+from time import sleep
+from urlparse import urlparse, parse_qs
+from xml.sax.saxutils import quoteattr
+
+###############################################################################
+
+MACHINE_IDENTIFIER = 'b3nchm4rkb3nchm4rkb3nchm4rkb3nchm4rk000'
+# Unix time of the oldest item; every item is added one second later
+EPOCH = 1400000000
+
+# PMS type numbers as used by type=
+TYPES = {
+    1: 'movie',
+    2: 'show',
+    3: 'season',
+    4: 'episode',
+    8: 'artist',
+    9: 'album',
+    10: 'track'
+}
+# Top-level type and leaf type of a section
+SECTIONS = {
+    'movie': ('movie', 'movie'),
+    'show': ('show', 'episode'),
+    'artist': ('artist', 'track')
+}
+TAGS = {
+    'movie': 'Video',
+    'episode': 'Video',
+    'show': 'Directory',
+    'season': 'Directory',
+    'artist': 'Directory',
+    'album': 'Directory',
+    'track': 'Track'
+}
+GENRES = ('Action', 'Adventure', 'Animation', 'Comedy', 'Crime',
+          'Documentary', 'Drama', 'Family', 'Fantasy', 'History', 'Horror',
+          'Music', 'Mystery', 'Romance', 'Science Fiction', 'Thriller',
+          'War', 'Western')
+MUSIC_GENRES = ('Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+                'Hip-Hop', 'Jazz', 'Metal', 'Pop', 'Reggae', 'Rock', 'Soul')
+COUNTRIES = ('USA', 'United Kingdom', 'France', 'Germany', 'Japan',
+             'Canada', 'Italy', 'Spain')
+STUDIOS = ('Paramount', 'Warner Bros.', 'Universal', 'Columbia', 'Lionsgate',
+           'HBO', 'BBC', 'Netflix')
+RATINGS = ('G', 'PG', 'PG-13', 'R', 'TV-14', 'TV-MA')
+# Size of the pools of people that are cast in movies and shows
+PEOPLE = 2000
+
+_LEAVES = re_compile(r'^/library/sections/(\d+)/(all|allLeaves|onDeck)$')
+_METADATA = re_compile(r'^/library/metadata/([\d,]+)(/children)?$')
+# Numeric path segments, e.g. /library/metadata/1,2,3
+_NUMBERS = re_compile(r'/[\d,]+(?=/|$)')
+
+###############################################################################
+
+
+def _attributes(attrib):
+    return ''.join(' %s=%s' % (name, quoteattr(unicode(value)))
+                   for name, value in attrib)
+
+
+def _element(tag, attrib, children=''):
+    if children:
+        return '<%s%s>%s</%s>' % (tag, _attributes(attrib), children, tag)
+    return '<%s%s/>' % (tag, _attributes(attrib))
+
+
+def _container(children, **attrib):
+    attrib = sorted(attrib.iteritems())
+    return (u'<?xml version="1.0" encoding="UTF-8"?>\n' +
+            _element('MediaContainer', attrib, ''.join(children))
+            ).encode('utf-8')
+
+
+class Item(object):
+    """
+    One PMS library item with the XML attributes attrib (list of tuples) and
+    the child elements children (unicode) that only the full metadata
+    contains
+    """
+    __slots__ = ('key', 'type', 'section', 'parent', 'children_', 'attrib',
+                 'children', 'updated', 'viewed')
+
+    def __init__(self, key, typus, section, parent):
+        self.key = key
+        self.type = typus
+        self.section = section
+        self.parent = parent
+        self.children_ = []
+        self.attrib = []
+        self.children = ''
+        self.updated = 0
+        self.viewed = 0
+
+    def summary(self):
+        return _element(TAGS[self.type], self.attrib)
+
+    def metadata(self):
+        return _element(TAGS[self.type], self.attrib, self.children)
+
+
+class Library(object):
+    """
+    A generated PMS library with a movie, a TV show and a music section.
+    seasons and episodes are per show, albums per artist and tracks per
+    album. A fraction watched of all movies, episodes and tracks has been
+    played
+    """
+    def __init__(self, movies=100, shows=10, seasons=3, episodes=10,
+                 artists=0, albums=3, tracks=10, watched=0.3, seed=1):
+        self.random = Random(seed)
+        self.watched = watched
+        self.items = {}
+        self.sections = OrderedDict()
+        self.next_key = 1
+        if movies:
+            section = self.add_section('movie', 'Movies')
+            for i in xrange(movies):
+                self.add_movie(section, i)
+        if shows:
+            section = self.add_section('show', 'TV Shows')
+            for i in xrange(shows):
+                show = self.add_show(section, i)
+                for j in xrange(1, seasons + 1):
+                    season = self.add_season(show, j)
+                    for k in xrange(1, episodes + 1):
+                        self.add_episode(season, k)
+                show.attrib.append(('leafCount', seasons * episodes))
+        if artists:
+            section = self.add_section('artist', 'Music')
+            for i in xrange(artists):
+                artist = self.add_artist(section, i)
+                for j in xrange(1, albums + 1):
+                    album = self.add_album(artist, j)
+                    for k in xrange(1, tracks + 1):
+                        self.add_track(album, k)
+        self.by_type = {}
+        for item in self.items.itervalues():
+            self.by_type.setdefault((item.section['key'], item.type),
+                                    []).append(item)
+        for items in self.by_type.itervalues():
+            items.sort(key=lambda item: int(item.key))
+
+    def __len__(self):
+        return len(self.items)
+
+    def count(self, typus):
+        return sum(1 for item in self.items.itervalues()
+                   if item.type == typus)
+
+    def add_section(self, typus, title):
+        key = str(len(self.sections) + 1)
+        self.sections[key] = section = {
+            'key': key,
+            'type': typus,
+            'title': title,
+            'uuid': 'b3nchm4rk-%s-%s' % (typus, key),
+            'agent': {
+                'movie': 'com.plexapp.agents.imdb',
+                'show': 'com.plexapp.agents.thetvdb',
+                'artist': 'com.plexapp.agents.lastfm'
+            }[typus],
+            'location': '/media/%s' % title.replace(' ', '')
+        }
+        return section
+
+    def new_item(self, typus, section, parent=None):
+        key = str(self.next_key)
+        self.next_key += 1
+        item = self.items[key] = Item(key, typus, section, parent)
+        item.updated = EPOCH + int(key) + 10
+        if parent is not None:
+            parent.children_.append(item)
+        return item
+
+    def people(self, tag, number, role=False):
+        children = []
+        for _ in xrange(number):
+            person = self.random.randrange(PEOPLE)
+            attrib = [('id', person + 1), ('tag', u'%s Person %s'
+                                           % (tag, person))]
+            if role:
+                attrib.append(('role', u'Character %s' % person))
+                attrib.append(('thumb', 'http://image.example.com/people/'
+                                        '%s.jpg' % person))
+            children.append(_element(tag, attrib))
+        return ''.join(children)
+
+    def tags(self, tag, choices, number):
+        return ''.join(
+            _element(tag, [('tag', choice)])
+            for choice in self.random.sample(choices, number))
+
+    def userdata(self, item, duration):
+        """
+        Returns the attributes for the playstate of the leaf item
+        """
+        if self.random.random() >= self.watched:
+            if self.random.random() < 0.1:
+                return [('viewOffset', duration // 3)]
+            return []
+        item.viewed = item.updated + 1000
+        return [('viewCount', self.random.randint(1, 3)),
+                ('lastViewedAt', item.viewed)]
+
+    def video_media(self, item, path, duration, height):
+        width = height * 16 // 9
+        streams = (
+            _element('Stream', [('id', int(item.key) * 10 + 1),
+                                ('streamType', 1),
+                                ('codec', 'h264'),
+                                ('index', 0),
+                                ('bitrate', 8000),
+                                ('height', height),
+                                ('width', width),
+                                ('frameRate', '23.976')]) +
+            _element('Stream', [('id', int(item.key) * 10 + 2),
+                                ('streamType', 2),
+                                ('selected', 1),
+                                ('codec', 'ac3'),
+                                ('index', 1),
+                                ('channels', 6),
+                                ('bitrate', 640),
+                                ('language', 'English'),
+                                ('languageCode', 'eng')]) +
+            _element('Stream', [('id', int(item.key) * 10 + 3),
+                                ('streamType', 3),
+                                ('codec', 'srt'),
+                                ('index', 2),
+                                ('language', 'Deutsch'),
+                                ('languageCode', 'ger')]))
+        part = _element('Part', [('id', item.key),
+                                 ('key', '/library/parts/%s/file.mkv'
+                                         % item.key),
+                                 ('duration', duration),
+                                 ('file', path),
+                                 ('size', duration * 1000),
+                                 ('container', 'mkv')],
+                        streams)
+        return _element('Media', [('id', item.key),
+                                  ('duration', duration),
+                                  ('bitrate', 8640),
+                                  ('width', width),
+                                  ('height', height),
+                                  ('aspectRatio', '1.78'),
+                                  ('audioChannels', 6),
+                                  ('audioCodec', 'ac3'),
+                                  ('videoCodec', 'h264'),
+                                  ('videoResolution', height),
+                                  ('container', 'mkv'),
+                                  ('videoFrameRate', '24p')],
+                        part)
+
+    def art(self, item):
+        return [('thumb', '/library/metadata/%s/thumb/%s'
+                          % (item.key, item.updated)),
+                ('art', '/library/metadata/%s/art/%s'
+                        % (item.key, item.updated))]
+
+    def add_movie(self, section, i):
+        item = self.new_item('movie', section)
+        title = u'Movie %s' % i
+        year = 1950 + i % 70
+        duration = self.random.randint(80, 180) * 60000
+        item.attrib = [
+            ('ratingKey', item.key),
+            ('key', '/library/metadata/%s' % item.key),
+            ('guid', 'com.plexapp.agents.imdb://tt%07d?lang=en' % (i + 1)),
+            ('librarySectionID', section['key']),
+            ('studio', self.random.choice(STUDIOS)),
+            ('type', 'movie'),
+            ('title', title),
+            ('contentRating', self.random.choice(RATINGS)),
+            ('summary', u'The plot of %s. ' % title * 8),
+            ('rating', '%.1f' % self.random.uniform(1, 10)),
+            ('year', year),
+            ('tagline', u'The tagline of %s' % title),
+            ('duration', duration),
+            ('originallyAvailableAt', '%s-06-15' % year),
+            ('addedAt', EPOCH + int(item.key)),
+            ('updatedAt', item.updated)
+        ] + self.art(item) + self.userdata(item, duration)
+        children = [
+            self.video_media(item, u'%s/%s (%s)/%s.mkv'
+                             % (section['location'], title, year, title),
+                             duration, 1080),
+            self.tags('Genre', GENRES, 2),
+            self.people('Director', 1),
+            self.people('Writer', 2),
+            self.tags('Country', COUNTRIES, 1),
+            self.people('Role', 8, role=True)
+        ]
+        if i % 10 == 0:
+            children.append(_element('Collection', [
+                ('tag', u'Collection %s' % (i // 50))]))
+        if i % 3 == 0:
+            extra = _element('Video', [
+                ('ratingKey', 'x%s' % item.key),
+                ('key', '/library/metadata/x%s' % item.key),
+                ('type', 'clip'),
+                ('title', u'Trailer of %s' % title),
+                ('extraType', 1),
+                ('duration', 150000),
+                ('year', year),
+                ('thumb', 'http://image.example.com/extras/%s.jpg'
+                          % item.key),
+                ('originallyAvailableAt', '%s-01-01' % year)])
+            children.append(_element('Extras', [('size', 1)], extra))
+        item.children = ''.join(children)
+
+    def add_show(self, section, i):
+        item = self.new_item('show', section)
+        title = u'Show %s' % i
+        year = 1990 + i % 30
+        item.attrib = [
+            ('ratingKey', item.key),
+            ('key', '/library/metadata/%s/children' % item.key),
+            ('guid', 'com.plexapp.agents.thetvdb://%s?lang=en'
+                     % (70000 + i)),
+            ('librarySectionID', section['key']),
+            ('studio', self.random.choice(STUDIOS)),
+            ('type', 'show'),
+            ('title', title),
+            ('contentRating', self.random.choice(RATINGS)),
+            ('summary', u'What %s is about. ' % title * 8),
+            ('index', 1),
+            ('rating', '%.1f' % self.random.uniform(1, 10)),
+            ('year', year),
+            ('banner', '/library/metadata/%s/banner/%s'
+                       % (item.key, item.updated)),
+            ('duration', 2700000),
+            ('originallyAvailableAt', '%s-09-01' % year),
+            ('addedAt', EPOCH + int(item.key)),
+            ('updatedAt', item.updated)
+        ] + self.art(item)
+        item.children = ''.join((
+            self.tags('Genre', GENRES, 2),
+            self.people('Role', 8, role=True),
+            _element('Location', [('path', u'%s/%s'
+                                           % (section['location'], title))])))
+        return item
+
+    def add_season(self, show, index):
+        item = self.new_item('season', show.section, show)
+        item.attrib = [
+            ('ratingKey', item.key),
+            ('key', '/library/metadata/%s/children' % item.key),
+            ('parentRatingKey', show.key),
+            ('guid', 'com.plexapp.agents.thetvdb://%s/%s?lang=en'
+                     % (show.key, index)),
+            ('librarySectionID', show.section['key']),
+            ('type', 'season'),
+            ('title', u'Season %s' % index),
+            ('parentKey', '/library/metadata/%s' % show.key),
+            ('parentTitle', dict(show.attrib)['title']),
+            ('summary', ''),
+            ('index', index),
+            ('parentThumb', '/library/metadata/%s/thumb/%s'
+                            % (show.key, show.updated)),
+            ('addedAt', EPOCH + int(item.key)),
+            ('updatedAt', item.updated)
+        ] + self.art(item)
+        return item
+
+    def add_episode(self, season, index):
+        show = season.parent
+        item = self.new_item('episode', show.section, season)
+        show_title = dict(show.attrib)['title']
+        season_index = dict(season.attrib)['index']
+        title = u'Episode %s' % index
+        duration = self.random.randint(20, 60) * 60000
+        year = dict(show.attrib)['year'] + season_index - 1
+        item.attrib = [
+            ('ratingKey', item.key),
+            ('key', '/library/metadata/%s' % item.key),
+            ('parentRatingKey', season.key),
+            ('grandparentRatingKey', show.key),
+            ('guid', 'com.plexapp.agents.thetvdb://%s/%s/%s?lang=en'
+                     % (show.key, season_index, index)),
+            ('librarySectionID', show.section['key']),
+            ('type', 'episode'),
+            ('title', title),
+            ('grandparentKey', '/library/metadata/%s' % show.key),
+            ('parentKey', '/library/metadata/%s' % season.key),
+            ('grandparentTitle', show_title),
+            ('parentTitle', u'Season %s' % season_index),
+            ('contentRating', dict(show.attrib)['contentRating']),
+            ('summary', u'What happens in %s. ' % title * 4),
+            ('index', index),
+            ('parentIndex', season_index),
+            ('rating', '%.1f' % self.random.uniform(1, 10)),
+            ('year', year),
+            ('thumb', '/library/metadata/%s/thumb/%s'
+                      % (item.key, item.updated)),
+            ('art', '/library/metadata/%s/art/%s'
+                    % (show.key, show.updated)),
+            ('parentThumb', '/library/metadata/%s/thumb/%s'
+                            % (season.key, season.updated)),
+            ('grandparentThumb', '/library/metadata/%s/thumb/%s'
+                                 % (show.key, show.updated)),
+            ('grandparentArt', '/library/metadata/%s/art/%s'
+                               % (show.key, show.updated)),
+            ('duration', duration),
+            ('originallyAvailableAt', '%s-%02d-%02d'
+                                      % (year, 1 + index // 28 % 12,
+                                         1 + index % 28)),
+            ('addedAt', EPOCH + int(item.key)),
+            ('updatedAt', item.updated)
+        ] + self.userdata(item, duration)
+        item.children = ''.join((
+            self.video_media(item, u'%s/%s/Season %02d/%s - S%02dE%02d.mkv'
+                             % (show.section['location'], show_title,
+                                season_index, show_title, season_index,
+                                index),
+                             duration, 720),
+            self.people('Director', 1),
+            self.people('Writer', 1)))
+
+    def add_artist(self, section, i):
+        item = self.new_item('artist', section)
+        title = u'Artist %s' % i
+        item.attrib = [
+            ('ratingKey', item.key),
+            ('key', '/library/metadata/%s/children' % item.key),
+            ('guid', 'com.plexapp.agents.lastfm://Artist%%20%s?lang=en' % i),
+            ('librarySectionID', section['key']),
+            ('type', 'artist'),
+            ('title', title),
+            ('summary', u'The biography of %s. ' % title * 8),
+            ('index', 1),
+            ('addedAt', EPOCH + int(item.key)),
+            ('updatedAt', item.updated)
+        ] + self.art(item)
+        item.children = ''.join((
+            self.tags('Genre', MUSIC_GENRES, 2),
+            self.tags('Country', COUNTRIES, 1)))
+        return item
+
+    def add_album(self, artist, index):
+        item = self.new_item('album', artist.section, artist)
+        artist_title = dict(artist.attrib)['title']
+        title = u'Album %s' % index
+        year = 1960 + int(item.key) % 60
+        item.attrib = [
+            ('ratingKey', item.key),
+            ('key', '/library/metadata/%s/children' % item.key),
+            ('parentRatingKey', artist.key),
+            ('guid', 'com.plexapp.agents.lastfm://%s/%s?lang=en'
+                     % (artist_title.replace(' ', '%20'),
+                        title.replace(' ', '%20'))),
+            ('librarySectionID', artist.section['key']),
+            ('type', 'album'),
+            ('title', title),
+            ('parentKey', '/library/metadata/%s' % artist.key),
+            ('parentTitle', artist_title),
+            ('summary', u'The story of %s. ' % title * 4),
+            ('index', 1),
+            ('year', year),
+            ('thumb', '/library/metadata/%s/thumb/%s'
+                      % (item.key, item.updated)),
+            ('parentThumb', '/library/metadata/%s/thumb/%s'
+                            % (artist.key, artist.updated)),
+            ('originallyAvailableAt', '%s-03-01' % year),
+            ('addedAt', EPOCH + int(item.key)),
+            ('updatedAt', item.updated)
+        ]
+        item.children = self.tags('Genre', MUSIC_GENRES, 1)
+        return item
+
+    def add_track(self, album, index):
+        artist = album.parent
+        item = self.new_item('track', album.section, album)
+        artist_title = dict(artist.attrib)['title']
+        album_title = dict(album.attrib)['title']
+        title = u'Track %s' % index
+        duration = self.random.randint(120, 420) * 1000
+        path = u'%s/%s/%s/%02d %s.mp3' % (album.section['location'],
+                                          artist_title, album_title, index,
+                                          title)
+        item.attrib = [
+            ('ratingKey', item.key),
+            ('key', '/library/metadata/%s' % item.key),
+            ('parentRatingKey', album.key),
+            ('grandparentRatingKey', artist.key),
+            ('guid', 'com.plexapp.agents.lastfm://%s/%s/%s?lang=en'
+                     % (artist_title.replace(' ', '%20'),
+                        album_title.replace(' ', '%20'), index)),
+            ('librarySectionID', album.section['key']),
+            ('type', 'track'),
+            ('title', title),
+            ('grandparentKey', '/library/metadata/%s' % artist.key),
+            ('parentKey', '/library/metadata/%s' % album.key),
+            ('grandparentTitle', artist_title),
+            ('parentTitle', album_title),
+            ('summary', ''),
+            ('index', index),
+            ('parentIndex', 1),
+            ('year', dict(album.attrib)['year']),
+            ('parentThumb', '/library/metadata/%s/thumb/%s'
+                            % (album.key, album.updated)),
+            ('grandparentThumb', '/library/metadata/%s/thumb/%s'
+                                 % (artist.key, artist.updated)),
+            ('duration', duration),
+            ('addedAt', EPOCH + int(item.key)),
+            ('updatedAt', item.updated)
+        ] + self.userdata(item, duration)
+        part = _element('Part', [('id', item.key),
+                                 ('key', '/library/parts/%s/file.mp3'
+                                         % item.key),
+                                 ('duration', duration),
+                                 ('file', path),
+                                 ('size', duration * 40),
+                                 ('container', 'mp3')],
+                        _element('Stream', [('id', int(item.key) * 10),
+                                            ('streamType', 2),
+                                            ('selected', 1),
+                                            ('codec', 'mp3'),
+                                            ('index', 0),
+                                            ('channels', 2),
+                                            ('bitrate', 320),
+                                            ('samplingRate', 44100)]))
+        item.children = _element('Media', [('id', item.key),
+                                           ('duration', duration),
+                                           ('bitrate', 320),
+                                           ('audioChannels', 2),
+                                           ('audioCodec', 'mp3'),
+                                           ('container', 'mp3')],
+                                 part)
+
+    # Responses ###############################################################
+
+    def identity(self):
+        return _container((), size=0,
+                          machineIdentifier=MACHINE_IDENTIFIER,
+                          version='1.9.4.4325')
+
+    def section_list(self):
+        children = []
+        for section in self.sections.itervalues():
+            children.append(_element('Directory', [
+                ('allowSync', 1),
+                ('art', '/:/resources/%s-fanart.jpg' % section['type']),
+                ('key', section['key']),
+                ('type', section['type']),
+                ('title', section['title']),
+                ('agent', section['agent']),
+                ('scanner', 'Plex Scanner'),
+                ('language', 'en'),
+                ('uuid', section['uuid']),
+                ('updatedAt', EPOCH),
+                ('createdAt', EPOCH)
+            ], _element('Location', [('id', section['key']),
+                                     ('path', section['location'])])))
+        return _container(children, size=len(children), allowSync=0,
+                          identifier='com.plexapp.plugins.library',
+                          title1='Plex Library')
+
+    def listing(self, key, what, args):
+        """
+        Answers /library/sections/<key>/<what>
+        """
+        section = self.sections.get(key)
+        if section is None:
+            return None
+        if what == 'onDeck':
+            items = []
+        elif what == 'allLeaves':
+            items = self.by_type.get((key, SECTIONS[section['type']][1]), [])
+        else:
+            try:
+                typus = TYPES[int(args['type'][0])]
+            except (KeyError, ValueError):
+                typus = SECTIONS[section['type']][0]
+            items = self.by_type.get((key, typus), [])
+        if 'updatedAt>' in args:
+            since = int(args['updatedAt>'][0])
+            items = [item for item in items if item.updated >= since]
+        if 'lastViewedAt>' in args:
+            since = int(args['lastViewedAt>'][0])
+            items = [item for item in items if item.viewed >= since]
+        total = len(items)
+        start = int(args.get('X-Plex-Container-Start', ['0'])[0])
+        if 'X-Plex-Container-Size' in args:
+            items = items[start:
+                          start + int(args['X-Plex-Container-Size'][0])]
+        else:
+            items = items[start:]
+        return _container((item.summary() for item in items),
+                          size=len(items),
+                          totalSize=total,
+                          offset=start,
+                          allowSync=1,
+                          librarySectionID=key,
+                          librarySectionTitle=section['title'],
+                          librarySectionUUID=section['uuid'],
+                          identifier='com.plexapp.plugins.library',
+                          mediaTagPrefix='/system/bundle/media/flags/',
+                          mediaTagVersion=EPOCH)
+
+    def metadata(self, keys):
+        items = [self.items[key] for key in keys if key in self.items]
+        if not items:
+            return None
+        section = items[0].section
+        return _container((item.metadata() for item in items),
+                          size=len(items),
+                          allowSync=1,
+                          librarySectionID=section['key'],
+                          librarySectionTitle=section['title'],
+                          librarySectionUUID=section['uuid'],
+                          identifier='com.plexapp.plugins.library',
+                          mediaTagPrefix='/system/bundle/media/flags/',
+                          mediaTagVersion=EPOCH)
+
+    def children(self, key, args):
+        parent = self.items.get(key)
+        if parent is None:
+            return None
+        items = parent.children_
+        total = len(items)
+        start = int(args.get('X-Plex-Container-Start', ['0'])[0])
+        if 'X-Plex-Container-Size' in args:
+            items = items[start:
+                          start + int(args['X-Plex-Container-Size'][0])]
+        else:
+            items = items[start:]
+        return _container((item.summary() for item in items),
+                          size=len(items),
+                          totalSize=total,
+                          offset=start,
+                          key=key,
+                          parentTitle=dict(parent.attrib)['title'],
+                          librarySectionID=parent.section['key'],
+                          librarySectionUUID=parent.section['uuid'],
+                          identifier='com.plexapp.plugins.library')
+
+    def respond(self, path, args):
+        """
+        Returns the body for the request path (with the parsed query args)
+        or None for a 404
+        """
+        if path in ('/', '/identity'):
+            return self.identity()
+        if path == '/library/sections':
+            return self.section_list()
+        match = _LEAVES.match(path)
+        if match:
+            return self.listing(match.group(1), match.group(2), args)
+        match = _METADATA.match(path)
+        if match:
+            if match.group(2):
+                return self.children(match.group(1), args)
+            return self.metadata(match.group(1).split(','))
+        if path.startswith('/library/'):
+            return None
+        # E.g. scrobbles
+        return _container((), size=0)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        server = self.server
+        if url.path == '/benchmark/stats':
+            body = dumps(server.stats())
+        else:
+            if server.latency:
+                sleep(server.latency)
+            body = server.library.respond(
+                url.path, parse_qs(url.query, keep_blank_values=True))
+            server.record(url.path, body)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_PUT = do_POST = do_DELETE = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    """
+    Serves library with an artificial latency (in seconds) per request
+    """
+    daemon_threads = True
+    request_queue_size = 64
+
+    def __init__(self, library, port=0, latency=0.0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), Handler)
+        self.library = library
+        self.latency = latency
+        self.requests = {}
+        self.bytes = 0
+        self.lock = Lock()
+
+    def record(self, path, body):
+        endpoint = _NUMBERS.sub('/#', path)
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.bytes += len(body or '')
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'total': sum(self.requests.itervalues()),
+                'bytes': self.bytes
+            }
+
+
+def serve(library, port=0, latency=0.0):
+    """
+    Starts serving library in a daemon thread. Returns the Server; its port
+    is server.server_port
+    """
+    server = Server(library, port, latency)
+    thread = Thread(target=server.serve_forever, name='Fake PMS')
+    thread.setDaemon(True)
+    thread.start()
+    return server
+
+
+def add_arguments(parser):
+    """
+    Adds the arguments describing the library to the ArgumentParser parser
+    """
+    parser.add_argument('--movies', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=20)
+    parser.add_argument('--seasons', type=int, default=3,
+                        help='per show')
+    parser.add_argument('--episodes', type=int, default=10,
+                        help='per season')
+    parser.add_argument('--artists', type=int, default=20)
+    parser.add_argument('--albums', type=int, default=3,
+                        help='per artist')
+    parser.add_argument('--tracks', type=int, default=10,
+                        help='per album')
+    parser.add_argument('--watched', type=float, default=0.3,
+                        help='fraction of played items')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds to wait before answering a request')
+
+
+def library_from(args):
+    return Library(movies=args.movies, shows=args.shows,
+                   seasons=args.seasons, episodes=args.episodes,
+                   artists=args.artists, albums=args.albums,
+                   tracks=args.tracks, watched=args.watched, seed=args.seed)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    add_arguments(parser)
+    parser.add_argument('--port', type=int, default=32400)
+    args = parser.parse_args()
+    library = library_from(args)
+    server = Server(library, args.port, args.latency)
+    # The benchmark reads the port from the very first line
+    stdout.write('%s\n' % server.server_port)
+    stdout.write('Serving %s items\n' % len(library))
+    stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
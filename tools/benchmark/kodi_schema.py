@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Empty Kodi Krypton (17) databases: MyVideos107.db, MyMusic60.db and
+Textures13.db. The tables, views and indices follow Kodi's own
+CreateTables() and CreateAnalytics(), trimmed to what PKC touches
+"""
+from sqlite3 import connect
+
+###############################################################################
+
+# The columns c00 to c23 of movie, tvshow, episode and musicvideo
+_COLUMNS = ', '.join('c%02d TEXT' % i for i in range(24))
+
+VIDEO = (
+    'CREATE TABLE version (idVersion INTEGER, iCompressCount INTEGER)',
+    'INSERT INTO version (idVersion, iCompressCount) VALUES (107, 0)',
+    'CREATE TABLE bookmark (idBookmark INTEGER PRIMARY KEY, idFile INTEGER, '
+    'timeInSeconds DOUBLE, totalTimeInSeconds DOUBLE, thumbNailImage TEXT, '
+    'player TEXT, playerState TEXT, type INTEGER)',
+    'CREATE TABLE settings (idFile INTEGER, Deinterlace BOOL, '
+    'ViewMode INTEGER, ZoomAmount FLOAT, PixelRatio FLOAT, '
+    'VerticalShift FLOAT, AudioStream INTEGER, SubtitleStream INTEGER, '
+    'SubtitleDelay FLOAT, SubtitlesOn BOOL, Brightness FLOAT, '
+    'Contrast FLOAT, Gamma FLOAT, VolumeAmplification FLOAT, '
+    'AudioDelay FLOAT, ResumeTime INTEGER, Sharpness FLOAT, '
+    'NoiseReduction FLOAT, NonLinStretch BOOL, PostProcess BOOL, '
+    'ScalingMethod INTEGER, DeinterlaceMode INTEGER, StereoMode INTEGER, '
+    'StereoInvert BOOL, VideoStream INTEGER)',
+    'CREATE TABLE stacktimes (idFile INTEGER, times TEXT)',
+    'CREATE TABLE genre (genre_id INTEGER PRIMARY KEY, name TEXT)',
+    'CREATE TABLE genre_link (genre_id INTEGER, media_id INTEGER, '
+    'media_type TEXT)',
+    'CREATE TABLE country (country_id INTEGER PRIMARY KEY, name TEXT)',
+    'CREATE TABLE country_link (country_id INTEGER, media_id INTEGER, '
+    'media_type TEXT)',
+    'CREATE TABLE movie (idMovie INTEGER PRIMARY KEY, idFile INTEGER, '
+    + _COLUMNS + ', idSet INTEGER, userrating INTEGER, premiered TEXT)',
+    'CREATE TABLE actor (actor_id INTEGER PRIMARY KEY, name TEXT, '
+    'art_urls TEXT)',
+    'CREATE TABLE actor_link (actor_id INTEGER, media_id INTEGER, '
+    'media_type TEXT, role TEXT, cast_order INTEGER)',
+    'CREATE TABLE director_link (actor_id INTEGER, media_id INTEGER, '
+    'media_type TEXT)',
+    'CREATE TABLE writer_link (actor_id INTEGER, media_id INTEGER, '
+    'media_type TEXT)',
+    'CREATE TABLE path (idPath INTEGER PRIMARY KEY, strPath TEXT, '
+    'strContent TEXT, strScraper TEXT, strHash TEXT, '
+    'scanRecursive INTEGER, useFolderNames BOOL, strSettings TEXT, '
+    'noUpdate BOOL, exclude BOOL, dateAdded TEXT, idParentPath INTEGER)',
+    'CREATE TABLE files (idFile INTEGER PRIMARY KEY, idPath INTEGER, '
+    'strFilename TEXT, playCount INTEGER, lastPlayed TEXT, '
+    'dateAdded TEXT)',
+    'CREATE TABLE tvshow (idShow INTEGER PRIMARY KEY, ' + _COLUMNS + ', '
+    'userrating INTEGER, duration INTEGER)',
+    'CREATE TABLE episode (idEpisode INTEGER PRIMARY KEY, idFile INTEGER, '
+    + _COLUMNS + ', idShow INTEGER, userrating INTEGER, '
+    'idSeason INTEGER)',
+    'CREATE TABLE tvshowlinkpath (idShow INTEGER, idPath INTEGER)',
+    'CREATE TABLE movielinktvshow (idMovie INTEGER, IdShow INTEGER)',
+    'CREATE TABLE studio (studio_id INTEGER PRIMARY KEY, name TEXT)',
+    'CREATE TABLE studio_link (studio_id INTEGER, media_id INTEGER, '
+    'media_type TEXT)',
+    'CREATE TABLE musicvideo (idMVideo INTEGER PRIMARY KEY, '
+    'idFile INTEGER, ' + _COLUMNS + ', userrating INTEGER, premiered TEXT)',
+    'CREATE TABLE streamdetails (idFile INTEGER, iStreamType INTEGER, '
+    'strVideoCodec TEXT, fVideoAspect FLOAT, iVideoWidth INTEGER, '
+    'iVideoHeight INTEGER, strAudioCodec TEXT, iAudioChannels INTEGER, '
+    'strAudioLanguage TEXT, strSubtitleLanguage TEXT, '
+    'iVideoDuration INTEGER, strStereoMode TEXT, strVideoLanguage TEXT)',
+    'CREATE TABLE sets (idSet INTEGER PRIMARY KEY, strSet TEXT, '
+    'strOverview TEXT)',
+    'CREATE TABLE seasons (idSeason INTEGER PRIMARY KEY, idShow INTEGER, '
+    'season INTEGER, name TEXT, userrating INTEGER)',
+    'CREATE TABLE art (art_id INTEGER PRIMARY KEY, media_id INTEGER, '
+    'media_type TEXT, type TEXT, url TEXT)',
+    'CREATE TABLE tag (tag_id INTEGER PRIMARY KEY, name TEXT)',
+    'CREATE TABLE tag_link (tag_id INTEGER, media_id INTEGER, '
+    'media_type TEXT)',
+    'CREATE TABLE rating (rating_id INTEGER PRIMARY KEY, '
+    'media_id INTEGER, media_type TEXT, rating_type TEXT, rating FLOAT, '
+    'votes INTEGER)',
+    'CREATE TABLE uniqueid (uniqueid_id INTEGER PRIMARY KEY, '
+    'media_id INTEGER, media_type TEXT, value TEXT, type TEXT)',
+    'CREATE INDEX ix_bookmark ON bookmark (idFile, type)',
+    'CREATE UNIQUE INDEX ix_settings ON settings (idFile)',
+    'CREATE UNIQUE INDEX ix_stacktimes ON stacktimes (idFile)',
+    'CREATE INDEX ix_path ON path (strPath)',
+    'CREATE INDEX ix_path2 ON path (idParentPath)',
+    'CREATE INDEX ix_files ON files (idPath, strFilename)',
+    'CREATE UNIQUE INDEX ix_movie_file_1 ON movie (idFile, idMovie)',
+    'CREATE UNIQUE INDEX ix_movie_file_2 ON movie (idMovie, idFile)',
+    'CREATE UNIQUE INDEX ix_tvshowlinkpath_1 ON tvshowlinkpath '
+    '(idShow, idPath)',
+    'CREATE UNIQUE INDEX ix_tvshowlinkpath_2 ON tvshowlinkpath '
+    '(idPath, idShow)',
+    'CREATE UNIQUE INDEX ix_movielinktvshow_1 ON movielinktvshow '
+    '(idShow, idMovie)',
+    'CREATE UNIQUE INDEX ix_movielinktvshow_2 ON movielinktvshow '
+    '(idMovie, idShow)',
+    'CREATE UNIQUE INDEX ix_episode_file_1 ON episode (idEpisode, idFile)',
+    'CREATE UNIQUE INDEX id_episode_file_2 ON episode (idFile, idEpisode)',
+    'CREATE INDEX ix_episode_season_episode ON episode (c12, c13)',
+    'CREATE INDEX ix_episode_bookmark ON episode (c17)',
+    'CREATE INDEX ix_episode_show1 ON episode (idEpisode, idShow)',
+    'CREATE INDEX ix_episode_show2 ON episode (idShow, idEpisode)',
+    'CREATE UNIQUE INDEX ix_musicvideo_file_1 ON musicvideo '
+    '(idMVideo, idFile)',
+    'CREATE UNIQUE INDEX ix_musicvideo_file_2 ON musicvideo '
+    '(idFile, idMVideo)',
+    'CREATE INDEX ixMovieBasePath ON movie (c23)',
+    'CREATE INDEX ixMusicVideoBasePath ON musicvideo (c14)',
+    'CREATE INDEX ixEpisodeBasePath ON episode (c19)',
+    'CREATE INDEX ix_streamdetails ON streamdetails (idFile)',
+    'CREATE INDEX ix_seasons ON seasons (idShow, season)',
+    'CREATE INDEX ix_art ON art (media_id, media_type, type)',
+    'CREATE INDEX ix_rating ON rating (media_id, media_type)',
+    'CREATE INDEX ix_uniqueid1 ON uniqueid (media_id, media_type, type)',
+    'CREATE INDEX ix_uniqueid2 ON uniqueid (media_type, value)',
+    'CREATE UNIQUE INDEX ix_actor_1 ON actor (name)',
+    'CREATE UNIQUE INDEX ix_actor_link_1 ON actor_link '
+    '(actor_id, media_type, media_id, role)',
+    'CREATE INDEX ix_actor_link_2 ON actor_link '
+    '(media_id, media_type, actor_id)',
+    'CREATE UNIQUE INDEX ix_director_link_1 ON director_link '
+    '(actor_id, media_type, media_id)',
+    'CREATE INDEX ix_director_link_2 ON director_link '
+    '(media_id, media_type, actor_id)',
+    'CREATE UNIQUE INDEX ix_writer_link_1 ON writer_link '
+    '(actor_id, media_type, media_id)',
+    'CREATE INDEX ix_writer_link_2 ON writer_link '
+    '(media_id, media_type, actor_id)',
+    'CREATE UNIQUE INDEX ix_genre_1 ON genre (name)',
+    'CREATE UNIQUE INDEX ix_genre_link_1 ON genre_link '
+    '(genre_id, media_type, media_id)',
+    'CREATE INDEX ix_genre_link_2 ON genre_link '
+    '(media_id, media_type, genre_id)',
+    'CREATE UNIQUE INDEX ix_country_1 ON country (name)',
+    'CREATE UNIQUE INDEX ix_country_link_1 ON country_link '
+    '(country_id, media_type, media_id)',
+    'CREATE INDEX ix_country_link_2 ON country_link '
+    '(media_id, media_type, country_id)',
+    'CREATE UNIQUE INDEX ix_studio_1 ON studio (name)',
+    'CREATE UNIQUE INDEX ix_studio_link_1 ON studio_link '
+    '(studio_id, media_type, media_id)',
+    'CREATE INDEX ix_studio_link_2 ON studio_link '
+    '(media_id, media_type, studio_id)',
+    'CREATE UNIQUE INDEX ix_tag_1 ON tag (name)',
+    'CREATE UNIQUE INDEX ix_tag_link_1 ON tag_link '
+    '(tag_id, media_type, media_id)',
+    'CREATE INDEX ix_tag_link_2 ON tag_link (media_id, media_type, tag_id)',
+    'CREATE VIEW tvshowcounts AS SELECT tvshow.idShow AS idShow, '
+    'MAX(files.lastPlayed) AS lastPlayed, '
+    'NULLIF(COUNT(episode.c12), 0) AS totalCount, '
+    'COUNT(files.playCount) AS watchedcount, '
+    'NULLIF(COUNT(DISTINCT(episode.c12)), 0) AS totalSeasons, '
+    'MAX(files.dateAdded) AS dateAdded '
+    'FROM tvshow '
+    'LEFT JOIN episode ON episode.idShow = tvshow.idShow '
+    'LEFT JOIN files ON files.idFile = episode.idFile '
+    'GROUP BY tvshow.idShow'
+)
+
+MUSIC = (
+    'CREATE TABLE version (idVersion INTEGER, iCompressCount INTEGER)',
+    'INSERT INTO version (idVersion, iCompressCount) VALUES (60, 0)',
+    'CREATE TABLE artist (idArtist INTEGER PRIMARY KEY, strArtist TEXT, '
+    'strMusicBrainzArtistID TEXT, strBorn TEXT, strFormed TEXT, '
+    'strGenres TEXT, strMoods TEXT, strStyles TEXT, strInstruments TEXT, '
+    'strBiography TEXT, strDied TEXT, strDisbanded TEXT, '
+    'strYearsActive TEXT, strImage TEXT, strFanart TEXT, '
+    'lastScraped VARCHAR(20) DEFAULT NULL)',
+    'CREATE TABLE album (idAlbum INTEGER PRIMARY KEY, strAlbum TEXT, '
+    'strMusicBrainzAlbumID TEXT, strArtists TEXT, strGenres TEXT, '
+    'iYear INTEGER, idThumb INTEGER, bCompilation INTEGER NOT NULL '
+    'DEFAULT 0, strMoods TEXT, strStyles TEXT, strThemes TEXT, '
+    'strReview TEXT, strImage TEXT, strLabel TEXT, strType TEXT, '
+    'fRating FLOAT NOT NULL DEFAULT 0, iRating INTEGER, '
+    'iUserrating INTEGER NOT NULL DEFAULT 0, '
+    'iVotes INTEGER NOT NULL DEFAULT 0, '
+    'lastScraped VARCHAR(20) DEFAULT NULL, dateAdded VARCHAR(20), '
+    'strReleaseType TEXT)',
+    'CREATE TABLE album_artist (idArtist INTEGER, idAlbum INTEGER, '
+    'iOrder INTEGER, strArtist TEXT)',
+    'CREATE TABLE album_genre (idGenre INTEGER, idAlbum INTEGER, '
+    'iOrder INTEGER)',
+    'CREATE TABLE role (idRole INTEGER PRIMARY KEY, strRole TEXT)',
+    'INSERT INTO role (idRole, strRole) VALUES (1, \'Artist\')',
+    'CREATE TABLE genre (idGenre INTEGER PRIMARY KEY, strGenre TEXT)',
+    'CREATE TABLE path (idPath INTEGER PRIMARY KEY, strPath VARCHAR(512), '
+    'strHash TEXT)',
+    'CREATE TABLE song (idSong INTEGER PRIMARY KEY, idAlbum INTEGER, '
+    'idPath INTEGER, strArtists TEXT, strGenres TEXT, strTitle VARCHAR(512), '
+    'iTrack INTEGER, iDuration INTEGER, iYear INTEGER, '
+    'dwFileNameCRC TEXT, strFileName TEXT, strMusicBrainzTrackID TEXT, '
+    'iTimesPlayed INTEGER, iStartOffset INTEGER, iEndOffset INTEGER, '
+    'idThumb INTEGER, lastplayed VARCHAR(20) DEFAULT NULL, '
+    'rating FLOAT NOT NULL DEFAULT 0, userrating INTEGER NOT NULL '
+    'DEFAULT 0, votes INTEGER NOT NULL DEFAULT 0, comment TEXT, '
+    'mood TEXT, dateAdded TEXT)',
+    'CREATE TABLE song_artist (idArtist INTEGER, idSong INTEGER, '
+    'idRole INTEGER, iOrder INTEGER, strArtist TEXT)',
+    'CREATE TABLE song_genre (idGenre INTEGER, idSong INTEGER, '
+    'iOrder INTEGER)',
+    'CREATE TABLE albuminfosong (idAlbumInfoSong INTEGER PRIMARY KEY, '
+    'idAlbumInfo INTEGER, iTrack INTEGER, strTitle TEXT, iDuration INTEGER)',
+    'CREATE TABLE discography (idArtist INTEGER, strAlbum TEXT, '
+    'strYear TEXT)',
+    'CREATE TABLE art (art_id INTEGER PRIMARY KEY, media_id INTEGER, '
+    'media_type TEXT, type TEXT, url TEXT)',
+    'CREATE INDEX idxAlbum ON album (strAlbum)',
+    'CREATE INDEX idxAlbum_1 ON album (bCompilation)',
+    'CREATE UNIQUE INDEX idxAlbum_2 ON album (strMusicBrainzAlbumID)',
+    'CREATE UNIQUE INDEX idxAlbumArtist_1 ON album_artist '
+    '(idAlbum, idArtist)',
+    'CREATE UNIQUE INDEX idxAlbumArtist_2 ON album_artist '
+    '(idArtist, idAlbum)',
+    'CREATE UNIQUE INDEX idxAlbumGenre_1 ON album_genre (idAlbum, idGenre)',
+    'CREATE UNIQUE INDEX idxAlbumGenre_2 ON album_genre (idGenre, idAlbum)',
+    'CREATE INDEX idxGenre ON genre (strGenre)',
+    'CREATE INDEX idxArtist ON artist (strArtist)',
+    'CREATE UNIQUE INDEX idxArtist1 ON artist (strMusicBrainzArtistID)',
+    'CREATE INDEX idxPath ON path (strPath)',
+    'CREATE INDEX idxSong ON song (strTitle)',
+    'CREATE INDEX idxSong1 ON song (iTimesPlayed)',
+    'CREATE INDEX idxSong3 ON song (idAlbum)',
+    'CREATE INDEX idxSong6 ON song (idPath, strFileName)',
+    'CREATE UNIQUE INDEX idxSongArtist_1 ON song_artist '
+    '(idSong, idArtist, idRole)',
+    'CREATE INDEX idxSongArtist_2 ON song_artist (idSong, idRole)',
+    'CREATE INDEX idxSongArtist_3 ON song_artist (idArtist, idRole)',
+    'CREATE INDEX idxSongArtist_4 ON song_artist (idRole)',
+    'CREATE UNIQUE INDEX idxSongGenre_1 ON song_genre (idSong, idGenre)',
+    'CREATE UNIQUE INDEX idxSongGenre_2 ON song_genre (idGenre, idSong)',
+    'CREATE INDEX idxRole ON role (strRole)',
+    'CREATE INDEX idxDiscography_1 ON discography (idArtist)',
+    'CREATE INDEX idxAlbumInfoSong_1 ON albuminfosong (idAlbumInfo)',
+    'CREATE INDEX ix_art ON art (media_id, media_type, type)'
+)
+
+TEXTURE = (
+    'CREATE TABLE version (idVersion INTEGER, iCompressCount INTEGER)',
+    'INSERT INTO version (idVersion, iCompressCount) VALUES (13, 0)',
+    'CREATE TABLE path (id INTEGER PRIMARY KEY, url TEXT, type TEXT, '
+    'texture TEXT)',
+    'CREATE TABLE sizes (idtexture INTEGER, size INTEGER, width INTEGER, '
+    'height INTEGER, usecount INTEGER, lastusetime TEXT)',
+    'CREATE TABLE texture (id INTEGER PRIMARY KEY, url TEXT, '
+    'cachedurl TEXT, imagehash TEXT, lasthashcheck TEXT)',
+    'CREATE INDEX idxTexture ON texture (url)',
+    'CREATE INDEX idxPath ON path (url, type)',
+    'CREATE INDEX idxSize ON sizes (idtexture, size)'
+)
+
+###############################################################################
+
+
+def create(path, statements):
+    """
+    Creates the SQLite database path using statements, e.g. VIDEO
+    """
+    conn = connect(path)
+    for statement in statements:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
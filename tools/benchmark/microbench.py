@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks for the hot paths of PKC's library sync: the PlexAPI.API
+accessors and the itemtypes add_update methods. Fed with generated PMS XML
+(fake_pms.py) and, optionally, PMS responses you recorded (--xml). Kodi's
+databases live in memory (kodi_schema.py).
+
+    python2 tools/benchmark/microbench.py --save before.json
+    (change PKC)
+    python2 tools/benchmark/microbench.py --compare before.json
+
+Reported per call are the microseconds (the best mean of --repeat passes),
+the net new objects still alive afterwards and the SQL statements executed
+on Kodi's DBs. Python 2 has no tracemalloc; objects are what the garbage
+collector tracks, i.e. instances and containers of containers, but not
+strings or dicts of strings. With --compare, the exit code is 1 if a
+benchmark got slower than --time-tolerance or allocates or executes more
+than --count-tolerance. Timings vary by some 20% between processes, rerun
+before trusting a timing regression; the counts are deterministic
+"""
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from json import dump, load
+from os.path import basename
+from shutil import rmtree
+from tempfile import mkdtemp
+from timeit import default_timer
+import gc
+import sqlite3
+import sys
+import xml.etree.ElementTree as etree
+
+import benchmark
+import fake_pms
+
+###############################################################################
+
+# Used only to build artwork urls - nothing is ever requested
+SERVER = 'http://127.0.0.1:32400'
+# (PlexAPI.API accessor, keyword arguments, Plex types)
+ACCESSORS = (
+    ('getChecksum', {}, ('movie', 'episode', 'track')),
+    ('getUserData', {}, ('movie', 'episode', 'track')),
+    ('getRuntime', {}, ('movie', 'episode', 'track')),
+    ('getPeopleList', {}, ('movie', 'episode')),
+    ('getMediaStreams', {}, ('movie', 'episode')),
+    ('getExtras', {}, ('movie',)),
+    ('getAllArtwork', {'parentInfo': True}, ('movie', 'episode', 'track'))
+)
+# Plex type: (itemtypes class, method, [(Plex type, method), ...]). The
+# latter are added to the DBs first, untimed, e.g. the show of an episode
+ADD_UPDATE = {
+    'movie': ('Movies', 'add_update', []),
+    'episode': ('TVShows', 'add_updateEpisode',
+                [('show', 'add_update'), ('season', 'add_updateSeason')]),
+    'track': ('Music', 'add_updateSong',
+              [('artist', 'add_updateArtist'), ('album', 'add_updateAlbum')])
+}
+
+###############################################################################
+
+
+class Connection(object):
+    """
+    An sqlite connection that survives close() - in-memory DBs would be
+    gone otherwise
+    """
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def close(self):
+        pass
+
+
+class Databases(object):
+    """
+    In-memory sqlite DBs instead of the files of utils.kodiSQL(). Use
+    connect() instead of sqlite3.connect()
+    """
+    def __init__(self):
+        self.connections = {}
+
+    def connect(self, path, **kwargs):
+        filename = basename(path.replace('\\', '/'))
+        conn = self.connections.get(filename)
+        if conn is None:
+            conn = sqlite3.connect(':memory:', check_same_thread=False)
+            for name, statements in benchmark.DATABASES:
+                if name == filename:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.commit()
+            self.connections[filename] = conn
+        return Connection(conn)
+
+    def reset(self):
+        """
+        Throws away all DBs
+        """
+        for conn in self.connections.itervalues():
+            conn.close()
+        self.connections = {}
+
+
+class Elements(object):
+    """
+    The PMS XML elements to benchmark with: {Plex type: [element, ...]}
+    (self.generated, self.recorded) and the ones the generated elements
+    depend on (self.parents)
+    """
+    def __init__(self, items, seed):
+        # items movies, episodes and tracks; 20 per show and artist
+        number = max(1, items // 20)
+        library = fake_pms.Library(movies=items, shows=number, seasons=2,
+                                   episodes=10, artists=number, albums=2,
+                                   tracks=10, seed=seed)
+        self.generated = {}
+        self.parents = {}
+        self.views = {}
+        for key in sorted(library.items, key=int):
+            item = library.items[key]
+            element = etree.fromstring(library.metadata([key]))[0]
+            if item.type in ADD_UPDATE:
+                self.generated.setdefault(item.type, []).append(element)
+            else:
+                self.parents.setdefault(item.type, []).append(element)
+            self.views[item.type] = (item.section['title'],
+                                     item.section['key'])
+        for typus in ('episode', 'track'):
+            self.views[typus] = self.views[ADD_UPDATE[typus][2][0][0]]
+        self.recorded = {}
+
+    def record(self, filename):
+        """
+        Adds the elements of the PMS response saved as filename, e.g.
+        /library/metadata/<id>, to self.recorded
+        """
+        for element in etree.parse(filename).getroot():
+            typus = element.get('type')
+            if typus in ADD_UPDATE:
+                self.recorded.setdefault(typus, []).append(element)
+
+
+def measure(session, arguments, repeat):
+    """
+    Calls the function that "with session() as function" returns for all
+    arguments, repeat times. Returns the best mean seconds per call and the
+    fewest new objects per call that the garbage collector tracks afterwards
+    """
+    best = objects = None
+    for _ in xrange(repeat):
+        with session() as function:
+            gc.collect()
+            gc.disable()
+            try:
+                count = len(gc.get_objects())
+                started = default_timer()
+                # Keep the results alive to count their objects, too
+                results = [function(argument) for argument in arguments]
+                seconds = default_timer() - started
+                # Minus the list of results
+                count = len(gc.get_objects()) - count - 1
+            finally:
+                gc.enable()
+            del results
+        seconds /= len(arguments)
+        count /= float(len(arguments))
+        best = seconds if best is None else min(best, seconds)
+        objects = count if objects is None else min(objects, count)
+    return best, objects
+
+
+def api_benchmarks(elements, label, repeat, results):
+    """
+    Benchmarks PlexAPI.API() and its ACCESSORS for the XML elements
+    {Plex type: [element, ...]}
+    """
+    from PlexAPI import API
+
+    for typus, items in sorted(elements.iteritems()):
+        @contextmanager
+        def construct():
+            yield API
+        results['API() %s%s' % (typus, label)] = measure(construct, items,
+                                                         repeat)
+        apis = [API(item) for item in items]
+        for accessor, kwargs, types in ACCESSORS:
+            if typus not in types:
+                continue
+
+            @contextmanager
+            def call(method=getattr(API, accessor), kwargs=kwargs):
+                yield lambda api: method(api, **kwargs)
+            results['API.%s %s%s' % (accessor, typus, label)] = measure(
+                call, apis, repeat)
+
+
+def add_update_benchmarks(databases, elements, label, repeat, results):
+    """
+    Benchmarks adding the XML elements {Plex type: [element, ...]} of
+    elements.generated or .recorded to fresh DBs with the ADD_UPDATE
+    methods, then updating them
+    """
+    import itemtypes
+    import metrics
+    from db_writer import DBWriter
+    from librarysync import LibrarySync
+    from utils import window
+
+    source = elements.recorded if label else elements.generated
+    for typus, items in sorted(source.iteritems()):
+        classname, method, parents = ADD_UPDATE[typus]
+        if parents and label:
+            # The parents of recorded items are unknown
+            continue
+        viewtag, viewid = elements.views.get(typus, ('Movies', '1'))
+        for update in (False, True):
+            @contextmanager
+            def session(update=update):
+                databases.reset()
+                LibrarySync().initializeDBs()
+                with DBWriter() as writer, \
+                        getattr(itemtypes, classname)() as item:
+                    for parent, parent_method in parents:
+                        for element in elements.parents[parent]:
+                            getattr(item, parent_method)(element,
+                                                         viewtag=viewtag,
+                                                         viewid=viewid)
+                            writer.item_done()
+                    function = getattr(item, method)
+                    if update:
+                        for element in items:
+                            function(element, viewtag=viewtag,
+                                     viewid=viewid)
+                            writer.item_done()
+                    metrics.reset()
+
+                    def add_update(element):
+                        function(element, viewtag=viewtag, viewid=viewid)
+                        writer.item_done()
+                    yield add_update
+                if window('plex_scancrashed') == 'true':
+                    raise RuntimeError('%s.%s crashed, see the log'
+                                       % (classname, method))
+                conn = databases.connect('plex.db')
+                synced = conn.execute(
+                    'SELECT COUNT(*) FROM plex WHERE plex_type = ?',
+                    (typus,)).fetchone()[0]
+                if synced != len(items):
+                    raise RuntimeError('Only %s of %s items synced, see the '
+                                       'log' % (synced, len(items)))
+
+            name = '%s.%s %s%s%s' % (classname, method, typus,
+                                     ' update' if update else '', label)
+            seconds, objects = measure(session, items, repeat)
+            histogram = metrics.snapshot()['histograms'].get(
+                'sql.statements.%s.%s' % (classname, method))
+            statements = histogram['mean'] if histogram else None
+            results[name] = (seconds, objects, statements)
+
+
+def no_pms(*args, **kwargs):
+    raise RuntimeError('The benchmarks should never contact the PMS')
+
+
+def setup(args):
+    """
+    Sets up Kodi and PKC with in-memory DBs in this process. Returns the
+    Databases and the Kodi profile directory to delete afterwards
+    """
+    home = mkdtemp(prefix='pkc-microbench-')
+    benchmark.prepare(home,
+                      benchmark.settings(args),
+                      benchmark.window_properties(SERVER, args.log_level))
+    import itemtypes
+    import loghandler
+    import state
+    import utils
+    databases = Databases()
+    utils.connect = databases.connect
+    itemtypes.GetPlexMetadata = no_pms
+    state.activate()
+    loghandler.config()
+    return databases, home
+
+
+def run(args):
+    """
+    Returns the results of all benchmarks: {name: {'usec': ..., 'objects':
+    ..., 'statements': ...}}
+    """
+    databases, home = setup(args)
+    elements = Elements(args.items, args.seed)
+    for filename in args.xml:
+        elements.record(filename)
+    results = {}
+    try:
+        for label, source in (('', elements.generated),
+                              (' recorded', elements.recorded)):
+            api_benchmarks(source, label, args.repeat, results)
+            add_update_benchmarks(databases, elements, label, args.repeat,
+                                  results)
+    finally:
+        import loghandler
+        loghandler.stop()
+        if args.keep:
+            sys.stderr.write('Kept the Kodi profile %s\n' % home)
+        else:
+            rmtree(home, ignore_errors=True)
+    named = {}
+    for name, result in results.iteritems():
+        if args.filter and args.filter not in name:
+            continue
+        named[name] = {
+            'usec': result[0] * 1e6,
+            'objects': result[1],
+            'statements': result[2] if len(result) > 2 else None
+        }
+    return named
+
+
+def regressions(result, baseline, time_tolerance, count_tolerance):
+    """
+    Returns the list of the keys of result that regressed against baseline
+    """
+    keys = []
+    if result['usec'] > baseline['usec'] * (1 + time_tolerance):
+        keys.append('usec')
+    for key in ('objects', 'statements'):
+        new, old = result.get(key), baseline.get(key)
+        if new is None or old is None:
+            continue
+        # Ignore fractions, e.g. of the objects of a NameIdCache
+        if new > old * (1 + count_tolerance) and new - old >= 1:
+            keys.append(key)
+    return keys
+
+
+def report(results, baseline, args):
+    """
+    Returns the results as a human-readable table and whether any of them
+    regressed against baseline (another results dict or None)
+    """
+    lines = ['%-46s %10s %8s %10s' % ('benchmark', 'usec/call', 'objects',
+                                      'statements')]
+    regressed = False
+    for name, result in sorted(results.iteritems()):
+        line = '%-46s %10.1f %8.1f %10s' % (
+            name, result['usec'], result['objects'],
+            '' if result['statements'] is None
+            else '%.1f' % result['statements'])
+        old = (baseline or {}).get(name)
+        if old is not None:
+            line += '  %+.0f%%' % (
+                (result['usec'] / old['usec'] - 1) * 100)
+            keys = regressions(result, old, args.time_tolerance,
+                               args.count_tolerance)
+            if keys:
+                regressed = True
+                line += '  REGRESSION: %s' % ', '.join(keys)
+        lines.append(line)
+    return '\n'.join(lines), regressed
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--items', type=int, default=100,
+                        help='generated movies, episodes and tracks each')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='passes per benchmark, the best one counts')
+    parser.add_argument('--xml', metavar='FILE', nargs='*', default=[],
+                        help='recorded PMS responses, e.g. of '
+                             '/library/metadata/<id>')
+    parser.add_argument('--filter', metavar='TEXT',
+                        help='only report benchmarks whose name contains '
+                             'TEXT')
+    parser.add_argument('--log-level', type=int, default=0,
+                        help="setting logLevel: 0, 1 or 2 (debug)")
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results as JSON to FILE')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare with the results saved in FILE')
+    parser.add_argument('--time-tolerance', type=float, default=0.3,
+                        help='slower by this fraction is a regression')
+    parser.add_argument('--count-tolerance', type=float, default=0.05,
+                        help='more objects or statements by this fraction '
+                             'is a regression')
+    parser.add_argument('--keep', action='store_true',
+                        help="don't delete the Kodi profile, e.g. for the "
+                             "log")
+    # benchmark.settings() needs these
+    parser.set_defaults(threads=1, batch=50, limitindex=200)
+    args = parser.parse_args()
+
+    results = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'rb') as f:
+            baseline = load(f)
+    table, regressed = report(results, baseline, args)
+    print(table)
+    if args.save:
+        with open(args.save, 'wb') as f:
+            dump(results, f, indent=2, sort_keys=True)
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
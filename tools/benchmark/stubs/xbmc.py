@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmc module so that PKC runs outside of Kodi - for the
+benchmark only. special:// paths point into the directory given by the
+environment variable PKC_BENCHMARK_HOME
+"""
+from os import environ, makedirs
+from os.path import join, isdir
+from sys import stderr
+from tempfile import mkdtemp
+from time import localtime, sleep as _sleep, strftime, time
+
+###############################################################################
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGNOTICE = 2
+LOGWARNING = 3
+LOGERROR = 4
+LOGSEVERE = 5
+LOGFATAL = 6
+LOGNONE = 7
+
+ISO_639_1 = 0
+ISO_639_2 = 1
+ENGLISH_NAME = 2
+
+PLAYLIST_MUSIC = 0
+PLAYLIST_VIDEO = 1
+
+HOME = environ.get('PKC_BENCHMARK_HOME') or mkdtemp(prefix='pkc-benchmark-')
+# Where xbmc.log() writes to; the benchmark sets this to a file
+LOG = stderr
+
+_SPECIAL = (
+    ('special://database', join(HOME, 'userdata', 'Database')),
+    ('special://thumbnails', join(HOME, 'userdata', 'Thumbnails')),
+    ('special://masterprofile', join(HOME, 'userdata')),
+    ('special://profile', join(HOME, 'userdata')),
+    ('special://userdata', join(HOME, 'userdata')),
+    ('special://temp', join(HOME, 'temp')),
+    ('special://home', HOME),
+    ('special://xbmc', join(HOME, 'xbmc'))
+)
+_INFOLABELS = {
+    'System.BuildVersion': '17.6 Git:20171114-a9a7a20',
+    'System.FriendlyName': 'PKC benchmark',
+    'System.ScreenWidth': '1920',
+    'System.ScreenHeight': '1080'
+}
+abortRequested = False
+
+for _path in (join(HOME, 'userdata', 'Database'),
+              join(HOME, 'userdata', 'Thumbnails'),
+              join(HOME, 'temp')):
+    if not isdir(_path):
+        makedirs(_path)
+# Kodi's default library nodes that PKC's videonodes copies
+for _library in ('video', 'music'):
+    _path = join(HOME, 'xbmc', 'system', 'library', _library)
+    if not isdir(_path):
+        makedirs(_path)
+        with open(join(_path, 'index.xml'), 'wb') as _file:
+            _file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                        '<node order="0" visible="true"><label>%s</label>'
+                        '</node>\n' % _library)
+
+###############################################################################
+
+
+def translatePath(path):
+    for special, real in _SPECIAL:
+        if path.startswith(special):
+            rest = path[len(special):]
+            if rest and not rest.startswith('/'):
+                continue
+            return real + rest
+    return path
+
+
+def log(msg, level=LOGDEBUG):
+    if isinstance(msg, unicode):
+        msg = msg.encode('utf-8')
+    now = time()
+    LOG.write('%s.%03d %s\n' % (strftime('%H:%M:%S', localtime(now)),
+                                 now * 1000 % 1000, msg))
+
+
+def sleep(milliseconds):
+    _sleep(milliseconds / 1000.0)
+
+
+def executebuiltin(function, wait=False):
+    pass
+
+
+def executeJSONRPC(jsonrpccommand):
+    return '{"id": 1, "jsonrpc": "2.0", "result": {"value": ""}}'
+
+
+def getCondVisibility(condition):
+    return False
+
+
+def getInfoLabel(label):
+    return _INFOLABELS.get(label, '')
+
+
+def getLanguage(format=ENGLISH_NAME, region=False):
+    return {ISO_639_1: 'en', ISO_639_2: 'eng'}.get(format, 'English')
+
+
+def getLocalizedString(id):
+    return u'String %s' % id
+
+
+def getIPAddress():
+    return '127.0.0.1'
+
+
+def getSkinDir():
+    return 'skin.estuary'
+
+
+def getRegion(id):
+    return ''
+
+
+class Monitor(object):
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=None):
+        if timeout:
+            _sleep(timeout)
+        return False
+
+
+class Player(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def isPlaying(self):
+        return False
+
+    isPlayingVideo = isPlayingAudio = isPlaying
+
+    def getTime(self):
+        return 0.0
+
+    def getTotalTime(self):
+        return 0.0
+
+    def play(self, *args, **kwargs):
+        pass
+
+    def stop(self):
+        pass
+
+
+class PlayList(object):
+    def __init__(self, playlist):
+        self.items = []
+
+    def getposition(self):
+        return -1
+
+    def size(self):
+        return len(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, url, listitem=None, index=-1):
+        self.items.append(url)
+
+    def clear(self):
+        del self.items[:]
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmcaddon module - for the benchmark only. Settings
+start with the defaults of resources/settings.xml; the benchmark changes
+them via SETTINGS
+"""
+from os.path import abspath, dirname, join
+from threading import Lock
+import xml.etree.ElementTree as etree
+
+import xbmc
+
+###############################################################################
+
+ROOT = abspath(join(dirname(__file__), '..', '..', '..'))
+ADDON_ID = 'plugin.video.plexkodiconnect'
+
+_MANIFEST = etree.parse(join(ROOT, 'addon.xml')).getroot()
+_INFO = {
+    'id': ADDON_ID,
+    'name': _MANIFEST.get('name'),
+    'version': _MANIFEST.get('version'),
+    'author': _MANIFEST.get('provider-name'),
+    'path': ROOT,
+    'profile': 'special://profile/addon_data/%s/' % ADDON_ID
+}
+# {setting id: value (str)}, shared by all Addon() instances
+SETTINGS = dict(
+    (setting.get('id'), setting.get('default', '').encode('utf-8'))
+    for setting in etree.parse(join(ROOT, 'resources', 'settings.xml')).iter(
+        'setting')
+    if setting.get('id'))
+_STRINGS = dict(
+    (int(string.get('id')), string.text or u'')
+    for string in etree.parse(join(ROOT, 'resources', 'language', 'English',
+                                   'strings.xml')).iter('string'))
+_LOCK = Lock()
+
+###############################################################################
+
+
+class Addon(object):
+    def __init__(self, id=ADDON_ID):
+        self.id = id
+
+    def getSetting(self, id):
+        return SETTINGS.get(id, '')
+
+    def setSetting(self, id, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        with _LOCK:
+            SETTINGS[id] = value
+
+    def getAddonInfo(self, id):
+        return _INFO.get(id, '')
+
+    def getLocalizedString(self, id):
+        try:
+            return _STRINGS[id]
+        except KeyError:
+            return xbmc.getLocalizedString(id)
+
+    def openSettings(self):
+        pass
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmcgui module - for the benchmark only. Window
+properties live in memory, dialogs are never shown
+"""
+from threading import Lock
+
+###############################################################################
+
+NOTIFICATION_INFO = 'info'
+NOTIFICATION_WARNING = 'warning'
+NOTIFICATION_ERROR = 'error'
+
+INPUT_ALPHANUM = 0
+INPUT_NUMERIC = 1
+INPUT_DATE = 2
+INPUT_TIME = 3
+INPUT_IPADDRESS = 4
+INPUT_PASSWORD = 5
+ALPHANUM_HIDE_INPUT = 2
+
+# {window id: {property: value}}
+_PROPERTIES = {}
+_LOCK = Lock()
+
+###############################################################################
+
+
+class Window(object):
+    def __init__(self, existingWindowId=-1):
+        with _LOCK:
+            self.properties = _PROPERTIES.setdefault(existingWindowId, {})
+
+    def getProperty(self, key):
+        return self.properties.get(key.lower(), '')
+
+    def setProperty(self, key, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        self.properties[key.lower()] = value
+
+    def clearProperty(self, key):
+        self.properties.pop(key.lower(), None)
+
+    def clearProperties(self):
+        self.properties.clear()
+
+
+class WindowXMLDialog(Window):
+    def __init__(self, *args, **kwargs):
+        Window.__init__(self)
+
+    def doModal(self):
+        pass
+
+    def show(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Dialog(object):
+    def ok(self, heading, line1='', line2='', line3=''):
+        return True
+
+    def yesno(self, heading, line1='', line2='', line3='', nolabel='',
+              yeslabel='', autoclose=0):
+        return False
+
+    def select(self, heading, list, autoclose=0, preselect=-1,
+               useDetails=False):
+        return -1
+
+    def input(self, heading, defaultt='', type=INPUT_ALPHANUM, option=0,
+              autoclose=0):
+        return ''
+
+    def numeric(self, type, heading, defaultt=''):
+        return ''
+
+    def browse(self, type, heading, shares, mask='', useThumbs=False,
+               treatAsFolder=False, defaultt='', enableMultiple=False):
+        return defaultt
+
+    def notification(self, heading, message, icon=NOTIFICATION_INFO,
+                     time=5000, sound=True):
+        pass
+
+    def textviewer(self, heading, text):
+        pass
+
+
+class DialogProgressBG(object):
+    def create(self, heading, message=''):
+        pass
+
+    def update(self, percent=0, heading='', message=''):
+        pass
+
+    def close(self):
+        pass
+
+    def isFinished(self):
+        return False
+
+
+class ListItem(object):
+    def __init__(self, label='', label2='', iconImage='', thumbnailImage='',
+                 path='', offscreen=False):
+        self.label = label
+        self.path = path
+        self.properties = {}
+        self.info = {}
+        self.art = {}
+
+    def getLabel(self):
+        return self.label
+
+    def setLabel(self, label):
+        self.label = label
+
+    def getProperty(self, key):
+        return self.properties.get(key.lower(), '')
+
+    def setProperty(self, key, value):
+        self.properties[key.lower()] = value
+
+    def setInfo(self, type, infoLabels):
+        self.info.update(infoLabels)
+
+    def setArt(self, values):
+        self.art.update(values)
+
+    def setPath(self, path):
+        self.path = path
+
+    def getPath(self):
+        return self.path
+
+    def __getattr__(self, name):
+        # e.g. setThumbnailImage, addStreamInfo, setSubtitles
+        return lambda *args, **kwargs: None
+
+
+class _Control(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+ControlEdit = ControlImage = _Control
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmcplugin module - for the benchmark only
+"""
+SORT_METHOD_NONE = 0
+SORT_METHOD_LABEL = 1
+SORT_METHOD_DATE = 3
+SORT_METHOD_VIDEO_TITLE = 25
+SORT_METHOD_VIDEO_RATING = 18
+SORT_METHOD_VIDEO_RUNTIME = 29
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    return True
+
+
+def addDirectoryItems(handle, items, totalItems=0):
+    return True
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False,
+                   cacheToDisc=True):
+    pass
+
+
+def setContent(handle, content):
+    pass
+
+
+def addSortMethod(handle, sortMethod, label2Mask=''):
+    pass
+
+
+def setPluginCategory(handle, category):
+    pass
+
+
+def setResolvedUrl(handle, succeeded, listitem):
+    pass
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for Kodi's xbmcvfs module - for the benchmark only. Works on the
+local filesystem
+"""
+import os
+import shutil
+
+###############################################################################
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def mkdir(path):
+    try:
+        os.mkdir(path)
+    except OSError:
+        return False
+    return True
+
+
+def mkdirs(path):
+    try:
+        os.makedirs(path)
+    except OSError:
+        return False
+    return True
+
+
+def listdir(path):
+    dirs, files = [], []
+    for name in os.listdir(path):
+        if os.path.isdir(os.path.join(path, name)):
+            dirs.append(name)
+        else:
+            files.append(name)
+    return dirs, files
+
+
+def delete(path):
+    try:
+        os.remove(path)
+    except OSError:
+        return False
+    return True
+
+
+def rmdir(path, force=False):
+    try:
+        if force:
+            shutil.rmtree(path)
+        else:
+            os.rmdir(path)
+    except OSError:
+        return False
+    return True
+
+
+def copy(source, destination):
+    try:
+        shutil.copy(source, destination)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def rename(path, newPath):
+    try:
+        os.rename(path, newPath)
+    except OSError:
+        return False
+    return True
+
+
+class File(object):
+    def __init__(self, path, mode='r'):
+        self.file = open(path, 'wb' if 'w' in mode else 'rb')
+
+    def read(self, bytes=-1):
+        return self.file.read(bytes)
+
+    def write(self, buffer):
+        self.file.write(buffer)
+        return True
+
+    def size(self):
+        return os.fstat(self.file.fileno()).st_size
+
+    def close(self):
+        self.file.close()